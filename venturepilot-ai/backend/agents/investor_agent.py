@@ -5,22 +5,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from mistralai import Mistral
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTEXT_TOKEN_BUDGETS
 from rag.retriever import retrieve_context
+from utils.llm_client import get_llm_client
 
 
-def get_client():
-    """Get Mistral client - checks API key each time."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key)
-    return None
-
-
-def match_investors(startup_profile: dict, vector_store=None) -> list[dict]:
+def build_investor_request(startup_profile: dict) -> dict:
+    """Retrieval request (`retrieve_context` arguments) for the investor agent."""
+    domain = startup_profile.get("domain", "")
+    stage = startup_profile.get("stage", "")
+    geography = startup_profile.get("geography", "")
+    market_category = startup_profile.get("market_category", domain)
+    
+    query = f"{market_category} {domain} {stage} stage investors VCs {geography}"
+    return {
+        "query": query,
+        "category": "investor",
+        "k": 12,
+        "token_budget": CONTEXT_TOKEN_BUDGETS["investor"]
+    }
+
+
+def match_investors(
+    startup_profile: dict,
+    vector_store=None,
+    context: Optional[list[str]] = None
+) -> list[dict]:
     """
     Match investors to a startup profile.
     
@@ -34,21 +47,14 @@ def match_investors(startup_profile: dict, vector_store=None) -> list[dict]:
         }
     ]
     """
-    domain = startup_profile.get("domain", "")
-    stage = startup_profile.get("stage", "")
-    geography = startup_profile.get("geography", "")
-    market_category = startup_profile.get("market_category", domain)
-    
-    # Retrieve investor context
-    query = f"{market_category} {domain} {stage} stage investors VCs {geography}"
-    context = retrieve_context(
-        query=query,
-        category="investor",
-        vector_store=vector_store,
-        k=10
-    )
+    # Retrieve investor context, unless the orchestrator already fetched it
+    if context is None:
+        context = retrieve_context(
+            vector_store=vector_store,
+            **build_investor_request(startup_profile)
+        )
     
-    client = get_client()
+    client = get_llm_client()
     if client:
         print(f"[INVESTOR AGENT] Using Mistral AI for matching...")
         return _match_with_llm(startup_profile, context, client)
@@ -1,7 +1,6 @@
 import json
 import os
 from typing import Optional
-from mistralai import Mistral
 import sys
 from dotenv import load_dotenv
 
@@ -9,18 +8,32 @@ from dotenv import load_dotenv
 load_dotenv()
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTEXT_TOKEN_BUDGETS
 from rag.retriever import retrieve_context
+from utils.llm_client import get_llm_client
 
 
-def get_mistral_client():
-    """Get Mistral client dynamically to ensure .env is loaded."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key), True
-    return None, False
+def build_market_request(startup_profile: dict) -> dict:
+    """Retrieval request (`retrieve_context` arguments) for the market agent."""
+    domain = startup_profile.get("domain", "")
+    geography = startup_profile.get("geography", "")
+    market_category = startup_profile.get("market_category", domain)
+    
+    query = f"{market_category} {domain} market size growth trends {geography}"
+    return {
+        "query": query,
+        "category": "report",
+        "geography": geography,
+        "k": 8,
+        "token_budget": CONTEXT_TOKEN_BUDGETS["market"]
+    }
 
 
-def analyze_market(startup_profile: dict, vector_store=None) -> dict:
+def analyze_market(
+    startup_profile: dict,
+    vector_store=None,
+    context: Optional[list[str]] = None
+) -> dict:
     """
     Analyze market conditions for a startup.
     
@@ -32,22 +45,15 @@ def analyze_market(startup_profile: dict, vector_store=None) -> dict:
         "emerging_trends": list[string]
     }
     """
-    domain = startup_profile.get("domain", "")
-    geography = startup_profile.get("geography", "")
-    market_category = startup_profile.get("market_category", domain)
-    
-    # Retrieve market context
-    query = f"{market_category} {domain} market size growth trends {geography}"
-    context = retrieve_context(
-        query=query,
-        category="report",
-        geography=geography,
-        vector_store=vector_store,
-        k=5
-    )
+    # Retrieve market context, unless the orchestrator already fetched it
+    if context is None:
+        context = retrieve_context(
+            vector_store=vector_store,
+            **build_market_request(startup_profile)
+        )
     
-    client, use_llm = get_mistral_client()
-    if use_llm and client:
+    client = get_llm_client()
+    if client:
         return _analyze_with_llm(startup_profile, context, client)
     else:
         return _analyze_mock(startup_profile, context)
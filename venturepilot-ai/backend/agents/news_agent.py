@@ -1,7 +1,6 @@
 import json
 import os
 from typing import Optional
-from mistralai import Mistral
 import sys
 from datetime import datetime
 from dotenv import load_dotenv
@@ -10,18 +9,33 @@ from dotenv import load_dotenv
 load_dotenv()
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTEXT_TOKEN_BUDGETS
 from rag.retriever import retrieve_context
+from utils.llm_client import get_llm_client
 
 
-def get_mistral_client():
-    """Get Mistral client dynamically to ensure .env is loaded."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key), True
-    return None, False
+def build_news_request(startup_profile: dict) -> dict:
+    """Retrieval request (`retrieve_context` arguments) for the news agent."""
+    domain = startup_profile.get("domain", "")
+    geography = startup_profile.get("geography", "")
+    market_category = startup_profile.get("market_category", domain)
+    
+    query = f"{market_category} {domain} news funding investment {geography}"
+    return {
+        "query": query,
+        "category": "news",
+        "geography": geography,
+        "recency_days": 90,
+        "k": 10,
+        "token_budget": CONTEXT_TOKEN_BUDGETS["news"]
+    }
 
 
-def analyze_news(startup_profile: dict, vector_store=None) -> dict:
+def analyze_news(
+    startup_profile: dict,
+    vector_store=None,
+    context: Optional[list[str]] = None
+) -> dict:
     """
     Analyze recent news relevant to a startup.
     
@@ -34,23 +48,15 @@ def analyze_news(startup_profile: dict, vector_store=None) -> dict:
     
     Note: Recency MUST be enforced - only recent news should be included.
     """
-    domain = startup_profile.get("domain", "")
-    geography = startup_profile.get("geography", "")
-    market_category = startup_profile.get("market_category", domain)
-    
-    # Retrieve news context with recency filter (last 90 days)
-    query = f"{market_category} {domain} news funding investment {geography}"
-    context = retrieve_context(
-        query=query,
-        category="news",
-        geography=geography,
-        recency_days=90,
-        vector_store=vector_store,
-        k=7
-    )
+    # Retrieve recent news context, unless the orchestrator already fetched it
+    if context is None:
+        context = retrieve_context(
+            vector_store=vector_store,
+            **build_news_request(startup_profile)
+        )
     
-    client, use_llm = get_mistral_client()
-    if use_llm and client:
+    client = get_llm_client()
+    if client:
         return _analyze_with_llm(startup_profile, context, client)
     else:
         return _analyze_mock(startup_profile, context)
@@ -5,22 +5,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from mistralai import Mistral
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CONTEXT_TOKEN_BUDGETS
 from rag.retriever import retrieve_context
+from utils.llm_client import get_llm_client
 
 
-def get_client():
-    """Get Mistral client - checks API key each time."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key)
-    return None
+def build_policy_request(startup_profile: dict) -> dict:
+    """Retrieval request (`retrieve_context` arguments) for the policy agent."""
+    geography = startup_profile.get("geography", "Global")
+    domain = startup_profile.get("domain", "")
+    market_category = startup_profile.get("market_category", domain)
+    
+    query = f"{market_category} {domain} startup policies regulations schemes {geography}"
+    return {
+        "query": query,
+        "category": "policy",
+        "geography": geography,
+        "k": 8,
+        "token_budget": CONTEXT_TOKEN_BUDGETS["policy"]
+    }
 
 
-def analyze_policy(startup_profile: dict, vector_store=None) -> dict:
+def analyze_policy(
+    startup_profile: dict,
+    vector_store=None,
+    context: Optional[list[str]] = None
+) -> dict:
     """
     Analyze relevant policies for a startup.
     
@@ -36,21 +49,14 @@ def analyze_policy(startup_profile: dict, vector_store=None) -> dict:
         "regulatory_risks": list[string]
     }
     """
-    geography = startup_profile.get("geography", "Global")
-    domain = startup_profile.get("domain", "")
-    market_category = startup_profile.get("market_category", domain)
-    
-    # Retrieve policy context
-    query = f"{market_category} {domain} startup policies regulations schemes {geography}"
-    context = retrieve_context(
-        query=query,
-        category="policy",
-        geography=geography,
-        vector_store=vector_store,
-        k=5
-    )
+    # Retrieve policy context, unless the orchestrator already fetched it
+    if context is None:
+        context = retrieve_context(
+            vector_store=vector_store,
+            **build_policy_request(startup_profile)
+        )
     
-    client = get_client()
+    client = get_llm_client()
     if client:
         print(f"[POLICY AGENT] Using Mistral AI for analysis...")
         return _analyze_with_llm(startup_profile, context, client)
@@ -6,15 +6,10 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from mistralai import Mistral
+import sys
 
-
-def get_client():
-    """Get Mistral client - checks API key each time."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key)
-    return None
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.llm_client import get_llm_client
 
 
 def analyze_startup(input_data: dict) -> dict:
@@ -46,7 +41,7 @@ def analyze_startup(input_data: dict) -> dict:
         if field not in input_data:
             raise ValueError(f"Missing required field: {field}")
     
-    client = get_client()
+    client = get_llm_client()
     if client:
         print(f"[STARTUP AGENT] Using Mistral AI for analysis...")
         return _analyze_with_llm(input_data, client)
@@ -1,19 +1,14 @@
 import json
 import os
 from typing import Optional
-from mistralai import Mistral
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables at module level
 load_dotenv()
 
-
-def get_mistral_client():
-    """Get Mistral client dynamically to ensure .env is loaded."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key), True
-    return None, False
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.llm_client import get_llm_client
 
 
 def synthesize_strategy(
@@ -36,8 +31,8 @@ def synthesize_strategy(
         "next_actions": list[string]
     }
     """
-    client, use_llm = get_mistral_client()
-    if use_llm and client:
+    client = get_llm_client()
+    if client:
         return _synthesize_with_llm(
             startup_profile, policy_analysis, 
             investor_matches, market_analysis, news_analysis, client
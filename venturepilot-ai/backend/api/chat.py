@@ -11,17 +11,7 @@ load_dotenv()
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from rag.retriever import retrieve_context
-
-# Import Mistral
-from mistralai import Mistral
-
-
-def get_mistral_client():
-    """Get Mistral client dynamically to ensure .env is loaded."""
-    api_key = os.getenv("MISTRAL_API_KEY", "")
-    if api_key:
-        return Mistral(api_key=api_key), True
-    return None, False
+from utils.llm_client import get_llm_client
 
 router = APIRouter()
 
@@ -68,18 +58,20 @@ Startup Context:
         category = _detect_category(message.question)
         geography = message.startup_profile.get('geography') if message.startup_profile else None
         
-        # Retrieve relevant context
+        # Retrieve relevant context; questions mix exact names with loose
+        # phrasing, so fuse keyword and semantic rankings
         context_docs = retrieve_context(
             query=message.question,
             category=category,
             geography=geography,
             vector_store=vector_store,
-            k=5
+            k=5,
+            mode="hybrid"
         )
         
         # Generate response
-        client, use_llm = get_mistral_client()
-        if use_llm and client:
+        client = get_llm_client()
+        if client:
             answer, sources = _generate_llm_response(
                 question=message.question,
                 profile_context=profile_context,
@@ -0,0 +1,253 @@
+"""
+Benchmarks for the vector store.
+Run with: python benchmark_vector_store.py [memory|topk|tokenizer|shards] [num_documents]
+"""
+import sys
+import os
+import random
+import re
+import time
+import tracemalloc
+import uuid
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from storage.buffers import GrowableArray
+from storage.document_table import DocumentTable
+from storage.topk import top_k, top_k_items
+from storage.tokenizer import Tokenizer
+from storage.vector_store import VectorStore
+from storage.sharded_store import ShardedVectorStore
+
+
+CATEGORIES = ["policy", "investor", "news", "report"]
+GEOGRAPHIES = ["India", "USA", "Singapore", "Global", "UK"]
+SOURCES = ["TechCrunch", "Economic Times", "RBI", "Inc42", "YourStory", "VC Database"]
+
+
+def make_word(rank: int) -> str:
+    """Alphabetic pseudo-word for a vocabulary rank (at least 3 letters)."""
+    letters = ""
+    while True:
+        rank, digit = divmod(rank, 26)
+        letters += chr(ord("a") + digit)
+        if rank == 0:
+            break
+    return "w" + letters.ljust(2, "a")
+
+
+def make_documents(count: int, words_per_doc: int = 80, seed: int = 0) -> list[dict]:
+    """Generate synthetic documents with a Zipf-like word distribution."""
+    rng = random.Random(seed)
+    vocabulary = [make_word(rank) for rank in range(20000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    documents = []
+    for i in range(count):
+        words = rng.choices(vocabulary, weights=weights, k=words_per_doc)
+        documents.append({
+            "text": " ".join(words),
+            "category": rng.choice(CATEGORIES),
+            "timestamp": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "geography": rng.choice(GEOGRAPHIES),
+            "source": rng.choice(SOURCES),
+            "title": f"Document {i}"
+        })
+    return documents
+
+
+def measure(build) -> tuple[int, float]:
+    """Traced memory retained by build()'s result (bytes) and seconds taken."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, elapsed
+
+
+def build_dict_documents(documents: list[dict]):
+    """Previous layout: a dict per document (with keyword set), indexed twice."""
+    stored, index = [], {}
+    for doc in documents:
+        # Copy strings so the input list does not share them
+        entry = {
+            "id": str(uuid.uuid4()),
+            "text": "".join(doc["text"]),
+            "category": "".join(doc["category"]),
+            "timestamp": "".join(doc["timestamp"]),
+            "geography": "".join(doc["geography"]),
+            "source": "".join(doc["source"]),
+            "title": "".join(doc["title"]),
+            "keywords": set(re.findall(r'\b[a-zA-Z]{3,}\b', doc["text"].lower()))
+        }
+        stored.append(entry)
+        index[entry["id"]] = entry
+    return stored, index
+
+
+def build_document_table(documents: list[dict]):
+    """Columnar layout: DocumentTable plus per-document term ids."""
+    table = DocumentTable()
+    vocabulary = {}
+    term_ids = GrowableArray(np.int32, capacity=1024)
+    for doc in documents:
+        table.append(doc)
+        terms = dict.fromkeys(re.findall(r'\b[a-zA-Z]{3,}\b', doc["text"].lower()))
+        term_ids.extend([vocabulary.setdefault(term, len(vocabulary)) for term in terms])
+    return table, vocabulary, term_ids
+
+
+def build_vector_store(documents: list[dict], mode: str):
+    """A complete VectorStore (index, postings and columns) holding the documents."""
+    store = VectorStore(mode=mode)
+    store.add_documents(documents)
+    if mode != "keyword":
+        store.search("warm up", mode=mode)  # dense modes embed on first use
+    return store
+
+
+def benchmark_memory(count: int) -> None:
+    """Compare document storage memory of the two layouts, and of complete stores."""
+    print(f"\n=== Document storage memory ({count:,} documents) ===")
+    documents = make_documents(count)
+    
+    dict_bytes, dict_seconds = measure(lambda: build_dict_documents(documents))
+    table_bytes, table_seconds = measure(lambda: build_document_table(documents))
+    
+    print(f"dict per document : {dict_bytes / count:8.0f} bytes/doc  ({dict_bytes / 2**20:7.1f} MiB, {dict_seconds:.2f}s)")
+    print(f"columnar table    : {table_bytes / count:8.0f} bytes/doc  ({table_bytes / 2**20:7.1f} MiB, {table_seconds:.2f}s)")
+    print(f"reduction         : {dict_bytes / max(table_bytes, 1):8.1f}x")
+    
+    # Whole stores, on the same corpus (traced memory excludes the input documents)
+    for mode in ["keyword", "dense"]:
+        store_bytes, store_seconds = measure(lambda: build_vector_store(documents, mode))
+        label = f"store ({mode})"
+        print(f"{label:18s}: {store_bytes / count:8.0f} bytes/doc  ({store_bytes / 2**20:7.1f} MiB, {store_seconds:.2f}s)")
+
+
+def best_of(run, repeats: int = 3) -> float:
+    """Fastest of several runs, in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def benchmark_topk(sizes: list[int], k: int = 5, score_levels: tuple = (1000, 3, 1)) -> None:
+    """Compare full sorting against bounded top-k selection."""
+    print(f"\n=== Top-{k} selection ===")
+    rng = np.random.default_rng(0)
+    for count, levels in ((count, levels) for count in sizes for levels in score_levels):
+        # Quantized scores, so there are many ties like keyword/BM25 scoring;
+        # keyword overlap ratios take only a few values, or tie everywhere
+        scores = rng.integers(0, levels, size=count) / levels
+        day_numbers = rng.integers(738000, 739000, size=count).astype(np.int32)
+        positions = np.arange(count)
+        items = list(zip(positions.tolist(), scores.tolist(), day_numbers.tolist()))
+        
+        def python_sort():
+            ranked = list(items)
+            ranked.sort(key=lambda item: (-item[1], -item[2], item[0]))
+            return ranked[:k]
+        
+        def numpy_sort():
+            return np.lexsort((positions, -day_numbers, -scores))[:k]
+        
+        expected = [item[0] for item in python_sort()]
+        assert top_k(scores, k, positions, day_numbers).tolist() == expected
+        assert [item[0] for item in top_k_items(items, k)] == expected
+        
+        timings = {
+            "full Python sort": best_of(python_sort),
+            "full NumPy sort": best_of(numpy_sort),
+            "heap (top_k_items)": best_of(lambda: top_k_items(items, k)),
+            "partition (top_k)": best_of(lambda: top_k(scores, k, positions, day_numbers))
+        }
+        print(f"{count:>9,} documents, {levels} distinct scores:")
+        for name, ms in timings.items():
+            print(f"  {name:<20}: {ms:9.2f} ms")
+
+
+def benchmark_tokenizer(count: int) -> None:
+    """Compare the per-call regex tokenizer with the cached Tokenizer."""
+    print(f"\n=== Tokenization ({count:,} documents) ===")
+    # Interleave stop words and plurals like real text
+    documents = make_documents(count)
+    fillers = ["the", "and", "for", "startups", "policies", "investors", "80-IAC", "UPI 2.0", "$375M"]
+    texts = [f"{doc['text']} {' '.join(fillers)}" for doc in documents]
+    tokenizer = Tokenizer()
+    
+    def regex_tokens():
+        return [re.findall(r'\b[a-zA-Z]{3,}\b', text.lower()) for text in texts]
+    
+    def tokenizer_tokens():
+        return [tokenizer.tokenize(text) for text in texts]
+    
+    regex_ms = best_of(regex_tokens)
+    tokenizer_ms = best_of(tokenizer_tokens)
+    regex_count = sum(len(tokens) for tokens in regex_tokens())
+    tokenizer_count = sum(len(tokens) for tokens in tokenizer_tokens())
+    print(f"regex [a-zA-Z]{{3,}} : {regex_ms:8.1f} ms  {regex_count / count:6.1f} tokens/doc")
+    print(f"Tokenizer          : {tokenizer_ms:8.1f} ms  {tokenizer_count / count:6.1f} tokens/doc")
+
+
+def benchmark_shards(count: int, shard_counts: list[int], num_queries: int = 200) -> None:
+    """
+    Compare BM25 query throughput of one store against sharded stores.
+    
+    "Cold" is the first pass over the queries, when a sharded store still
+    fetches the terms' corpus statistics from its shards (two round trips
+    per batch); "warm" repeats them with the statistics cached (one).
+    """
+    print(f"\n=== Sharded search ({count:,} documents, {os.cpu_count()} cores) ===")
+    documents = make_documents(count)
+    rng = random.Random(1)
+    queries = [" ".join(make_word(rng.randint(0, 500)) for _ in range(3)) for _ in range(num_queries)]
+    batches = [queries[i:i + 20] for i in range(0, len(queries), 20)]
+    
+    def throughput(store) -> tuple:
+        store.add_documents(documents)
+        store.search_many(["warm up"], mode="bm25")
+        run = lambda: [store.search_many(batch, mode="bm25") for batch in batches]
+        cold = best_of(run, repeats=1) / 1000
+        warm = best_of(run) / 1000
+        return num_queries / cold, num_queries / warm
+    
+    single_cold, single = throughput(VectorStore())
+    print(f"VectorStore        : {single_cold:8.0f} queries/s cold, {single:8.0f} warm")
+    for num_shards in shard_counts:
+        store = ShardedVectorStore(num_shards=num_shards)
+        try:
+            cold, warm = throughput(store)
+        finally:
+            store.close()
+        print(
+            f"{num_shards} shards           : {cold:8.0f} queries/s cold, {warm:8.0f} warm"
+            f"  ({cold / single_cold:.2f}x, {warm / single:.2f}x)"
+        )
+
+
+def main():
+    """Run the benchmarks."""
+    which = sys.argv[1] if len(sys.argv) > 1 else "all"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print("=" * 50)
+    print("VENTUREPILOT AI - VECTOR STORE BENCHMARKS")
+    print("=" * 50)
+    if which in ("all", "memory"):
+        benchmark_memory(count or 20000)
+    if which in ("all", "topk"):
+        benchmark_topk([count] if count else [10_000, 100_000, 1_000_000])
+    if which in ("all", "tokenizer"):
+        benchmark_tokenizer(count or 20000)
+    if which in ("all", "shards"):
+        benchmark_shards(count or 50000, [2, 4])
+
+
+if __name__ == "__main__":
+    main()
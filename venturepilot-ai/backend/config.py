@@ -6,9 +6,48 @@ load_dotenv()
 # LLM Configuration (Mistral AI)
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "mistral-small-latest")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))  # concurrent requests to the API
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))  # idle connections kept open
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))  # seconds an idle connection is kept
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # seconds per request
 
 # Vector Store Configuration
 CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "bm25")  # "keyword" | "bm25" | "dense" | "ann" | "hybrid"
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "128"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))  # IVF clusters scanned per query
+SEARCH_SHARDS = int(os.getenv("SEARCH_SHARDS", "1"))  # worker processes searching in parallel, 1 disables
+
+# Tokenizer Configuration
+EXTRA_STOP_WORDS = frozenset(
+    word.strip().lower() for word in os.getenv("EXTRA_STOP_WORDS", "").split(",") if word.strip()
+)  # dropped in addition to the default stop words
+
+# Query Expansion Configuration (BM25 query weight of added terms, 0 disables that source)
+QUERY_SYNONYM_WEIGHT = float(os.getenv("QUERY_SYNONYM_WEIGHT", "0.7"))  # curated domain synonyms
+QUERY_COOCCURRENCE_WEIGHT = float(os.getenv("QUERY_COOCCURRENCE_WEIGHT", "0.3"))  # corpus neighbours
+
+# Retrieval Cache Configuration
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))  # entries, 0 disables
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))  # seconds
+
+# Passage Chunking Configuration
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "120"))  # words per indexed passage
+PASSAGE_OVERLAP_WORDS = int(os.getenv("PASSAGE_OVERLAP_WORDS", "20"))  # words shared by neighbours
+
+# Context Packing Configuration (estimated tokens of retrieved context per agent prompt, 0 disables)
+CONTEXT_TOKEN_BUDGETS = {
+    agent: int(os.getenv(f"{agent.upper()}_CONTEXT_TOKENS", default)) or None
+    for agent, default in (("policy", "1200"), ("investor", "1500"), ("market", "1200"), ("news", "1000"))
+}
+
+# Diversity Reranking Configuration (MMR relevance weight per category: 1 keeps the search ranking,
+# lower values favour results unlike those already chosen)
+MMR_LAMBDAS = {
+    category: float(os.getenv(f"{category.upper()}_MMR_LAMBDA", default))
+    for category, default in (("policy", "0.7"), ("investor", "0.5"), ("news", "0.6"), ("report", "0.7"))
+}
+MMR_CANDIDATE_FACTOR = int(os.getenv("MMR_CANDIDATE_FACTOR", "3"))  # candidates searched per result kept
 
 # Data Paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
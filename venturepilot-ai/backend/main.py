@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
@@ -6,9 +6,21 @@ from api.onboarding import router as onboarding_router
 from api.dashboard import router as dashboard_router
 from api.chat import router as chat_router
 from storage.vector_store import VectorStore
-from config import POLICIES_DIR, INVESTORS_DIR, NEWS_DIR, API_HOST, API_PORT
+from storage.sharded_store import ShardedVectorStore
+from storage.tokenizer import Tokenizer, DEFAULT_STOP_WORDS
+from storage.expansion import build_query_expansion
+from rag.retriever import get_cache_stats
+from rag.chunking import chunk_documents
+from utils.llm_client import close_llm_client
+from config import (
+    POLICIES_DIR, INVESTORS_DIR, NEWS_DIR, API_HOST, API_PORT,
+    SEARCH_MODE, EMBEDDING_DIM, ANN_NPROBE, SEARCH_SHARDS, CHROMA_PERSIST_DIRECTORY,
+    PASSAGE_WORDS, PASSAGE_OVERLAP_WORDS, EXTRA_STOP_WORDS,
+    QUERY_SYNONYM_WEIGHT, QUERY_COOCCURRENCE_WEIGHT
+)
 import os
 import json
+from typing import Optional
 
 app = FastAPI(
     title="VenturePilot AI",
@@ -53,45 +65,180 @@ def load_data_files(directory: str, category: str) -> list[dict]:
     
     return documents
 
+def data_fingerprint(directories: list[str]) -> list:
+    """Name, size and modification time of every data file, to detect changes."""
+    fingerprint = []
+    for directory in directories:
+        if not os.path.exists(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                stat = os.stat(os.path.join(directory, filename))
+                fingerprint.append([directory, filename, stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+def load_snapshot(fingerprint: list):
+    """Open the persisted vector store if it matches the current data files."""
+    store_class = ShardedVectorStore if SEARCH_SHARDS > 1 else VectorStore
+    if not store_class.snapshot_exists(CHROMA_PERSIST_DIRECTORY):
+        return None
+    try:
+        store = store_class.load(CHROMA_PERSIST_DIRECTORY, mode=SEARCH_MODE, ann_nprobe=ANN_NPROBE)
+    except Exception as e:
+        print(f"Error loading vector store snapshot: {e}")
+        return None
+    if SEARCH_SHARDS > 1:
+        layout_matches = store.num_shards == SEARCH_SHARDS and store.embedding_dim == EMBEDDING_DIM
+    else:
+        layout_matches = store.embedder.dim == EMBEDDING_DIM
+    if not layout_matches or store.snapshot_metadata.get("data_fingerprint") != fingerprint:
+        print("Vector store snapshot is stale - rebuilding")
+        if SEARCH_SHARDS > 1:
+            store.close()
+        return None
+    return store
+
+def enable_query_expansion(store) -> None:
+    """Compile the domain synonyms and corpus neighbours into the store's query expansion."""
+    if QUERY_SYNONYM_WEIGHT <= 0 and QUERY_COOCCURRENCE_WEIGHT <= 0:
+        return
+    try:
+        expansion = build_query_expansion(
+            store,
+            synonym_weight=QUERY_SYNONYM_WEIGHT,
+            cooccurrence_weight=QUERY_COOCCURRENCE_WEIGHT
+        )
+        store.set_query_expansion(expansion)
+        print(f"Compiled query expansion for {len(expansion)} terms and phrases")
+    except Exception as e:
+        print(f"Error building query expansion: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Load all data into vector store on startup."""
     global vector_store
-    vector_store = VectorStore()
+    
+    # Memory-map the persisted index when the data files (and the passage
+    # chunking and stop-word settings) have not changed
+    fingerprint = data_fingerprint([POLICIES_DIR, INVESTORS_DIR, NEWS_DIR])
+    fingerprint.append(["chunking", PASSAGE_WORDS, PASSAGE_OVERLAP_WORDS])
+    fingerprint.append(["extra_stop_words", sorted(EXTRA_STOP_WORDS)])
+    vector_store = load_snapshot(fingerprint)
+    if vector_store is not None:
+        print(f"Loaded {vector_store.num_alive} documents from {CHROMA_PERSIST_DIRECTORY}")
+        enable_query_expansion(vector_store)
+        print("VenturePilot AI started successfully!")
+        return
+    
+    options = {
+        "persist_directory": CHROMA_PERSIST_DIRECTORY,
+        "mode": SEARCH_MODE,
+        "embedding_dim": EMBEDDING_DIM,
+        "ann_nprobe": ANN_NPROBE,
+        "tokenizer": Tokenizer(stop_words=DEFAULT_STOP_WORDS | EXTRA_STOP_WORDS)
+    }
+    if SEARCH_SHARDS > 1:
+        # Hash-partition the index over worker processes, one core each
+        vector_store = ShardedVectorStore(num_shards=SEARCH_SHARDS, **options)
+    else:
+        vector_store = VectorStore(**options)
     
     # Load policies
     policy_docs = load_data_files(POLICIES_DIR, "policy")
     if policy_docs:
-        vector_store.add_documents(policy_docs)
+        vector_store.add_documents(chunk_documents(policy_docs))
         print(f"Loaded {len(policy_docs)} policy documents")
     
     # Load investors
     investor_docs = load_data_files(INVESTORS_DIR, "investor")
     if investor_docs:
-        vector_store.add_documents(investor_docs)
+        vector_store.add_documents(chunk_documents(investor_docs))
         print(f"Loaded {len(investor_docs)} investor documents")
     
     # Load news
     news_docs = load_data_files(NEWS_DIR, "news")
     if news_docs:
-        vector_store.add_documents(news_docs)
+        vector_store.add_documents(chunk_documents(news_docs))
         print(f"Loaded {len(news_docs)} news documents")
     
+    # Persist the index so the next boot (and other workers) can map it
+    try:
+        vector_store.save(metadata={"data_fingerprint": fingerprint})
+    except Exception as e:
+        print(f"Error saving vector store snapshot: {e}")
+    
+    enable_query_expansion(vector_store)
     print("VenturePilot AI started successfully!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the shard worker processes of a sharded vector store and close the LLM connection pool."""
+    if isinstance(vector_store, ShardedVectorStore):
+        vector_store.close()
+    close_llm_client()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "ok"}
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the retrieval result cache, for sizing it."""
+    return get_cache_stats()
+
+@app.get("/api/corpus/stats")
+async def corpus_stats():
+    """Document counts per category, geography, source and month."""
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="Vector store is not loaded yet")
+    return vector_store.corpus_statistics()
+
 @app.get("/")
 async def root():
     """Root endpoint."""
     return {"message": "Welcome to VenturePilot AI", "status": "running"}
 
+@app.get("/api/search")
+async def search(
+    q: str,
+    category: Optional[str] = None,
+    geography: Optional[str] = None,
+    page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """One page of search results; pass `next_cursor` back for the next page."""
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="Vector store is not loaded yet")
+    filters = {key: value for key, value in (("category", category), ("geography", geography)) if value}
+    try:
+        return vector_store.search_page(q, filters or None, page_size=page_size, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/news")
-async def get_news():
-    """Get all news items for the news ticker."""
+async def get_news(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """
+    Get news items for the news ticker.
+    
+    Without `limit` all items are returned. With it, the newest `limit`
+    items are returned (each reassembled from its indexed passages, plus
+    its "id") and the cursor of the next page is sent in the X-Next-Cursor
+    header.
+    """
+    if limit is not None and vector_store is not None:
+        try:
+            page = vector_store.list_page({"category": "news"}, page_size=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        documents = (vector_store.get_document(result["parent_id"]) for result in page["results"])
+        return [document for document in documents if document is not None]
     try:
         news_docs = load_data_files(NEWS_DIR, "news")
         return news_docs
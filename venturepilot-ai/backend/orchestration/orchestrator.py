@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 from typing import Optional
 from datetime import datetime
 
@@ -7,11 +8,13 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agents.startup_agent import analyze_startup
-from agents.policy_agent import analyze_policy
-from agents.investor_agent import match_investors
-from agents.market_agent import analyze_market
-from agents.news_agent import analyze_news
+from agents.policy_agent import analyze_policy, build_policy_request
+from agents.investor_agent import match_investors, build_investor_request
+from agents.market_agent import analyze_market, build_market_request
+from agents.news_agent import analyze_news, build_news_request
 from agents.strategy_agent import synthesize_strategy
+from rag.retriever import retrieve_context_batch
+from storage import tracing
 
 
 class Orchestrator:
@@ -31,17 +34,46 @@ class Orchestrator:
         """Initialize orchestrator with vector store."""
         self.vector_store = vector_store
         self.execution_log = []
+        self._retrieval_spans = []
     
-    def _log(self, agent_name: str, status: str, duration_ms: int = 0):
-        """Log agent execution."""
-        self.execution_log.append({
+    def _log(self, agent_name: str, status: str, duration_ms: int = 0, spans: Optional[list] = None):
+        """Log agent execution, with the retrieval spans it recorded (see `storage.tracing`)."""
+        entry = {
             "agent": agent_name,
             "status": status,
             "timestamp": datetime.now().isoformat(),
             "duration_ms": duration_ms
-        })
+        }
+        if spans:
+            entry["retrieval_spans"] = spans
+        self.execution_log.append(entry)
         print(f"[Orchestrator] {agent_name}: {status} ({duration_ms}ms)")
     
+    def _retrieve_contexts(self, startup_profile: dict) -> dict:
+        """
+        Fetch the context of every retrieval agent with one batched search.
+        
+        Returns agent name -> context. On failure the dict is empty and each
+        agent falls back to retrieving its own context.
+        """
+        requests = {
+            "policy_agent": build_policy_request(startup_profile),
+            "investor_agent": build_investor_request(startup_profile),
+            "market_agent": build_market_request(startup_profile),
+            "news_agent": build_news_request(startup_profile)
+        }
+        start_time = time.perf_counter()
+        with tracing.trace() as retrieval_trace:
+            try:
+                contexts = retrieve_context_batch(list(requests.values()), vector_store=self.vector_store)
+            except Exception as e:
+                print(f"[Orchestrator] batched retrieval failed: {str(e)}")
+                return {}
+        duration = int((time.perf_counter() - start_time) * 1000)
+        self._retrieval_spans.extend(retrieval_trace.spans)
+        self._log("retrieval", "completed", duration, retrieval_trace.to_list())
+        return dict(zip(requests, contexts))
+    
     def run(self, startup_input: dict) -> dict:
         """
         Run full analysis pipeline.
@@ -60,10 +92,11 @@ class Orchestrator:
         }
         """
         self.execution_log = []
+        self._retrieval_spans = []  # every retrieval span of this run
         results = {}
         
         # 1. Startup Agent
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             self._log("startup_agent", "started")
             startup_profile = analyze_startup(startup_input)
@@ -78,70 +111,85 @@ class Orchestrator:
             })
             
             results["startup_profile"] = startup_profile
-            duration = int((datetime.now() - start_time).total_seconds() * 1000)
+            duration = int((time.perf_counter() - start_time) * 1000)
             self._log("startup_agent", "completed", duration)
         except Exception as e:
             self._log("startup_agent", f"failed: {str(e)}")
             raise
         
+        # Retrieve context for agents 2-5 in a single vector store call
+        contexts = self._retrieve_contexts(results["startup_profile"])
+        
         # 2. Policy Agent
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             self._log("policy_agent", "started")
-            results["policy"] = analyze_policy(
-                startup_profile=results["startup_profile"],
-                vector_store=self.vector_store
-            )
-            duration = int((datetime.now() - start_time).total_seconds() * 1000)
-            self._log("policy_agent", "completed", duration)
+            with tracing.trace() as agent_trace:
+                results["policy"] = analyze_policy(
+                    startup_profile=results["startup_profile"],
+                    vector_store=self.vector_store,
+                    context=contexts.get("policy_agent")
+                )
+            duration = int((time.perf_counter() - start_time) * 1000)
+            self._retrieval_spans.extend(agent_trace.spans)
+            self._log("policy_agent", "completed", duration, agent_trace.to_list())
         except Exception as e:
             self._log("policy_agent", f"failed: {str(e)}")
             results["policy"] = {"error": str(e)}
         
         # 3. Investor Agent
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             self._log("investor_agent", "started")
-            results["investors"] = match_investors(
-                startup_profile=results["startup_profile"],
-                vector_store=self.vector_store
-            )
-            duration = int((datetime.now() - start_time).total_seconds() * 1000)
-            self._log("investor_agent", "completed", duration)
+            with tracing.trace() as agent_trace:
+                results["investors"] = match_investors(
+                    startup_profile=results["startup_profile"],
+                    vector_store=self.vector_store,
+                    context=contexts.get("investor_agent")
+                )
+            duration = int((time.perf_counter() - start_time) * 1000)
+            self._retrieval_spans.extend(agent_trace.spans)
+            self._log("investor_agent", "completed", duration, agent_trace.to_list())
         except Exception as e:
             self._log("investor_agent", f"failed: {str(e)}")
             results["investors"] = []
         
         # 4. Market Agent
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             self._log("market_agent", "started")
-            results["market"] = analyze_market(
-                startup_profile=results["startup_profile"],
-                vector_store=self.vector_store
-            )
-            duration = int((datetime.now() - start_time).total_seconds() * 1000)
-            self._log("market_agent", "completed", duration)
+            with tracing.trace() as agent_trace:
+                results["market"] = analyze_market(
+                    startup_profile=results["startup_profile"],
+                    vector_store=self.vector_store,
+                    context=contexts.get("market_agent")
+                )
+            duration = int((time.perf_counter() - start_time) * 1000)
+            self._retrieval_spans.extend(agent_trace.spans)
+            self._log("market_agent", "completed", duration, agent_trace.to_list())
         except Exception as e:
             self._log("market_agent", f"failed: {str(e)}")
             results["market"] = {"error": str(e)}
         
         # 5. News Agent
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             self._log("news_agent", "started")
-            results["news"] = analyze_news(
-                startup_profile=results["startup_profile"],
-                vector_store=self.vector_store
-            )
-            duration = int((datetime.now() - start_time).total_seconds() * 1000)
-            self._log("news_agent", "completed", duration)
+            with tracing.trace() as agent_trace:
+                results["news"] = analyze_news(
+                    startup_profile=results["startup_profile"],
+                    vector_store=self.vector_store,
+                    context=contexts.get("news_agent")
+                )
+            duration = int((time.perf_counter() - start_time) * 1000)
+            self._retrieval_spans.extend(agent_trace.spans)
+            self._log("news_agent", "completed", duration, agent_trace.to_list())
         except Exception as e:
             self._log("news_agent", f"failed: {str(e)}")
             results["news"] = {"error": str(e)}
         
         # 6. Strategy Agent (NO retriever access)
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             self._log("strategy_agent", "started")
             results["strategy"] = synthesize_strategy(
@@ -151,17 +199,22 @@ class Orchestrator:
                 market_analysis=results.get("market", {}),
                 news_analysis=results.get("news", {})
             )
-            duration = int((datetime.now() - start_time).total_seconds() * 1000)
+            duration = int((time.perf_counter() - start_time) * 1000)
             self._log("strategy_agent", "completed", duration)
         except Exception as e:
             self._log("strategy_agent", f"failed: {str(e)}")
             results["strategy"] = {"error": str(e)}
         
-        # Add execution metadata
+        # Add execution metadata, with retrieval time per stage to tell
+        # slow retrieval apart from slow LLM calls
         results["_metadata"] = {
             "execution_log": self.execution_log,
             "total_agents": 6,
-            "completed_agents": sum(1 for log in self.execution_log if "completed" in log["status"])
+            "completed_agents": sum(
+                1 for log in self.execution_log
+                if log["agent"].endswith("_agent") and "completed" in log["status"]
+            ),
+            "retrieval_stages": tracing.stage_totals(self._retrieval_spans)
         }
         
         return results
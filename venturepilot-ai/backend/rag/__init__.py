@@ -1,4 +1,4 @@
 # RAG module init
-from .retriever import retrieve_context
+from .retriever import retrieve_context, retrieve_context_batch, get_cache_stats, clear_cache
 
-__all__ = ["retrieve_context"]
+__all__ = ["retrieve_context", "retrieve_context_batch", "get_cache_stats", "clear_cache"]
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+import time
+
+
+class QueryCache:
+    """
+    Bounded LRU cache with a time-to-live for retrieval results.
+    
+    Entries remember the vector store generation they were computed at, so
+    any write to the store (add, upsert, delete) invalidates them without
+    the store having to know about the cache.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 300.0):
+        """
+        Initialize the cache.
+        
+        Args:
+            maxsize: Maximum number of entries (0 disables caching)
+            ttl_seconds: Seconds an entry stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, generation, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """Return a cached value, or None on a miss (absent, expired or stale)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_generation, value = entry
+                if expires_at > time.monotonic() and entry_generation == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, generation: int, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and occupancy, for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
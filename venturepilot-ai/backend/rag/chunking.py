@@ -0,0 +1,114 @@
+"""
+Passage chunking for ingestion.
+
+Documents are split into overlapping windows of whole words before they are
+indexed, so a search returns the relevant passage of a long report instead
+of its entire text, and prompts only grow with the number of passages used.
+"""
+import re
+
+from config import PASSAGE_WORDS, PASSAGE_OVERLAP_WORDS
+from storage.vector_store import document_key
+
+_WORD_PATTERN = re.compile(r"\S+")
+
+
+def chunk_document(
+    doc: dict,
+    passage_words: int = PASSAGE_WORDS,
+    overlap_words: int = PASSAGE_OVERLAP_WORDS
+) -> list[dict]:
+    """
+    Split a document into overlapping passages.
+    
+    Each passage keeps the document's metadata and gets the id
+    "<parent id>#<passage number>", the parent's stable id ("parent_id")
+    and the character offset of its text in the parent's text
+    ("passage_start"). Documents no longer than one passage become a
+    single passage. The vector store writes, fetches and deletes the
+    passages together by the parent id, so upsert all of a document's
+    passages in one call.
+    
+    Args:
+        doc: Document in the `VectorStore.add_documents` format
+        passage_words: Maximum words per passage
+        overlap_words: Words shared by consecutive passages
+    
+    Returns:
+        Passages in text order (none if the text has no words)
+    """
+    if passage_words <= 0 or not 0 <= overlap_words < passage_words:
+        raise ValueError("Need passage_words > 0 and 0 <= overlap_words < passage_words")
+    
+    text = doc.get("text") or ""
+    spans = [match.span() for match in _WORD_PATTERN.finditer(text)]
+    parent_id = document_key(doc)
+    step = passage_words - overlap_words
+    
+    passages = []
+    for number, first in enumerate(range(0, max(len(spans) - overlap_words, 1), step)):
+        if first >= len(spans):
+            break
+        last = min(first + passage_words, len(spans)) - 1
+        start, end = spans[first][0], spans[last][1]
+        passages.append({
+            **doc,
+            "id": f"{parent_id}#{number}",
+            "text": text[start:end],
+            "parent_id": parent_id,
+            "passage_start": start
+        })
+    return passages
+
+
+def chunk_documents(
+    documents: list[dict],
+    passage_words: int = PASSAGE_WORDS,
+    overlap_words: int = PASSAGE_OVERLAP_WORDS
+) -> list[dict]:
+    """Split every document into passages (see `chunk_document`)."""
+    passages = []
+    for doc in documents:
+        passages.extend(chunk_document(doc, passage_words, overlap_words))
+    return passages
+
+
+def merge_adjacent_passages(results: list[dict]) -> list[dict]:
+    """
+    Merge search results that are overlapping passages of the same parent.
+    
+    Passages chunked with an overlap share words with their neighbours, so
+    consecutive passages of one document that were both retrieved come back
+    as one span of text. A merged result takes the id, score and rank of its
+    best passage; passages of a parent that are not contiguous stay apart.
+    
+    Args:
+        results: Search results, best first
+    
+    Returns:
+        Results with contiguous passages merged, best first
+    """
+    by_parent = {}
+    for rank, result in enumerate(results):
+        by_parent.setdefault(result["parent_id"], []).append((rank, result))
+    
+    merged = []  # (rank of best passage, result)
+    for passages in by_parent.values():
+        passages.sort(key=lambda item: item[1]["start"])
+        best_rank, current = passages[0]
+        for rank, passage in passages[1:]:
+            if passage["start"] > current["end"]:
+                merged.append((best_rank, current))
+                best_rank, current = rank, passage
+                continue
+            # Keep the best passage's id and score, extend the span
+            base = current if best_rank < rank else passage
+            text = current["text"]
+            if passage["end"] > current["end"]:
+                text += passage["text"][current["end"] - passage["start"]:]
+            current = {**base, "text": text, "start": current["start"], "end": max(current["end"], passage["end"])}
+            best_rank = min(best_rank, rank)
+        merged.append((best_rank, current))
+    
+    merged.sort(key=lambda item: item[0])
+    return [result for _, result in merged]
@@ -0,0 +1,110 @@
+"""
+Token-budgeted context packing.
+
+Agents paste retrieved context straight into their prompts, so the size of
+that context decides the prompt's input tokens. The packer fits search
+results into a fixed token budget: results are chosen by relevance per
+token (greedy knapsack), sentences that an already chosen result contains
+are dropped, and the chosen results keep their search order.
+
+Tokens are estimated locally, without the model's tokenizer: every word
+counts one token per started 6 characters and every punctuation mark one
+token, which slightly overestimates typical subword tokenizers on English.
+"""
+import heapq
+import math
+import re
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+# Characters per token of a long word
+CHARS_PER_TOKEN = 6
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated number of model tokens in a text."""
+    return sum(math.ceil(len(piece) / CHARS_PER_TOKEN) for piece in _PIECE_PATTERN.findall(text))
+
+
+def split_sentences(text: str) -> list[str]:
+    """Sentences of a text, split after ".", "!" or "?" followed by whitespace."""
+    return [sentence for sentence in _SENTENCE_PATTERN.split(text.strip()) if sentence]
+
+
+def pack_context(results: list[dict], token_budget: int, format_entry) -> list[str]:
+    """
+    Context entries of the most relevant results that fit a token budget.
+    
+    Results are taken in order of relevance score per estimated token.
+    Sentences already contained in a packed result (compared as whole
+    sentences, ignoring case and whitespace) are left out, so a result's
+    cost is re-estimated when it comes up and it waits its turn again if it
+    became cheaper. Results that no longer fit are skipped in favour of
+    smaller ones. If no result fits at all, the best one is cut to its
+    leading words that do fit.
+    
+    Args:
+        results: Search results (text, metadata and relevance_score)
+        token_budget: Largest estimated token count of all entries together
+        format_entry: Function (result, text) -> context entry string
+    
+    Returns:
+        Context entries in search result order
+    """
+    if not results or token_budget <= 0:
+        return []
+    
+    # Relevance must be positive to trade off against tokens; dense scores may not be
+    scores = [result.get("relevance_score", 0.0) for result in results]
+    low = min(scores)
+    values = [score - low + 1e-6 if low <= 0 else score for score in scores]
+    sentences = [split_sentences(result.get("text", "")) for result in results]
+    
+    packed_sentences = set()  # normalized sentences of the packed results
+    entries = {}  # result index -> packed entry
+    used = 0
+    heap = []
+    for i, result in enumerate(results):
+        entry = format_entry(result, " ".join(sentences[i]))
+        tokens = estimate_tokens(entry)
+        heapq.heappush(heap, (-values[i] / max(tokens, 1), i, tokens))
+    
+    while heap:
+        _, i, tokens = heapq.heappop(heap)
+        remaining = [s for s in sentences[i] if _normalize(s) not in packed_sentences]
+        if not remaining:
+            continue
+        entry = format_entry(results[i], " ".join(remaining))
+        current = estimate_tokens(entry)
+        if current < tokens:
+            heapq.heappush(heap, (-values[i] / max(current, 1), i, current))
+            continue
+        if used + current > token_budget:
+            continue
+        entries[i] = entry
+        used += current
+        packed_sentences.update(_normalize(s) for s in remaining)
+    
+    if not entries:
+        return _truncated_entry(results[0], sentences[0], token_budget, format_entry)
+    return [entries[i] for i in sorted(entries)]
+
+
+def _truncated_entry(result: dict, sentences: list[str], token_budget: int, format_entry) -> list[str]:
+    """The entry of a result cut to as many leading words as fit the budget."""
+    words = " ".join(sentences).split()
+    low, high = 0, len(words)  # binary search for the longest fitting prefix
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(format_entry(result, " ".join(words[:middle]))) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return [format_entry(result, " ".join(words[:low]))] if low else []
+
+
+def _normalize(sentence: str) -> str:
+    """Lowercase sentence with collapsed whitespace, for overlap checks."""
+    return _SPACE_PATTERN.sub(" ", sentence.lower()).strip()
@@ -3,9 +3,21 @@ from datetime import datetime, timedelta
 import sys
 import os
 
+import numpy as np
+
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from config import RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL, MMR_LAMBDAS, MMR_CANDIDATE_FACTOR
+from rag.cache import QueryCache
+from rag.chunking import merge_adjacent_passages
+from rag.packing import pack_context
+from storage import tracing
+
+# Formatted results shared across requests, keyed by normalized query terms,
+# filters and k, and invalidated by the vector store's write generation
+_result_cache = QueryCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl_seconds=RETRIEVAL_CACHE_TTL)
+
 
 def retrieve_context(
     query: str,
@@ -13,7 +25,11 @@ def retrieve_context(
     geography: Optional[str] = None,
     recency_days: Optional[int] = None,
     vector_store = None,
-    k: int = 5
+    k: int = 5,
+    mode: Optional[str] = None,
+    merge_adjacent: bool = False,
+    token_budget: Optional[int] = None,
+    mmr_lambda: Optional[float] = None
 ) -> list[str]:
     """
     Retrieve relevant context from the vector store.
@@ -25,6 +41,14 @@ def retrieve_context(
         recency_days: Only return documents from the last N days
         vector_store: VectorStore instance
         k: Number of results to return
+        mode: Search mode, e.g. "hybrid" (defaults to the store's mode)
+        merge_adjacent: Merge overlapping passages of the same document
+            into one context entry
+        token_budget: Pack the k results into at most this many estimated
+            tokens (see `rag.packing.pack_context`); None keeps all of them
+        mmr_lambda: Relevance weight of the diversity reranking (see
+            `mmr_rerank`); defaults to the category's MMR_LAMBDAS entry,
+            and 1.0 keeps the search ranking
     
     Returns:
         List of relevant text strings
@@ -33,52 +57,243 @@ def retrieve_context(
         print("Warning: No vector store provided")
         return []
     
-    # Build filters
+    filters, since = _build_filters(category, geography, recency_days)
+    
+    mode = mode or vector_store.mode
+    mmr_lambda = _mmr_lambda(category, mmr_lambda)
+    key = _cache_key(vector_store, query, filters, since, k, mode, merge_adjacent, token_budget, mmr_lambda)
+    generation = vector_store.generation
+    with tracing.span("cache", candidates=1) as span:
+        cached = _result_cache.get(key, generation)
+        span.results = int(cached is not None)
+    if cached is not None:
+        return list(cached)
+    
+    # Search vector store
+    results = vector_store.search(query, filters=filters, k=_candidate_count(k, mmr_lambda), mode=mode, since=since)
+    results = _rerank(vector_store, results, k, mmr_lambda)
+    if merge_adjacent:
+        results = merge_adjacent_passages(results)
+    
+    context_texts = _format_context(results, token_budget)
+    _result_cache.put(key, generation, context_texts)
+    return list(context_texts)
+
+
+def retrieve_context_batch(
+    requests: list[dict],
+    vector_store = None
+) -> list[list[str]]:
+    """
+    Retrieve context for several queries with one vector store call per search mode.
+    
+    Args:
+        requests: One dict per query with the `retrieve_context` arguments
+            (query, and optionally category, geography, recency_days, k, mode,
+            merge_adjacent, token_budget, mmr_lambda)
+        vector_store: VectorStore instance
+    
+    Returns:
+        One list of relevant text strings per request, in request order
+    """
+    if vector_store is None:
+        print("Warning: No vector store provided")
+        return [[] for _ in requests]
+    
+    generation = vector_store.generation
+    contexts = [None] * len(requests)
+    misses_by_mode = {}  # mode -> [(index, cache key, filters, since, MMR lambda)]
+    with tracing.span("cache", candidates=len(requests)) as span:
+        for i, request in enumerate(requests):
+            filters, since = _build_filters(
+                request.get("category"),
+                request.get("geography"),
+                request.get("recency_days")
+            )
+            mode = request.get("mode") or vector_store.mode
+            mmr_lambda = _mmr_lambda(request.get("category"), request.get("mmr_lambda"))
+            key = _cache_key(
+                vector_store, request["query"], filters, since,
+                request.get("k", 5), mode, request.get("merge_adjacent", False),
+                request.get("token_budget"), mmr_lambda
+            )
+            cached = _result_cache.get(key, generation)
+            if cached is not None:
+                contexts[i] = list(cached)
+            else:
+                misses_by_mode.setdefault(mode, []).append((i, key, filters, since, mmr_lambda))
+        span.results = sum(context is not None for context in contexts)
+    
+    for mode, misses in misses_by_mode.items():
+        # Search vector store once for all cache misses of a mode
+        batch_results = vector_store.search_many(
+            [requests[i]["query"] for i, _, _, _, _ in misses],
+            [filters for _, _, filters, _, _ in misses],
+            k=[_candidate_count(requests[i].get("k", 5), mmr_lambda) for i, _, _, _, mmr_lambda in misses],
+            mode=mode,
+            since=[since for _, _, _, since, _ in misses]
+        )
+        for (i, key, _, _, mmr_lambda), results in zip(misses, batch_results):
+            results = _rerank(vector_store, results, requests[i].get("k", 5), mmr_lambda)
+            if requests[i].get("merge_adjacent", False):
+                results = merge_adjacent_passages(results)
+            context_texts = _format_context(results, requests[i].get("token_budget"))
+            _result_cache.put(key, generation, context_texts)
+            contexts[i] = list(context_texts)
+    
+    return contexts
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters of the retrieval result cache."""
+    return _result_cache.stats()
+
+
+def clear_cache() -> None:
+    """Empty the retrieval result cache and reset its counters."""
+    _result_cache.clear()
+
+
+def _cache_key(
+    vector_store,
+    query: str,
+    filters: dict,
+    since,
+    k: int,
+    mode: str,
+    merge_adjacent: bool,
+    token_budget: Optional[int],
+    mmr_lambda: float
+) -> tuple:
+    """Cache key: search mode, normalized query terms, filters, window, k, merging, budget and MMR weight.
+    
+    Store generations are unique per process, so entries from another store
+    never match and the key itself does not need to identify the store.
+    """
+    return (
+        mode,
+        vector_store.normalize_query(query),
+        tuple(sorted(filters.items())),
+        since,
+        k,
+        merge_adjacent,
+        token_budget,
+        mmr_lambda
+    )
+
+
+def mmr_rerank(results: list[dict], vectors: np.ndarray, k: int, mmr_lambda: float) -> list[dict]:
+    """
+    Diverse top-k of search results by Maximal Marginal Relevance.
+    
+    Each step picks the candidate with the highest
+    `mmr_lambda * relevance - (1 - mmr_lambda) * similarity`, where relevance
+    is the search score scaled to [0, 1] over the candidates and similarity
+    is the largest embedding cosine to a result already picked. That largest
+    similarity is kept per candidate and updated with one matrix-vector
+    product per pick, so selection costs O(k * candidates).
+    
+    Args:
+        results: Candidates, best first
+        vectors: Unit-length embedding of each candidate, as matrix rows
+        k: Number of results to keep
+        mmr_lambda: Relevance weight in [0, 1]; 1.0 keeps the search ranking
+    
+    Returns:
+        Up to k results in the order they were picked
+    """
+    if mmr_lambda >= 1.0 or len(results) <= 1:
+        return results[:k]
+    
+    scores = np.array([result.get("relevance_score", 0.0) for result in results], dtype=np.float64)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(len(results))
+    similarity = np.zeros(len(results))
+    available = np.ones(len(results), dtype=bool)
+    
+    picked = []
+    for _ in range(min(k, len(results))):
+        marginal = np.where(available, mmr_lambda * relevance - (1.0 - mmr_lambda) * similarity, -np.inf)
+        best = int(np.argmax(marginal))
+        picked.append(best)
+        available[best] = False
+        np.maximum(similarity, vectors @ vectors[best], out=similarity)
+    return [results[i] for i in picked]
+
+
+def _mmr_lambda(category: Optional[str], mmr_lambda: Optional[float]) -> float:
+    """Explicit MMR weight, else the category's configured one (1.0 without either)."""
+    if mmr_lambda is not None:
+        return float(mmr_lambda)
+    return MMR_LAMBDAS.get(category, 1.0)
+
+
+def _candidate_count(k: int, mmr_lambda: float) -> int:
+    """Results to search for: extra candidates when MMR will choose among them."""
+    return k if mmr_lambda >= 1.0 else k * MMR_CANDIDATE_FACTOR
+
+
+def _rerank(vector_store, results: list[dict], k: int, mmr_lambda: float) -> list[dict]:
+    """Diverse top-k of the candidates (see `mmr_rerank`)."""
+    if mmr_lambda >= 1.0 or len(results) <= 1:
+        return results[:k]
+    with tracing.span("rerank", candidates=len(results)) as span:
+        vectors = vector_store.embed_texts([result.get("text", "") for result in results])
+        reranked = mmr_rerank(results, vectors, k, mmr_lambda)
+        span.results = len(reranked)
+    return reranked
+
+
+def _build_filters(
+    category: Optional[str],
+    geography: Optional[str],
+    recency_days: Optional[int]
+) -> tuple:
+    """Search filters and window start for the retrieval arguments."""
     filters = {}
     if category:
         filters["category"] = category
     if geography:
         filters["geography"] = geography
     
-    # Search vector store
-    results = vector_store.search(query, filters=filters, k=k * 2)  # Get more to filter by recency
-    
-    # Filter by recency if specified
+    # Recency is applied inside the search through the store's time index,
+    # so exactly k recent results come back without over-fetching
+    since = None
     if recency_days:
-        cutoff_date = datetime.now() - timedelta(days=recency_days)
-        cutoff_str = cutoff_date.isoformat()[:10]
-        
-        results = [
-            r for r in results
-            if r.get("metadata", {}).get("timestamp", "") >= cutoff_str
-        ]
-    
-    # Sort by relevance score (already sorted) and take top k
-    results = results[:k]
-    
-    # Extract text from results
-    context_texts = []
-    for result in results:
-        text = result.get("text", "")
-        metadata = result.get("metadata", {})
-        
-        # Include metadata context
-        source = metadata.get("source", "Unknown")
-        timestamp = metadata.get("timestamp", "")
-        title = metadata.get("title", "")
-        
-        context_entry = f"[Source: {source}]"
-        if title:
-            context_entry += f" [{title}]"
-        if timestamp:
-            context_entry += f" [{timestamp}]"
-        context_entry += f"\n{text}"
-        
-        context_texts.append(context_entry)
+        since = (datetime.now() - timedelta(days=recency_days)).date()
     
+    return filters, since
+
+
+def _format_context(results: list[dict], token_budget: Optional[int] = None) -> list[str]:
+    """Format search results as context strings, packed into a token budget if one is given."""
+    with tracing.span("context", candidates=len(results)) as span:
+        if token_budget is not None:
+            context_texts = pack_context(results, token_budget, _format_entry)
+        else:
+            context_texts = [_format_entry(result, result.get("text", "")) for result in results]
+        span.results = len(context_texts)
     return context_texts
 
 
+def _format_entry(result: dict, text: str) -> str:
+    """Context string of a search result with source metadata."""
+    metadata = result.get("metadata", {})
+    
+    # Include metadata context
+    source = metadata.get("source", "Unknown")
+    timestamp = metadata.get("timestamp", "")
+    title = metadata.get("title", "")
+    
+    context_entry = f"[Source: {source}]"
+    if title:
+        context_entry += f" [{title}]"
+    if timestamp:
+        context_entry += f" [{timestamp}]"
+    context_entry += f"\n{text}"
+    return context_entry
+
+
 def retrieve_by_category(
     category: str,
     query: str,
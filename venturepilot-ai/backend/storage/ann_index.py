@@ -0,0 +1,240 @@
+from typing import Optional
+import math
+
+import numpy as np
+
+from .buffers import GrowableArray
+
+
+class IVFIndex:
+    """Inverted-file (IVF) approximate nearest neighbour index.
+    
+    Vectors are clustered with spherical k-means; each cluster keeps an
+    inverted list of document positions. A query only scores the vectors in
+    the `nprobe` clusters whose centroids are closest to it, trading a little
+    recall for a large cut in work. Raising `nprobe` raises recall.
+    
+    The index stores positions only; vectors are read from the caller's
+    matrix, so it adds a few bytes per document on top of the embeddings.
+    Until `min_train_size` vectors have been added it answers exactly.
+    
+    Centroids and inverted lists are swapped in as one unit when the index
+    is retrained, so a concurrent query never pairs new centroids with old
+    lists. Lists only grow; queries may see positions added after they
+    started and should ignore positions they do not know about.
+    """
+    
+    def __init__(
+        self,
+        dim: int,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        min_train_size: int = 2048,
+        kmeans_iterations: int = 10,
+        seed: int = 0
+    ):
+        """
+        Initialize the index.
+        
+        Args:
+            dim: Vector dimension
+            nlist: Number of clusters (defaults to ~sqrt(N) at training time)
+            nprobe: Number of clusters scanned per query
+            min_train_size: Vectors required before clustering kicks in
+            kmeans_iterations: Lloyd iterations per training run
+            seed: Random seed for reproducible training
+        """
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        
+        # (centroids, lists): (nlist, dim) float32 centroids once trained,
+        # and cluster -> GrowableArray of positions
+        self._clusters = (None, [])
+        self.trained_size = 0
+        self._positions = GrowableArray(np.int32)  # every indexed position
+    
+    @property
+    def centroids(self) -> Optional[np.ndarray]:
+        return self._clusters[0]
+    
+    @property
+    def lists(self) -> list[GrowableArray]:
+        return self._clusters[1]
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    @property
+    def num_lists(self) -> int:
+        """Number of inverted lists (1 while the index answers exactly)."""
+        return len(self.lists) if self.is_trained else 1
+    
+    def probe_size(self, nprobe: Optional[int] = None) -> int:
+        """Expected number of positions `candidates` returns for nprobe lists."""
+        return len(self) * min(nprobe or self.nprobe, self.num_lists) // self.num_lists
+    
+    def add(self, positions, vectors: np.ndarray) -> None:
+        """
+        Index new documents.
+        
+        Args:
+            positions: Positions of the new documents
+            vectors: The full document matrix (rows looked up by position)
+        """
+        positions = np.asarray(positions, dtype=np.int32)
+        if len(positions) == 0:
+            return
+        self._positions.extend(positions)
+        
+        # Train once there is enough data, and retrain as the corpus doubles
+        # so clusters stay balanced under incremental inserts
+        size = len(self._positions)
+        if size >= self.min_train_size and size >= 2 * self.trained_size:
+            self.train(vectors)
+        elif self.is_trained:
+            self._assign(positions, vectors)
+    
+    def train(self, vectors: np.ndarray) -> None:
+        """Cluster all indexed vectors and rebuild the inverted lists."""
+        positions = self._positions.view()
+        nlist = self.nlist or int(math.sqrt(len(positions)))
+        nlist = max(1, min(nlist, len(positions)))
+        
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(positions), 64 * nlist)
+        sample = vectors[rng.choice(positions, size=sample_size, replace=False)]
+        
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the old centroid for clusters that lost all members
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        
+        centroids = centroids.astype(np.float32)
+        lists = [GrowableArray(np.int32) for _ in range(nlist)]
+        self._assign(positions, vectors, (centroids, lists))
+        self.trained_size = len(positions)
+        self._clusters = (centroids, lists)
+    
+    def _assign(
+        self,
+        positions: np.ndarray,
+        vectors: np.ndarray,
+        clusters: Optional[tuple] = None,
+        batch_size: int = 65536
+    ) -> None:
+        """Append positions to the inverted list of their nearest centroid."""
+        centroids, lists = clusters or self._clusters
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start:start + batch_size]
+            labels = np.argmax(vectors[batch] @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            labels, batch = labels[order], batch[order]
+            boundaries = np.flatnonzero(np.diff(labels)) + 1
+            for group in np.split(np.arange(len(batch)), boundaries):
+                lists[labels[group[0]]].extend(batch[group])
+    
+    def compact(self, remap: np.ndarray) -> "IVFIndex":
+        """
+        A copy of the index with each position p renumbered to `remap[p]`,
+        keeping its centroids; positions mapped to -1 are dropped.
+        """
+        def renumber(positions: np.ndarray) -> GrowableArray:
+            renumbered = GrowableArray(np.int32)
+            positions = remap[positions]
+            renumbered.extend(positions[positions >= 0])
+            return renumbered
+        
+        index = IVFIndex(
+            dim=self.dim,
+            nlist=self.nlist,
+            nprobe=self.nprobe,
+            min_train_size=self.min_train_size,
+            kmeans_iterations=self.kmeans_iterations,
+            seed=self.seed
+        )
+        index._positions = renumber(self._positions.view())
+        centroids, lists = self._clusters
+        if centroids is not None:
+            index.trained_size = min(self.trained_size, len(index))
+            index._clusters = (centroids, [renumber(lst.view()) for lst in lists])
+        return index
+    
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Positions stored in the clusters closest to the query."""
+        centroids, lists = self._clusters
+        if centroids is None:
+            return self._positions.view()
+        
+        nprobe = min(nprobe or self.nprobe, len(lists))
+        centroid_scores = centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        parts = [lists[c].view() for c in probes.tolist()]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+    
+    ARRAY_NAMES = ("centroids", "list_offsets", "list_positions", "positions", "params")
+    
+    def to_arrays(self) -> dict:
+        """The index as flat arrays (named as in `ARRAY_NAMES`), for `save` and snapshots."""
+        lists = [lst.view() for lst in self.lists]
+        offsets = np.cumsum([0] + [len(lst) for lst in lists]).astype(np.int64)
+        return {
+            "centroids": self.centroids if self.is_trained else np.zeros((0, self.dim), dtype=np.float32),
+            "list_offsets": offsets,
+            "list_positions": np.concatenate(lists) if lists else np.zeros(0, dtype=np.int32),
+            "positions": self._positions.view(),
+            "params": np.array([
+                self.dim, self.nlist or 0, self.nprobe, self.min_train_size,
+                self.kmeans_iterations, self.seed, self.trained_size
+            ], dtype=np.int64)
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "IVFIndex":
+        """
+        Wrap arrays written by `to_arrays` (e.g. memory maps) without copying;
+        an inverted list is copied into memory when it first grows.
+        """
+        dim, nlist, nprobe, min_train_size, iterations, seed, trained_size = arrays["params"].tolist()
+        index = cls(
+            dim=dim,
+            nlist=nlist or None,
+            nprobe=nprobe,
+            min_train_size=min_train_size,
+            kmeans_iterations=iterations,
+            seed=seed
+        )
+        index._positions = GrowableArray.from_array(arrays["positions"])
+        if len(arrays["centroids"]):
+            index.trained_size = trained_size
+            offsets = arrays["list_offsets"].tolist()
+            list_positions = arrays["list_positions"]
+            lists = [
+                GrowableArray.from_array(list_positions[start:end])
+                for start, end in zip(offsets[:-1], offsets[1:])
+            ]
+            index._clusters = (arrays["centroids"], lists)
+        return index
+    
+    def save(self, path: str) -> None:
+        """Write the index to a .npz file (the suffix is added if missing)."""
+        np.savez(path, **self.to_arrays())
+    
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """Read an index written by `save`."""
+        if not path.endswith(".npz"):
+            path += ".npz"
+        with np.load(path) as data:
+            return cls.from_arrays({name: data[name] for name in cls.ARRAY_NAMES})
@@ -0,0 +1,229 @@
+import numpy as np
+
+
+def gather_ranges(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of `values[starts[i]:ends[i]]` over all i, without a Python loop."""
+    lengths = ends - starts
+    row_starts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return values[row_starts + np.arange(int(lengths.sum()))]
+
+
+class GrowableArray:
+    """Append-only NumPy buffer with amortized O(1) appends.
+    
+    Rows are written into a pre-allocated buffer whose capacity doubles when
+    full, so `view()` is always a zero-copy slice of contiguous memory.
+    """
+    
+    def __init__(self, dtype, width: int = 0, capacity: int = 16):
+        """
+        Initialize the buffer.
+        
+        Args:
+            dtype: NumPy dtype of the stored values
+            width: Row width for 2-D buffers (0 for a flat 1-D buffer)
+            capacity: Initial number of rows to allocate
+        """
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self._size = 0
+        self._data = np.zeros(self._shape(max(capacity, 1)), dtype=self.dtype)
+    
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "GrowableArray":
+        """
+        Wrap an existing array (e.g. a read-only memory map) without copying.
+        
+        The first append moves the data into a private in-memory buffer, so
+        the wrapped array itself is never written to.
+        """
+        buffer = cls.__new__(cls)
+        buffer.dtype = array.dtype
+        buffer.width = array.shape[1] if array.ndim == 2 else 0
+        buffer._size = len(array)
+        buffer._data = array
+        return buffer
+    
+    def make_writable(self) -> None:
+        """Copy a wrapped read-only array into a private buffer."""
+        if not self._data.flags.writeable:
+            data = np.zeros(self._shape(max(len(self._data), 1)), dtype=self.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+    
+    def _shape(self, rows: int) -> tuple:
+        return (rows, self.width) if self.width else (rows,)
+    
+    def _reserve(self, rows: int) -> None:
+        """Make room for at least `rows` more rows."""
+        needed = self._size + rows
+        capacity = len(self._data)
+        if needed <= capacity and self._data.flags.writeable:
+            return
+        capacity = max(capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        data = np.zeros(self._shape(capacity), dtype=self.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+    
+    def append(self, value) -> None:
+        """Append a single value (or row)."""
+        self._reserve(1)
+        self._data[self._size] = value
+        self._size += 1
+    
+    def extend(self, values) -> None:
+        """Append several values (or rows) at once."""
+        values = np.asarray(values, dtype=self.dtype)
+        count = len(values)
+        if count == 0:
+            return
+        self._reserve(count)
+        self._data[self._size:self._size + count] = values
+        self._size += count
+    
+    def view(self) -> np.ndarray:
+        """Return the filled part of the buffer without copying."""
+        return self._data[:self._size]
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class FrozenChunks:
+    """Read-only view of a `CopyOnWriteArray` as of one `freeze`."""
+    
+    __slots__ = ("_chunks", "_size", "_chunk_size")
+    
+    def __init__(self, chunks: tuple, size: int, chunk_size: int):
+        self._chunks = chunks
+        self._size = size
+        self._chunk_size = chunk_size
+    
+    def __getitem__(self, index: int):
+        return self._chunks[index // self._chunk_size][index % self._chunk_size]
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class CopyOnWriteArray:
+    """1-D NumPy array stored in fixed-size chunks, frozen without copying.
+    
+    `freeze` hands the current chunks to readers in O(number of chunks); a
+    frozen chunk is copied the first time it is written afterwards, so a
+    write costs O(chunks touched) and frozen views never change.
+    """
+    
+    def __init__(self, dtype, chunk_size: int = 512):
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._size = 0
+        self._owned = set()  # chunks written since the last freeze
+    
+    @classmethod
+    def from_array(cls, array: np.ndarray, chunk_size: int = 512) -> "CopyOnWriteArray":
+        """Wrap an existing array (e.g. a read-only memory map) without copying."""
+        buffer = cls(array.dtype, chunk_size)
+        buffer._chunks = [array[start:start + chunk_size] for start in range(0, len(array), chunk_size)]
+        buffer._size = len(array)
+        return buffer
+    
+    def _writable(self, chunk: int) -> np.ndarray:
+        """A chunk that no frozen view shares, copying it if needed."""
+        if chunk not in self._owned:
+            data = np.zeros(self.chunk_size, dtype=self.dtype)
+            if chunk < len(self._chunks):
+                old = self._chunks[chunk]
+                data[:len(old)] = old
+                self._chunks[chunk] = data
+            else:
+                self._chunks.append(data)
+            self._owned.add(chunk)
+        return self._chunks[chunk]
+    
+    def append(self, value) -> None:
+        """Append a single value."""
+        chunk, offset = divmod(self._size, self.chunk_size)
+        self._writable(chunk)[offset] = value
+        self._size += 1
+    
+    def add(self, indexes: np.ndarray, delta) -> None:
+        """Add `delta` (a scalar, or one value per index) to the values at distinct `indexes`."""
+        indexes = np.asarray(indexes, dtype=np.int64)
+        order = np.argsort(indexes, kind="stable")
+        indexes = indexes[order]
+        deltas = np.broadcast_to(np.asarray(delta, dtype=self.dtype), order.shape)[order]
+        bounds = np.flatnonzero(np.diff(indexes // self.chunk_size)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(indexes)]):
+            if end > start:
+                chunk = int(indexes[start]) // self.chunk_size
+                self._writable(chunk)[indexes[start:end] - chunk * self.chunk_size] += deltas[start:end]
+    
+    def freeze(self) -> FrozenChunks:
+        """Read-only view of the current values; later writes copy the chunks they touch."""
+        self._owned.clear()
+        return FrozenChunks(tuple(self._chunks), self._size, self.chunk_size)
+    
+    def to_array(self) -> np.ndarray:
+        """The values as one contiguous array (a copy)."""
+        if not self._chunks:
+            return np.zeros(0, dtype=self.dtype)
+        return np.concatenate(self._chunks)[:self._size]
+    
+    def __getitem__(self, index: int):
+        return self._chunks[index // self.chunk_size][index % self.chunk_size]
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class StringList:
+    """Append-only list of strings stored in one UTF-8 arena.
+    
+    String i occupies `arena[offsets[i]:offsets[i + 1]]`. Both buffers can be
+    saved and memory-mapped as-is, so a loaded list only decodes the
+    strings that are read.
+    """
+    
+    def __init__(self, strings=()):
+        self.arena = GrowableArray(np.uint8, capacity=1024)
+        self.offsets = GrowableArray(np.int64)
+        self.offsets.append(0)
+        for string in strings:
+            self.append(string)
+    
+    @classmethod
+    def from_arrays(cls, arena: np.ndarray, offsets: np.ndarray) -> "StringList":
+        """Wrap the arrays of `arena` and `offsets` (e.g. memory maps) without copying."""
+        strings = cls.__new__(cls)
+        strings.arena = GrowableArray.from_array(arena)
+        strings.offsets = GrowableArray.from_array(offsets)
+        return strings
+    
+    def append(self, string: str) -> None:
+        # Bytes are written before their offset, so readers never see a
+        # string without them
+        self.arena.extend(np.frombuffer(string.encode("utf-8"), dtype=np.uint8))
+        self.offsets.append(len(self.arena))
+    
+    def take(self, indexes: np.ndarray) -> "StringList":
+        """A new list holding the strings at the given indexes, in that order."""
+        offsets = self.offsets.view()
+        starts, ends = offsets[indexes], offsets[indexes + 1]
+        new_offsets = np.zeros(len(indexes) + 1, dtype=np.int64)
+        new_offsets[1:] = np.cumsum(ends - starts)
+        return StringList.from_arrays(gather_ranges(self.arena.view(), starts, ends), new_offsets)
+    
+    def __getitem__(self, index: int) -> str:
+        offsets = self.offsets.view()
+        return self.arena.view()[offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
@@ -0,0 +1,185 @@
+from typing import Optional
+
+import numpy as np
+
+from .buffers import GrowableArray, StringList, gather_ranges
+
+
+class CategoricalColumn:
+    """
+    Low-cardinality string column stored as integer codes.
+    
+    `values` is a list, or a `StringList` for columns with many values; the
+    value -> code map is only built once a code is looked up.
+    """
+    
+    def __init__(self, values=None, codes: Optional[np.ndarray] = None):
+        self.values = values if isinstance(values, StringList) else list(values or [])
+        self._codes_by_value = None
+        self.codes = GrowableArray.from_array(codes) if codes is not None else GrowableArray(np.int32)
+    
+    def _codes(self) -> dict:
+        if self._codes_by_value is None:
+            self._codes_by_value = {value: code for code, value in enumerate(self.values)}
+        return self._codes_by_value
+    
+    def code(self, value: str) -> Optional[int]:
+        """Code of a value, or None if it never occurred."""
+        return self._codes().get(value)
+    
+    def append(self, value: str) -> int:
+        codes = self._codes()
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+        return code
+    
+    def __getitem__(self, position: int) -> str:
+        return self.values[self.codes.view()[position]]
+
+
+class DocumentTable:
+    """
+    Columnar document storage.
+    
+    Documents are addressed by integer position. Text and title share one
+    UTF-8 arena (document i occupies offsets[i]:offsets[i + 1], with the title
+    starting at title_starts[i]); repeated fields are interned as integer
+    codes. Compared to a dict per document this drops the per-object, key and
+    repeated-string overhead, and every column is a flat NumPy buffer that
+    can be saved and memory-mapped as-is.
+    
+    Passages (see `rag.chunking`) also record their parent document id and
+    the character offset of their text within the parent's text; whole
+    documents have an empty parent id. Parent ids are as many as the
+    documents, so their values are kept in a `StringList`.
+    """
+    
+    CATEGORICAL_FIELDS = ("category", "geography", "source", "timestamp")
+    
+    def __init__(self):
+        self.arena = GrowableArray(np.uint8, capacity=4096)
+        self.offsets = GrowableArray(np.int64)
+        self.offsets.append(0)
+        self.title_starts = GrowableArray(np.int64)
+        self.columns = {field: CategoricalColumn() for field in self.CATEGORICAL_FIELDS}
+        self.parent_ids = CategoricalColumn(StringList())
+        self.passage_starts = GrowableArray(np.int64)
+    
+    def append(self, doc: dict) -> int:
+        """Store a document and return its position."""
+        position = len(self)
+        text = doc["text"].encode("utf-8")
+        title = doc.get("title", "").encode("utf-8")
+        
+        start = int(self.offsets.view()[-1])
+        self.arena.extend(np.frombuffer(text + title, dtype=np.uint8))
+        self.title_starts.append(start + len(text))
+        self.offsets.append(start + len(text) + len(title))
+        
+        for field, column in self.columns.items():
+            column.append(doc[field])
+        self.parent_ids.append(doc.get("parent_id") or "")
+        self.passage_starts.append(doc.get("passage_start", 0))
+        return position
+    
+    def _decode(self, start: int, end: int) -> str:
+        return self.arena.view()[start:end].tobytes().decode("utf-8")
+    
+    def text(self, position: int) -> str:
+        return self._decode(int(self.offsets.view()[position]), int(self.title_starts.view()[position]))
+    
+    def title(self, position: int) -> str:
+        return self._decode(int(self.title_starts.view()[position]), int(self.offsets.view()[position + 1]))
+    
+    def get(self, position: int) -> dict:
+        """Materialize one document as a dict."""
+        doc = {"id": position, "text": self.text(position), "title": self.title(position)}
+        for field, column in self.columns.items():
+            doc[field] = column[position]
+        parent_id = self.parent_ids[position]
+        if parent_id:
+            doc["parent_id"] = parent_id
+            doc["passage_start"] = int(self.passage_starts.view()[position])
+        return doc
+    
+    def __getitem__(self, position: int) -> dict:
+        if position < 0:
+            position += len(self)
+        if position < 0 or position >= len(self):
+            raise IndexError("document position out of range")
+        return self.get(position)
+    
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self.get(position)
+    
+    def __len__(self) -> int:
+        return len(self.title_starts)
+    
+    def nbytes(self) -> int:
+        """Bytes used by the filled part of every column."""
+        total = self.arena.view().nbytes + self.offsets.view().nbytes + self.title_starts.view().nbytes
+        total += self.parent_ids.codes.view().nbytes + self.passage_starts.view().nbytes
+        return total + sum(column.codes.view().nbytes for column in self.columns.values())
+    
+    @classmethod
+    def array_names(cls) -> list[str]:
+        """Names of the arrays produced by `to_arrays`."""
+        names = [
+            "doc_arena", "doc_offsets", "doc_title_starts", "doc_parent_id_codes",
+            "doc_parent_id_arena", "doc_parent_id_offsets", "doc_passage_starts"
+        ]
+        return names + [f"doc_{field}_codes" for field in cls.CATEGORICAL_FIELDS]
+    
+    def to_arrays(self) -> tuple[dict, dict]:
+        """Flat arrays and the value lists of the low-cardinality columns, for snapshots."""
+        arrays = {
+            "doc_arena": self.arena.view(),
+            "doc_offsets": self.offsets.view(),
+            "doc_title_starts": self.title_starts.view(),
+            "doc_parent_id_codes": self.parent_ids.codes.view(),
+            "doc_parent_id_arena": self.parent_ids.values.arena.view(),
+            "doc_parent_id_offsets": self.parent_ids.values.offsets.view(),
+            "doc_passage_starts": self.passage_starts.view()
+        }
+        values = {}
+        for field, column in self.columns.items():
+            arrays[f"doc_{field}_codes"] = column.codes.view()
+            values[field] = column.values
+        return arrays, values
+    
+    def take(self, positions: np.ndarray) -> "DocumentTable":
+        """A new table holding the documents at the given positions, in that order."""
+        starts, ends = self.offsets.view()[positions], self.offsets.view()[positions + 1]
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(ends - starts)
+        arrays, values = self.to_arrays()
+        arrays = {
+            name: array[positions] for name, array in arrays.items()
+            if name not in ("doc_arena", "doc_offsets", "doc_title_starts", "doc_parent_id_arena", "doc_parent_id_offsets")
+        }
+        arrays["doc_arena"] = gather_ranges(self.arena.view(), starts, ends)
+        arrays["doc_offsets"] = offsets
+        arrays["doc_title_starts"] = offsets[:-1] + (self.title_starts.view()[positions] - starts)
+        arrays["doc_parent_id_arena"] = self.parent_ids.values.arena.view()
+        arrays["doc_parent_id_offsets"] = self.parent_ids.values.offsets.view()
+        return DocumentTable.from_arrays(arrays, values)
+    
+    @classmethod
+    def from_arrays(cls, arrays: dict, values: dict) -> "DocumentTable":
+        """Wrap arrays written by `to_arrays` (e.g. memory maps) without copying."""
+        table = cls.__new__(cls)
+        table.arena = GrowableArray.from_array(arrays["doc_arena"])
+        table.offsets = GrowableArray.from_array(arrays["doc_offsets"])
+        table.title_starts = GrowableArray.from_array(arrays["doc_title_starts"])
+        table.columns = {
+            field: CategoricalColumn(values[field], arrays[f"doc_{field}_codes"])
+            for field in cls.CATEGORICAL_FIELDS
+        }
+        parent_ids = StringList.from_arrays(arrays["doc_parent_id_arena"], arrays["doc_parent_id_offsets"])
+        table.parent_ids = CategoricalColumn(parent_ids, arrays["doc_parent_id_codes"])
+        table.passage_starts = GrowableArray.from_array(arrays["doc_passage_starts"])
+        return table
@@ -0,0 +1,196 @@
+from collections import Counter
+from typing import Optional
+import hashlib
+import math
+
+import numpy as np
+
+from .buffers import GrowableArray
+from .id_map import PositionMap
+
+
+class ContextVectors:
+    """
+    Read-only view of an embedder's context vectors as of one published write.
+    
+    Published rows are never written again (see `HashedEmbedder.observe_documents`),
+    so a view keeps returning the vectors it was taken with while later
+    documents are observed.
+    """
+    
+    __slots__ = ("_rows", "_contexts")
+    
+    def __init__(self, rows: PositionMap, contexts: np.ndarray):
+        self._rows = rows
+        self._contexts = contexts
+    
+    def get(self, term: str) -> Optional[np.ndarray]:
+        """Context vector of a term, or None if it was never observed."""
+        rows = [row for row in self._rows.get(term) if row < len(self._contexts)]
+        return self._contexts[rows[-1]] if rows else None
+
+
+class HashedEmbedder:
+    """Offline text embeddings built with random indexing.
+    
+    Every term is hashed to a fixed sparse random "index vector", so document
+    embeddings need no model download or network access. While documents are
+    ingested, each term also accumulates a "context vector" from the index
+    vectors of the terms it co-occurs with. Query terms are expanded with
+    their context vectors, which lets "payments" match documents that only
+    mention "UPI" when the two appear together elsewhere in the corpus.
+    
+    Context rows are copy-on-write: once `publish` has handed a row to
+    readers, the next update of its term writes a new row instead, so
+    queries embedded against a published view are not affected by documents
+    being observed at the same time.
+    """
+    
+    def __init__(self, dim: int = 128, nonzeros: int = 8, context_weight: float = 0.5):
+        """
+        Initialize the embedder.
+        
+        Args:
+            dim: Embedding dimension
+            nonzeros: Number of non-zero entries in each index vector
+            context_weight: Weight of co-occurrence context in query embeddings
+        """
+        self.dim = dim
+        self.nonzeros = nonzeros
+        self.context_weight = context_weight
+        self._index_cache = {}  # term -> (indices, signs)
+        self._context_rows = PositionMap()  # term -> rows in self._contexts, current row last
+        self._contexts = GrowableArray(np.float32, width=dim)
+        self._published_rows = 0  # rows below this are visible to readers and never written
+    
+    def _index_entries(self, term: str) -> tuple:
+        """Deterministic sparse (indices, signs) of a term's index vector."""
+        entries = self._index_cache.get(term)
+        if entries is None:
+            digest = hashlib.blake2b(term.encode("utf-8"), digest_size=4 * self.nonzeros).digest()
+            values = np.frombuffer(digest, dtype=np.uint32)
+            indices = (values >> 1) % self.dim
+            signs = np.where(values & 1, 1.0, -1.0).astype(np.float32)
+            entries = self._index_cache[term] = (indices, signs)
+        return entries
+    
+    def _add_index_vector(self, vector: np.ndarray, term: str, weight: float = 1.0) -> None:
+        indices, signs = self._index_entries(term)
+        np.add.at(vector, indices, signs * weight)
+    
+    def _weighted_sums(self, rows: list[int], terms: list[str], weights, num_rows: int) -> np.ndarray:
+        """Matrix whose row r sums weight * index vector over the (r, term, weight) entries."""
+        if not terms:
+            return np.zeros((num_rows, self.dim), dtype=np.float32)
+        entries = [self._index_entries(term) for term in terms]
+        indices = np.concatenate([entry[0] for entry in entries]).astype(np.int64)
+        signs = np.concatenate([entry[1] for entry in entries])
+        cells = np.repeat(np.asarray(rows, dtype=np.int64), self.nonzeros) * self.dim + indices
+        values = signs * np.repeat(np.asarray(weights, dtype=np.float32), self.nonzeros)
+        sums = np.bincount(cells, weights=values, minlength=num_rows * self.dim)
+        return sums.astype(np.float32).reshape(num_rows, self.dim)
+    
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+    
+    def embed_document(self, tokens: list[str]) -> np.ndarray:
+        """Embed a tokenized document as a unit-length float32 vector."""
+        return self.embed_documents([tokens])[0]
+    
+    def embed_documents(self, token_lists: list[list[str]]) -> np.ndarray:
+        """Embed tokenized documents as the rows of one matrix, in one scatter-add."""
+        rows, terms, weights = [], [], []
+        for row, tokens in enumerate(token_lists):
+            for term, term_freq in Counter(tokens).items():
+                rows.append(row)
+                terms.append(term)
+                weights.append(1.0 + math.log(term_freq))
+        vectors = self._weighted_sums(rows, terms, weights, len(token_lists))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
+    
+    def observe_documents(self, token_lists: list[list[str]], weight: float = 1.0, batch_size: int = 256) -> None:
+        """
+        Update co-occurrence context vectors with documents.
+        
+        Each term of a document gains the sum of the index vectors of the
+        document's other terms. Documents are processed `batch_size` at a
+        time, with the per-term sums gathered for the whole batch.
+        """
+        documents = [list(set(tokens)) for tokens in token_lists]
+        documents = [terms for terms in documents if len(terms) >= 2]
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            local = {}  # term -> row of `index_vectors`
+            pair_terms = np.array([local.setdefault(term, len(local)) for terms in batch for term in terms])
+            terms = list(local)
+            index_vectors = self._weighted_sums(range(len(terms)), terms, np.ones(len(terms)), len(terms))
+            
+            # Sum of the index vectors of each document's terms, then of
+            # those sums over the documents containing each term
+            lengths = np.array([len(terms) for terms in batch])
+            totals = np.add.reduceat(index_vectors[pair_terms], np.cumsum(lengths) - lengths, axis=0)
+            pair_docs = np.repeat(np.arange(len(batch)), lengths)
+            order = np.argsort(pair_terms, kind="stable")
+            counts = np.bincount(pair_terms, minlength=len(terms))
+            sums = np.add.reduceat(totals[pair_docs[order]], np.cumsum(counts) - counts, axis=0)
+            deltas = (sums - counts[:, None] * index_vectors) * weight
+            
+            rows = np.empty(len(terms), dtype=np.int64)
+            for i, term in enumerate(terms):
+                existing = self._context_rows.get(term)
+                row = existing[-1] if existing else None
+                if row is None or row < self._published_rows:
+                    # Copy the published row; add it before its id, so
+                    # readers never see a dangling id
+                    context = self._contexts.view()[row] if row is not None else np.zeros(self.dim, dtype=np.float32)
+                    self._contexts.append(context)
+                    row = len(self._contexts) - 1
+                    self._context_rows.add(term, row)
+                rows[i] = row
+            self._contexts.view()[rows] += deltas
+    
+    def forget(self, tokens: list[str]) -> None:
+        """Remove one previously observed document from the context vectors."""
+        self.observe_documents([tokens], weight=-1.0)
+    
+    def publish(self) -> ContextVectors:
+        """
+        Hand the rows written so far to readers, as a read-only view.
+        
+        Rows superseded by copies are dropped once they outnumber the
+        current ones; views published before keep the old rows.
+        """
+        if len(self._contexts) > 2 * len(self._context_rows):
+            terms, contexts = self.context_arrays()
+            self._context_rows = PositionMap.from_pairs((term, row) for row, term in enumerate(terms))
+            self._contexts = GrowableArray.from_array(contexts)
+        self._published_rows = len(self._contexts)
+        return ContextVectors(self._context_rows, self._contexts.view())
+    
+    def context_arrays(self) -> tuple:
+        """(terms, contexts): every observed term and its current context vector, one row each."""
+        terms = list(self._context_rows)
+        rows = np.array([self._context_rows.get(term)[-1] for term in terms], dtype=np.int64)
+        return terms, self._contexts.view()[rows]
+    
+    def embed_query(self, tokens: list[str], contexts) -> np.ndarray:
+        """
+        Embed a tokenized query, expanding each term with its context.
+        
+        `contexts` maps terms to context vectors: a `ContextVectors` view
+        from `publish`, or e.g. the sums over every shard of a sharded store.
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term in set(tokens):
+            self._add_index_vector(vector, term)
+            context = contexts.get(term)
+            if context is not None:
+                norm = float(np.linalg.norm(context))
+                if norm > 0:
+                    vector += context * (self.context_weight * math.sqrt(self.nonzeros) / norm)
+        return self._normalize(vector)
@@ -0,0 +1,197 @@
+"""
+Query expansion with domain synonyms and corpus co-occurrence.
+
+Agent queries are assembled from profile fields, so "healthtech" or "VCs"
+only match documents using the same words. A QueryExpansion maps query
+terms (or multi-word phrases) to weighted related terms, which BM25 scores
+alongside the query's own terms at a fraction of their weight:
+
+- Curated synonym groups of the startup domain: every phrase of a group
+  expands to the others ("vc" -> "venture", "capital").
+- Corpus neighbours of the curated terms: terms appearing in the same
+  passages unusually often, mined once from the index when the expansion
+  is built.
+
+The expansion is compiled into a dict keyed by the first token of each
+phrase, so expanding a query is a few dict lookups and needs no index scan.
+"""
+import math
+from typing import Iterable, Optional
+
+
+# Groups of interchangeable phrases of the startup and investment domain
+DOMAIN_SYNONYMS = (
+    ("healthtech", "healthcare", "health technology", "medtech", "medical technology"),
+    ("fintech", "financial technology", "financial services"),
+    ("edtech", "education technology", "online learning"),
+    ("agritech", "agtech", "agriculture technology", "farm technology"),
+    ("cleantech", "clean energy", "renewable energy", "climate tech"),
+    ("proptech", "real estate technology"),
+    ("insurtech", "insurance technology"),
+    ("legaltech", "legal technology"),
+    ("ev", "electric vehicle", "electric mobility"),
+    ("ai", "artificial intelligence", "machine learning"),
+    ("saas", "software as a service", "cloud software"),
+    ("d2c", "direct to consumer"),
+    ("b2b", "business to business", "enterprise"),
+    ("ecommerce", "e-commerce", "online retail"),
+    ("vc", "vcs", "venture capital", "venture capitalist"),
+    ("investor", "backer", "funder"),
+    ("angel", "angel investor"),
+    ("funding", "investment", "financing", "capital raise"),
+    ("seed", "pre-seed", "early stage"),
+    ("scheme", "programme", "program", "initiative"),
+    ("grant", "subsidy"),
+    ("regulation", "rule", "compliance", "guideline"),
+    ("policy", "regulation", "framework"),
+    ("government", "govt", "ministry"),
+    ("msme", "small business", "sme"),
+    ("market size", "market opportunity", "tam"),
+    ("growth", "expansion"),
+    ("ipo", "initial public offering", "listing"),
+)
+
+SYNONYM_WEIGHT = 0.7  # query weight of a curated synonym, split over its tokens
+COOCCURRENCE_WEIGHT = 0.3  # query weight of a corpus neighbour at association 1.0
+MIN_COOCCURRENCE = 2  # passages a neighbour must share with the term
+MIN_ASSOCIATION = 0.2  # smallest co-occurrence cosine of a neighbour
+MAX_DOC_FRACTION = 0.2  # terms in more of the passages are too common to add
+NEIGHBOURS = 3  # corpus neighbours per term
+
+
+class QueryExpansion:
+    """Compiled map from query terms and phrases to weighted related terms."""
+    
+    def __init__(self, expansions: Optional[dict] = None):
+        """
+        Compile expansions.
+        
+        Args:
+            expansions: Token tuple (one or more query tokens) -> {term: weight}
+        """
+        self.expansions = {key: dict(terms) for key, terms in (expansions or {}).items()}
+        
+        # First token -> [(token tuple, terms)], longest phrases first
+        self._by_first = {}
+        for key, terms in self.expansions.items():
+            self._by_first.setdefault(key[0], []).append((key, tuple(terms.items())))
+        for entries in self._by_first.values():
+            entries.sort(key=lambda entry: -len(entry[0]))
+    
+    def __len__(self) -> int:
+        return len(self.expansions)
+    
+    def expand(self, tokens: list[str]) -> dict:
+        """
+        Weighted terms of a tokenized query.
+        
+        Query terms weigh 1.0. Each phrase of the query found in the map
+        (longest match at every token) adds its related terms, keeping the
+        largest weight a term gets and never lowering a query term.
+        """
+        weights = dict.fromkeys(tokens, 1.0)
+        for i, token in enumerate(tokens):
+            for key, terms in self._by_first.get(token, ()):
+                if tuple(tokens[i:i + len(key)]) != key:
+                    continue
+                for term, weight in terms:
+                    if weight > weights.get(term, 0.0):
+                        weights[term] = weight
+                break
+        return weights
+
+
+def synonym_expansions(groups: Iterable[tuple], tokenize, weight: float = SYNONYM_WEIGHT) -> dict:
+    """
+    Expansions of curated synonym groups: each phrase -> the other phrases'
+    tokens, with the weight split evenly over a phrase's tokens.
+    """
+    expansions = {}
+    for group in groups:
+        phrases = [tuple(tokenize(phrase)) for phrase in group]
+        phrases = [phrase for phrase in dict.fromkeys(phrases) if phrase]
+        for phrase in phrases:
+            terms = expansions.setdefault(phrase, {})
+            for other in phrases:
+                if other == phrase:
+                    continue
+                for token in other:
+                    if token not in phrase:
+                        terms[token] = max(terms.get(token, 0.0), weight / len(other))
+    return {key: terms for key, terms in expansions.items() if terms}
+
+
+def cooccurrence_expansions(
+    num_docs: int,
+    pairs: dict,
+    doc_freqs: dict,
+    weight: float = COOCCURRENCE_WEIGHT
+) -> dict:
+    """
+    Expansions of each anchor term to its strongest corpus neighbours.
+    
+    Association is the cosine of the terms' passage sets,
+    shared / sqrt(df(anchor) * df(neighbour)), so frequent terms do not
+    become everyone's neighbour.
+    
+    Args:
+        num_docs: Live passages
+        pairs: Anchor -> {term: shared passages} (see `VectorStore.cooccurrence_statistics`)
+        doc_freqs: Document frequency of the anchors and their co-occurring terms
+        weight: Query weight of a neighbour with association 1.0
+    """
+    expansions = {}
+    for anchor, shared_counts in pairs.items():
+        anchor_freq = doc_freqs.get(anchor, 0)
+        if not anchor_freq:
+            continue
+        scored = []
+        for term, shared in shared_counts.items():
+            term_freq = doc_freqs.get(term, 0)
+            if term == anchor or shared < MIN_COOCCURRENCE or term_freq > MAX_DOC_FRACTION * num_docs:
+                continue
+            association = shared / math.sqrt(anchor_freq * term_freq)
+            if association >= MIN_ASSOCIATION:
+                scored.append((association, term))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        if scored:
+            expansions[(anchor,)] = {term: weight * association for association, term in scored[:NEIGHBOURS]}
+    return expansions
+
+
+def build_query_expansion(
+    store,
+    synonym_groups: Iterable[tuple] = DOMAIN_SYNONYMS,
+    synonym_weight: float = SYNONYM_WEIGHT,
+    cooccurrence_weight: float = COOCCURRENCE_WEIGHT
+) -> QueryExpansion:
+    """
+    Compile the expansion of a (sharded) vector store's corpus.
+    
+    Curated synonyms come first; corpus neighbours are mined for every
+    single-token term of the synonym groups and only add terms the
+    synonyms do not already cover.
+    
+    Args:
+        store: VectorStore or ShardedVectorStore (for its tokenizer and index)
+        synonym_groups: Groups of interchangeable phrases
+        synonym_weight: Query weight of a synonym (0 skips the synonyms)
+        cooccurrence_weight: Query weight of the strongest neighbour (0 skips the corpus pass)
+    """
+    tokenize = store.tokenizer.tokenize
+    groups = list(synonym_groups)
+    expansions = synonym_expansions(groups, tokenize, synonym_weight) if synonym_weight > 0 else {}
+    
+    if cooccurrence_weight > 0:
+        anchors = sorted({
+            token for group in groups for phrase in group for token in tokenize(phrase)
+        })
+        stats = store.cooccurrence_statistics(anchors)
+        terms = set(stats["pairs"]).union(*stats["pairs"].values())
+        doc_freqs = store.document_frequencies(sorted(terms))
+        neighbours = cooccurrence_expansions(stats["num_docs"], stats["pairs"], doc_freqs, cooccurrence_weight)
+        for key, terms in neighbours.items():
+            merged = expansions.setdefault(key, {})
+            for term, weight in terms.items():
+                merged.setdefault(term, weight)
+    return QueryExpansion(expansions)
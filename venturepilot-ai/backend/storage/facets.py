@@ -0,0 +1,73 @@
+"""
+Incrementally maintained facet counts of a VectorStore.
+
+Counts are kept per category, geography, source and publication month, so
+corpus statistics are answered from a few small dicts instead of a scan
+over the documents. Passages of one document share its metadata, so only
+a document's first passage (or the whole document) is counted.
+"""
+from datetime import date
+from typing import Optional
+
+
+FACET_FIELDS = ("category", "geography", "source", "month")
+
+
+def facet_month(timestamp) -> str:
+    """Publication month ("YYYY-MM") of a timestamp, or "unknown"."""
+    try:
+        return date.fromisoformat(str(timestamp)[:10]).strftime("%Y-%m")
+    except ValueError:
+        return "unknown"
+
+
+class FacetCounts:
+    """Document counts per facet value, updated as documents come and go."""
+    
+    def __init__(self, counts: Optional[dict] = None, total: int = 0):
+        self.counts = {field: dict((counts or {}).get(field, {})) for field in FACET_FIELDS}
+        self.total = total
+    
+    def add(self, doc: dict, weight: int = 1) -> None:
+        """Count a document (any mapping with the metadata fields)."""
+        for field in FACET_FIELDS:
+            value = facet_month(doc["timestamp"]) if field == "month" else doc[field]
+            field_counts = self.counts[field]
+            count = field_counts.get(value, 0) + weight
+            if count:
+                field_counts[value] = count
+            else:
+                del field_counts[value]
+        self.total += weight
+    
+    def remove(self, doc: dict) -> None:
+        """Stop counting a previously added document."""
+        self.add(doc, weight=-1)
+    
+    def copy(self) -> "FacetCounts":
+        """Independent copy; costs O(number of facet values)."""
+        return FacetCounts(self.counts, self.total)
+    
+    def to_dict(self) -> dict:
+        """JSON-serializable counts, each facet sorted by value."""
+        return {
+            "documents": self.total,
+            "facets": {field: dict(sorted(self.counts[field].items())) for field in FACET_FIELDS}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "FacetCounts":
+        """Rebuild counts written by `to_dict`."""
+        return cls(data["facets"], data["documents"])
+    
+    @classmethod
+    def merged(cls, parts: list["FacetCounts"]) -> "FacetCounts":
+        """Sum of several counts, e.g. over the shards of a sharded store."""
+        merged = cls()
+        for part in parts:
+            for field in FACET_FIELDS:
+                field_counts = merged.counts[field]
+                for value, count in part.counts[field].items():
+                    field_counts[value] = field_counts.get(value, 0) + count
+            merged.total += part.total
+        return merged
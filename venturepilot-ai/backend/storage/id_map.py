@@ -0,0 +1,120 @@
+"""
+Append-only maps from stable ids to document positions.
+
+Deleting or replacing a document does not remove its id's entry; readers
+keep only the positions that are alive in the generation they read. A
+published generation can therefore share the map with the writer and
+never sees a removal made by a later write, and publishing copies nothing.
+Compaction builds new maps without the dead positions.
+
+A map loaded from a snapshot keeps the snapshot's entries in a `KeyIndex`
+(sorted id hashes, memory-mapped) and only holds later additions in a dict.
+"""
+from typing import Callable, Iterable, Optional
+import hashlib
+
+import numpy as np
+
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit hash of an id (the same in every process)."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def hash_pairs(pairs: Iterable[tuple]) -> tuple:
+    """(hashes, integers) of (id, integer) pairs, ordered by hash and then integer, as `KeyIndex` stores them."""
+    pairs = list(pairs)
+    hashes = np.fromiter((key_hash(key) for key, _ in pairs), dtype=np.uint64, count=len(pairs))
+    values = np.fromiter((value for _, value in pairs), dtype=np.int64, count=len(pairs))
+    order = np.lexsort((values, hashes))
+    return hashes[order], values[order]
+
+
+class KeyIndex:
+    """
+    Read-only multimap from string ids to integers in two flat arrays: id
+    hashes in ascending order, and the integer of each entry.
+    
+    Lookups binary-search the hash and keep the entries whose id, read back
+    with `key_of`, is the one looked up, so a hash collision costs a string
+    comparison rather than a wrong answer. Nothing is decoded on load.
+    """
+    
+    def __init__(self, hashes: np.ndarray, values: np.ndarray, key_of: Callable[[int], str]):
+        self.hashes = hashes
+        self.values = values
+        self.key_of = key_of
+        self._num_keys = None
+    
+    def get(self, key: str) -> list[int]:
+        """Integers stored under an id, ascending."""
+        hashed = np.uint64(key_hash(key))
+        start = int(np.searchsorted(self.hashes, hashed))
+        end = int(np.searchsorted(self.hashes, hashed, side="right"))
+        return [value for value in self.values[start:end].tolist() if self.key_of(value) == key]
+    
+    def num_keys(self) -> int:
+        """Number of distinct ids (counted once, from the hashes)."""
+        if self._num_keys is None:
+            self._num_keys = int(np.count_nonzero(np.diff(self.hashes))) + 1 if len(self.hashes) else 0
+        return self._num_keys
+    
+    def __iter__(self):
+        """Ids of the entries, possibly repeated."""
+        for value in self.values.tolist():
+            yield self.key_of(value)
+
+
+class PositionMap:
+    """Multimap from string ids to the positions ever stored under them."""
+    
+    def __init__(self, base: Optional[KeyIndex] = None):
+        self._base = base  # entries loaded from a snapshot
+        self._entries = {}  # id -> position, or a list of positions once it has several
+        self._new_keys = 0  # ids in `_entries` but not in `_base`
+    
+    def add(self, key: str, position: int) -> None:
+        """Record a position under an id."""
+        entry = self._entries.get(key)
+        if entry is None:
+            if self._base is None or not self._base.get(key):
+                self._new_keys += 1
+            self._entries[key] = position
+        elif isinstance(entry, list):
+            entry.append(position)
+        else:
+            # Readers see either the old position or the complete new list
+            self._entries[key] = [entry, position]
+    
+    def get(self, key: str) -> list[int]:
+        """Every position stored under an id (alive or not), oldest first."""
+        positions = self._base.get(key) if self._base is not None else []
+        entry = self._entries.get(key)
+        if entry is None:
+            return positions
+        return positions + (list(entry) if isinstance(entry, list) else [entry])
+    
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[tuple]) -> "PositionMap":
+        """Build a map from (id, position) pairs."""
+        positions = cls()
+        for key, position in pairs:
+            positions.add(key, position)
+        return positions
+    
+    def __iter__(self):
+        seen = set()
+        if self._base is not None:
+            for key in self._base:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+        for key in list(self._entries):
+            if key not in seen:
+                yield key
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self._base is not None and bool(self._base.get(key)))
+    
+    def __len__(self) -> int:
+        return (self._base.num_keys() if self._base is not None else 0) + self._new_keys
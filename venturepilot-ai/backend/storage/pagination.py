@@ -0,0 +1,50 @@
+"""
+Opaque page cursors.
+
+A cursor holds the sort key of the last result on a page (for searches the
+score, day number and position; for listings the day number and position)
+so the next page starts right after it without recomputing earlier pages.
+Clients pass cursors back unchanged; the encoding is URL-safe base64 JSON.
+"""
+import base64
+import json
+import math
+from typing import Optional
+
+# Kinds of cursor whose sort key starts with a score; the rest are integers
+SCORED_KINDS = ("search", "hybrid")
+
+
+def encode_cursor(kind: str, key: tuple) -> str:
+    """Cursor string for the sort key of a page's last result."""
+    payload = json.dumps([kind, *key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], kind: str, size: int) -> Optional[tuple]:
+    """
+    Sort key stored in a cursor, or None for the first page.
+    
+    Raises:
+        ValueError: The cursor is malformed or was made for another kind of page
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size + 1 or values[0] != kind:
+        raise ValueError("Invalid cursor")
+    key = values[1:]
+    scores = key[:1] if kind in SCORED_KINDS else []
+    if not all(_is_number(value) and math.isfinite(value) for value in scores):
+        raise ValueError("Invalid cursor")
+    if not all(_is_number(value) and isinstance(value, int) for value in key[len(scores):]):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -0,0 +1,111 @@
+"""
+Token offsets for phrase and proximity queries.
+
+Every posting also records where its term occurs in the document, as token
+offsets (indexes into the tokenized text, after stop-word removal). The
+offsets of one posting are delta-encoded and written as variable-length
+bytes (7 bits per byte, high bit set on all but the last byte), so a term
+occurring at offsets 3, 17 and 18 costs three bytes: 3, 14, 1.
+
+Queries put phrases in double quotes: `"digital lending" guidelines` only
+matches documents where "digital" is directly followed by "lending".
+"""
+import re
+
+import numpy as np
+
+
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+
+def encode_offsets(offsets: list[int]) -> bytes:
+    """Variable-length bytes of the gaps between ascending token offsets."""
+    encoded = bytearray()
+    previous = 0
+    for offset in offsets:
+        gap = offset - previous
+        previous = offset
+        while gap >= 0x80:
+            encoded.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+    return bytes(encoded)
+
+
+def decode_offsets(encoded) -> list[int]:
+    """Ascending token offsets written by `encode_offsets`."""
+    offsets = []
+    offset = gap = shift = 0
+    for byte in bytes(encoded):
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        offset += gap
+        offsets.append(offset)
+        gap = shift = 0
+    return offsets
+
+
+def query_phrases(query: str, tokenize) -> list[tuple]:
+    """Token tuples of the quoted phrases in a query (empty ones dropped)."""
+    phrases = []
+    for text in PHRASE_PATTERN.findall(query):
+        tokens = tuple(tokenize(text))
+        if tokens and tokens not in phrases:
+            phrases.append(tokens)
+    return phrases
+
+
+def contains_phrase(offset_lists: list[list[int]]) -> bool:
+    """Whether the terms occur at consecutive offsets, given each term's offsets."""
+    starts = set(offset_lists[0])
+    for i, offsets in enumerate(offset_lists[1:], start=1):
+        starts &= {offset - i for offset in offsets}
+        if not starts:
+            return False
+    return True
+
+
+def proximity_score(term_offsets: dict, term_weights: dict, window: int) -> float:
+    """
+    Term proximity of one document.
+    
+    All occurrences of the query terms are merged in text order. Each pair
+    of neighbouring occurrences of two different terms at most `window`
+    tokens apart adds the smaller of the two term weights (IDF) divided by
+    the squared distance, so adjacent query terms count most. Query term
+    order does not matter.
+    
+    Args:
+        term_offsets: Query term -> its ascending token offsets in the document
+        term_weights: Query term -> weight
+        window: Largest distance that still counts
+    """
+    occurrences = sorted((offset, term) for term, offsets in term_offsets.items() for offset in offsets)
+    score = 0.0
+    for (offset, term), (next_offset, next_term) in zip(occurrences, occurrences[1:]):
+        distance = next_offset - offset
+        if term != next_term and distance <= window:
+            score += min(term_weights[term], term_weights[next_term]) / (distance * distance)
+    return score
+
+
+def posting_indexes(positions: np.ndarray, documents: np.ndarray) -> np.ndarray:
+    """Index of each document in an ascending posting list's positions, or -1."""
+    indexes = np.searchsorted(positions, documents)
+    found = indexes < len(positions)
+    found[found] = positions[indexes[found]] == documents[found]
+    return np.where(found, indexes, -1)
+
+
+def posting_offsets(starts: np.ndarray, encoded: np.ndarray, index: int) -> list[int]:
+    """
+    Token offsets of the posting at `index` of a posting list.
+    
+    Args:
+        starts: Byte offset of each posting's encoded offsets, plus the end
+        encoded: Encoded offsets of the posting list
+        index: Posting index (see `posting_indexes`)
+    """
+    return decode_offsets(encoded[starts[index]:starts[index + 1]])
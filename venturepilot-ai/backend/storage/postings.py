@@ -0,0 +1,281 @@
+from typing import Optional
+
+import numpy as np
+
+from .buffers import GrowableArray, CopyOnWriteArray, StringList, gather_ranges
+from .id_map import KeyIndex
+from .positional import encode_offsets
+
+
+class PostingList:
+    """
+    Document positions, term frequencies and encoded token offsets for a
+    single term.
+    
+    Each posting's token offsets (see `positional.encode_offsets`) are
+    `offset_bytes[offset_starts[i]:offset_starts[i + 1]]`.
+    """
+    
+    def __init__(
+        self,
+        positions: Optional[GrowableArray] = None,
+        term_freqs: Optional[GrowableArray] = None,
+        offset_starts: Optional[GrowableArray] = None,
+        offset_bytes: Optional[GrowableArray] = None
+    ):
+        self.positions = positions if positions is not None else GrowableArray(np.int32, capacity=4)
+        self.term_freqs = term_freqs if term_freqs is not None else GrowableArray(np.float32, capacity=4)
+        if offset_starts is None:
+            offset_starts = GrowableArray(np.int64, capacity=4)
+            offset_starts.append(0)
+        self.offset_starts = offset_starts
+        self.offset_bytes = offset_bytes if offset_bytes is not None else GrowableArray(np.uint8, capacity=8)
+    
+    def extend(self, positions: list[int], token_offsets: list[list[int]]) -> None:
+        """Append postings (ascending positions, each with its token offsets) at once."""
+        encoded = [encode_offsets(offsets) for offsets in token_offsets]
+        # Offsets are written before the postings, so readers never see a
+        # posting without them
+        base = len(self.offset_bytes)
+        self.offset_bytes.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.offset_starts.extend(base + np.cumsum([len(data) for data in encoded]))
+        self.positions.extend(positions)
+        self.term_freqs.extend([len(offsets) for offsets in token_offsets])
+    
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class PostingIndex:
+    """
+    Inverted index over interned term ids: term -> id -> PostingList.
+    
+    The index can be backed by a read-only CSR snapshot (term offsets into
+    flat position/frequency arrays, typically memory-mapped). Posting lists
+    from the snapshot are wrapped on first access without copying, and only
+    the lists that later receive new documents are copied into memory.
+    Terms are kept in a `StringList`, and a snapshot's vocabulary is looked
+    up through a `KeyIndex`, so loading decodes no terms.
+    
+    Deleted documents stay in the posting lists (callers mask them out), but
+    `doc_freqs` counts live documents only, so IDF stays exact. It is
+    copy-on-write, so readers can freeze it cheaply after every write.
+    """
+    
+    def __init__(self):
+        self.vocabulary = {}  # term -> term id (terms not in `_term_index`, and writer lookups)
+        self._term_index = None  # KeyIndex: term -> term id, for snapshot terms
+        self._terms = StringList()  # term id -> term
+        self._lists = {}  # term id -> PostingList
+        self.doc_freqs = CopyOnWriteArray(np.int32)  # term id -> live document frequency
+        self._base_size = 0  # term ids below this live in the CSR snapshot
+        self._base_offsets = None
+        self._base_positions = None
+        self._base_term_freqs = None
+        self._base_offset_starts = None
+        self._base_offset_bytes = None
+    
+    @classmethod
+    def from_csr(
+        cls,
+        terms: StringList,
+        offsets: np.ndarray,
+        positions: np.ndarray,
+        term_freqs: np.ndarray,
+        offset_starts: np.ndarray,
+        offset_bytes: np.ndarray,
+        doc_freqs: Optional[np.ndarray] = None,
+        term_index: Optional[KeyIndex] = None,
+        vocabulary: Optional[dict] = None
+    ) -> "PostingIndex":
+        """
+        Build an index on top of CSR arrays (term id order) without copying them.
+        
+        `offset_starts` has one entry per posting plus the end, pointing into
+        `offset_bytes`, as returned by `to_csr`. Term ids are found through
+        `term_index` and then `vocabulary` (term -> id); without either, the
+        vocabulary is built from `terms`.
+        """
+        index = cls()
+        if term_index is None and vocabulary is None:
+            vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        index.vocabulary = dict(vocabulary or {})
+        index._term_index = term_index
+        index._terms = terms
+        if doc_freqs is None:
+            doc_freqs = np.diff(offsets).astype(np.int32)
+        index.doc_freqs = CopyOnWriteArray.from_array(doc_freqs)
+        index._base_size = len(terms)
+        index._base_offsets = offsets
+        index._base_positions = positions
+        index._base_term_freqs = term_freqs
+        index._base_offset_starts = offset_starts
+        index._base_offset_bytes = offset_bytes
+        return index
+    
+    def term_id(self, term: str, create: bool = False) -> Optional[int]:
+        """Interned id of a term; new terms get an id only if `create`."""
+        term_id = self.vocabulary.get(term)
+        if term_id is None and self._term_index is not None:
+            found = self._term_index.get(term)
+            if found:
+                term_id = found[0]
+                if create:
+                    # Writers look terms up once per document; skip the hash next time
+                    self.vocabulary[term] = term_id
+        if term_id is None and create:
+            # Add the term before its id, so readers never see a dangling id
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self.doc_freqs.append(0)
+            self.vocabulary[term] = term_id
+        return term_id
+    
+    def term(self, term_id: int) -> str:
+        """Term of an interned id."""
+        return self._terms[term_id]
+    
+    def add_postings(self, postings: dict) -> None:
+        """
+        Record a batch of documents: term id -> (ascending positions, token
+        offsets in each), with one append per posting list and one update of
+        the document frequencies.
+        """
+        for term_id, (positions, token_offsets) in postings.items():
+            self.get_by_id(term_id).extend(positions, token_offsets)
+        term_ids = np.fromiter(postings, dtype=np.int64, count=len(postings))
+        counts = [len(positions) for positions, _ in postings.values()]
+        self.doc_freqs.add(term_ids, counts)
+    
+    def remove_document(self, term_ids: np.ndarray) -> None:
+        """Decrement the document frequency of a deleted document's (unique) terms."""
+        self.doc_freqs.add(term_ids, -1)
+    
+    def doc_freq(self, term_id: int) -> int:
+        """Number of live documents containing a term."""
+        return int(self.doc_freqs[term_id])
+    
+    def get_by_id(self, term_id: int) -> PostingList:
+        """Posting list for a term id."""
+        posting = self._lists.get(term_id)
+        if posting is None:
+            if term_id < self._base_size:
+                start, end = int(self._base_offsets[term_id]), int(self._base_offsets[term_id + 1])
+                starts = self._base_offset_starts[start:end + 1]
+                posting = PostingList(
+                    GrowableArray.from_array(self._base_positions[start:end]),
+                    GrowableArray.from_array(self._base_term_freqs[start:end]),
+                    GrowableArray.from_array(starts - starts[0]),
+                    GrowableArray.from_array(self._base_offset_bytes[int(starts[0]):int(starts[-1])])
+                )
+            else:
+                posting = PostingList()
+            self._lists[term_id] = posting
+        return posting
+    
+    def read(self, term_id: int) -> tuple:
+        """
+        (positions, term_freqs) of a term id, for concurrent readers.
+        
+        Unlike `get_by_id` this never modifies the index. Positions are in
+        ascending order, and both arrays have the same length even while a
+        writer is appending.
+        """
+        posting = self._lists.get(term_id)
+        if posting is not None:
+            positions, term_freqs = posting.positions.view(), posting.term_freqs.view()
+            count = min(len(positions), len(term_freqs))
+            return positions[:count], term_freqs[:count]
+        if term_id < self._base_size:
+            start, end = int(self._base_offsets[term_id]), int(self._base_offsets[term_id + 1])
+            return self._base_positions[start:end], self._base_term_freqs[start:end]
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    
+    def read_offsets(self, term_id: int) -> tuple:
+        """
+        (positions, offset_starts, offset_bytes) of a term id, for concurrent
+        readers; see `positional.posting_offsets`.
+        
+        `offset_starts` has one more entry than `positions`.
+        """
+        posting = self._lists.get(term_id)
+        if posting is not None:
+            positions, starts = posting.positions.view(), posting.offset_starts.view()
+            count = min(len(positions), len(starts) - 1)
+            return positions[:count], starts[:count + 1], posting.offset_bytes.view()
+        if term_id < self._base_size:
+            start, end = int(self._base_offsets[term_id]), int(self._base_offsets[term_id + 1])
+            return (
+                self._base_positions[start:end],
+                self._base_offset_starts[start:end + 1],
+                self._base_offset_bytes
+            )
+        return np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    
+    def get(self, term: str) -> Optional[PostingList]:
+        """Return the posting list for a term, or None if it is unknown."""
+        term_id = self.term_id(term)
+        if term_id is None:
+            return None
+        return self.get_by_id(term_id)
+    
+    def terms(self) -> StringList:
+        """All indexed terms, in term id order."""
+        return self._terms
+    
+    def __contains__(self, term: str) -> bool:
+        return self.term_id(term) is not None
+    
+    def __len__(self) -> int:
+        return len(self._terms)
+    
+    def compact(self, remap: np.ndarray) -> "PostingIndex":
+        """
+        A copy of the index with each position p renumbered to `remap[p]`.
+        
+        Postings of positions mapped to -1 are dropped. `remap` must keep
+        the order of the surviving positions; term ids and document
+        frequencies are unchanged.
+        """
+        terms, offsets, positions, term_freqs, offset_starts, offset_bytes = self.to_csr()
+        positions = remap[positions]
+        keep = positions >= 0
+        kept = np.zeros(len(keep) + 1, dtype=np.int64)
+        kept[1:] = np.cumsum(keep)
+        byte_starts, byte_ends = offset_starts[:-1][keep], offset_starts[1:][keep]
+        starts = np.zeros(len(byte_starts) + 1, dtype=np.int64)
+        starts[1:] = np.cumsum(byte_ends - byte_starts)
+        return PostingIndex.from_csr(
+            terms, kept[offsets], positions[keep].astype(np.int32), term_freqs[keep], starts,
+            gather_ranges(offset_bytes, byte_starts, byte_ends), self.doc_freqs.to_array(),
+            self._term_index, self.vocabulary
+        )
+    
+    def to_csr(self) -> tuple:
+        """
+        Flatten the index into (terms, offsets, positions, term_freqs,
+        offset_starts, offset_bytes).
+        """
+        terms = self.terms()
+        lists = [self.get_by_id(term_id) for term_id in range(len(terms))]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(posting) for posting in lists])
+        offset_starts = np.zeros(int(offsets[-1]) + 1, dtype=np.int64)
+        if lists:
+            positions = np.concatenate([posting.positions.view() for posting in lists])
+            term_freqs = np.concatenate([posting.term_freqs.view() for posting in lists])
+            offset_bytes = np.concatenate([posting.offset_bytes.view() for posting in lists])
+            # Shift each list's byte offsets past the bytes of the lists before it
+            byte_base = 0
+            for posting, start, end in zip(lists, offsets[:-1], offsets[1:]):
+                starts = posting.offset_starts.view()
+                offset_starts[start + 1:end + 1] = starts[1:] + byte_base
+                byte_base += int(starts[-1])
+        else:
+            positions = np.zeros(0, dtype=np.int32)
+            term_freqs = np.zeros(0, dtype=np.float32)
+            offset_bytes = np.zeros(0, dtype=np.uint8)
+        return (
+            terms, offsets, positions.astype(np.int32), term_freqs.astype(np.float32),
+            offset_starts, offset_bytes.astype(np.uint8)
+        )
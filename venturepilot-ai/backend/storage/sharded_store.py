@@ -0,0 +1,595 @@
+"""
+Multi-process sharded vector store.
+
+Scoring is CPU-bound Python and NumPy, so one process only uses one core
+for retrieval. A ShardedVectorStore hash-partitions documents by stable id
+(passages by their parent's, so a document stays on one shard) across N
+worker processes, each owning one VectorStore shard (memory-mapped
+from its own snapshot when opened with `load`). Searches scatter to every
+shard at once and the per-shard top-k lists are merged.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Optional, Union
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+from .vector_store import (
+    VectorStore, SEARCH_MODES, parent_key, fuse_rankings, to_day_number, _generations
+)
+from .tokenizer import Tokenizer
+from .embeddings import HashedEmbedder
+from .facets import FacetCounts
+from .expansion import QueryExpansion
+from .positional import query_phrases
+from .pagination import encode_cursor, decode_cursor
+from .topk import top_k_items
+from . import tracing
+
+
+SHARDS_FILE = "shards.json"
+
+# Larger than any document position, for page cursor bounds
+MAX_POSITION = 2 ** 62
+
+# The shard owned by this worker process
+_shard = None
+
+
+def _open_shard(directory: str, options: dict, load: bool) -> None:
+    """Worker initializer: create or memory-map this process's shard."""
+    global _shard
+    if load:
+        _shard = VectorStore.load(directory, **options)
+    else:
+        _shard = VectorStore(persist_directory=directory, **options)
+
+
+def _call_shard(method: str, *args, **kwargs):
+    """Run a VectorStore method on this process's shard."""
+    return getattr(_shard, method)(*args, **kwargs)
+
+
+def _shard_attribute(name: str):
+    """Read a VectorStore attribute of this process's shard."""
+    return getattr(_shard, name)
+
+
+def _search_shard_page(query, filters, page_size, after, mode, since, until, corpus_stats) -> tuple:
+    """This shard's next search page: (results, (score, day, position) of each)."""
+    state, scored_docs = _shard._page_scored(query, filters, page_size, mode, since, until, corpus_stats, after)
+    keys = [(score, int(state.day_numbers[position]), position) for position, score in scored_docs]
+    return _shard._format_results(state, scored_docs), keys
+
+
+def _list_shard_page(filters, page_size, after, since, until) -> tuple:
+    """This shard's next listing page: (results, (day, position) of each)."""
+    state = _shard._current
+    listed = _shard._list_positions(state, filters, page_size, after, since, until)
+    keys = [(int(state.day_numbers[position]), position) for position in listed]
+    return _shard._format_results(state, [(position, 0.0) for position in listed]), keys
+
+
+def shard_of(key: str, num_shards: int) -> int:
+    """Shard holding a stable document id."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % num_shards
+
+
+class ShardedVectorStore:
+    """
+    VectorStore interface over one worker process per shard.
+    
+    Search, write and snapshot methods match VectorStore. Writes are routed
+    to the shard owning each id. BM25 scores use corpus-wide statistics
+    gathered from every shard (and cached until the next write), so they
+    equal an unsharded store's; hybrid searches fuse the merged BM25 and
+    ANN rankings. Only ties are ordered differently: after score and day,
+    by rank within a shard.
+    
+    Every search costs an IPC round trip per shard, so sharding only pays
+    off with at least one free core per shard (see `benchmark_vector_store.py
+    shards`); on fewer cores a single VectorStore is faster.
+    """
+    
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        num_shards: int = 2,
+        mode: str = "keyword",
+        embedding_dim: int = 128,
+        ann_nprobe: int = 8,
+        tokenizer: Optional[Tokenizer] = None
+    ):
+        """Start one worker process per shard, each with an empty store."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        
+        self.tokenizer = tokenizer or Tokenizer()
+        options = {
+            "mode": mode,
+            "embedding_dim": embedding_dim,
+            "ann_nprobe": ann_nprobe,
+            "tokenizer": self.tokenizer
+        }
+        self._start(persist_directory, num_shards, mode, embedding_dim, options, load=False)
+        self.snapshot_metadata = {}
+    
+    def _start(
+        self,
+        persist_directory: str,
+        num_shards: int,
+        mode: str,
+        embedding_dim: int,
+        options: dict,
+        load: bool
+    ) -> None:
+        self.persist_directory = persist_directory
+        self.num_shards = num_shards
+        self.mode = mode
+        self.embedding_dim = embedding_dim
+        self._embedder = HashedEmbedder(dim=embedding_dim)  # document embeddings are hashed, no corpus state
+        
+        # One single-process pool per shard, so each shard's calls run in
+        # order in the process that owns it; "spawn" avoids forking a
+        # threaded server process
+        context = multiprocessing.get_context("spawn")
+        self._shards = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_open_shard,
+                initargs=(self._shard_directory(persist_directory, shard), options, load)
+            )
+            for shard in range(num_shards)
+        ]
+        self._write_lock = threading.Lock()
+        self._generation = next(_generations)
+        
+        # The shards' query expansion, to list the terms of queries here, and
+        # the corpus statistics of the terms looked up since the last write
+        self._expansion = None
+        self._stats_cache = {"generation": None}
+    
+    @staticmethod
+    def _shard_directory(directory: str, shard: int) -> str:
+        return os.path.join(directory, f"shard-{shard}")
+    
+    @property
+    def generation(self) -> int:
+        """Id of the current contents; changes on every write."""
+        return self._generation
+    
+    @property
+    def num_alive(self) -> int:
+        """Number of live documents over all shards."""
+        return sum(self._broadcast(_shard_attribute, "num_alive"))
+    
+    def _broadcast(self, function, *args, **kwargs) -> list:
+        """Run a function on every shard concurrently; results in shard order."""
+        futures = [shard.submit(function, *args, **kwargs) for shard in self._shards]
+        return [future.result() for future in futures]
+    
+    def _route(self, method: str, items: list, key) -> list:
+        """Send each shard its items (routed by stable id) concurrently."""
+        parts = [[] for _ in self._shards]
+        for item in items:
+            parts[shard_of(key(item), self.num_shards)].append(item)
+        futures = [
+            shard.submit(_call_shard, method, part)
+            for shard, part in zip(self._shards, parts) if part
+        ]
+        return [future.result() for future in futures]
+    
+    def add_documents(self, documents: list[dict]) -> None:
+        """Add documents (see `VectorStore.add_documents`) to their shards."""
+        with self._write_lock:
+            self._route("add_documents", documents, parent_key)
+            self._generation = next(_generations)
+    
+    def upsert_documents(self, documents: list[dict]) -> dict:
+        """Insert or replace documents by stable id; counts summed over shards."""
+        with self._write_lock:
+            counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+            for shard_counts in self._route("upsert_documents", documents, parent_key):
+                for name, count in shard_counts.items():
+                    counts[name] += count
+            self._generation = next(_generations)
+        return counts
+    
+    def delete_documents(self, doc_ids: list[str]) -> int:
+        """
+        Delete documents by stable id; returns the number deleted.
+        
+        Passage ids do not tell which shard holds their parent, so every
+        shard is asked.
+        """
+        with self._write_lock:
+            deleted = sum(self._broadcast(_call_shard, "delete_documents", [str(doc_id) for doc_id in doc_ids]))
+            self._generation = next(_generations)
+        return deleted
+    
+    def compact(self) -> int:
+        """Compact every shard (see `VectorStore.compact`); returns the positions dropped."""
+        with self._write_lock:
+            dropped = sum(self._broadcast(_call_shard, "compact"))
+            self._generation = next(_generations)
+        return dropped
+    
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        """Materialize a stored document (see `VectorStore.get_document`), or None if absent."""
+        shard = self._shards[shard_of(str(doc_id), self.num_shards)]
+        document = shard.submit(_call_shard, "get_document", str(doc_id)).result()
+        if document is None:
+            # A passage id: its parent may live on any shard
+            others = [s for s in self._shards if s is not shard]
+            futures = [s.submit(_call_shard, "get_document", str(doc_id)) for s in others]
+            document = next((d for d in (f.result() for f in futures) if d is not None), None)
+        return document
+    
+    def corpus_statistics(self) -> dict:
+        """Document counts and facets (see `VectorStore.corpus_statistics`), summed over shards."""
+        shard_stats = self._broadcast(_call_shard, "corpus_statistics")
+        facets = FacetCounts.merged([FacetCounts.from_dict(stats) for stats in shard_stats])
+        return {"passages": sum(stats["passages"] for stats in shard_stats), **facets.to_dict()}
+    
+    def set_query_expansion(self, expansion: Optional[QueryExpansion]) -> None:
+        """Expand BM25 queries on every shard (see `VectorStore.set_query_expansion`)."""
+        with self._write_lock:
+            self._broadcast(_call_shard, "set_query_expansion", expansion)
+            self._expansion = expansion
+            self._generation = next(_generations)
+    
+    def cooccurrence_statistics(self, anchors: list[str]) -> dict:
+        """Co-occurrence counts (see `VectorStore.cooccurrence_statistics`), summed over shards."""
+        merged = {"num_docs": 0, "pairs": {}}
+        for stats in self._broadcast(_call_shard, "cooccurrence_statistics", anchors):
+            merged["num_docs"] += stats["num_docs"]
+            for anchor, shared_counts in stats["pairs"].items():
+                counts = merged["pairs"].setdefault(anchor, {})
+                for term, shared in shared_counts.items():
+                    counts[term] = counts.get(term, 0) + shared
+        return merged
+    
+    def document_frequencies(self, terms: list[str]) -> dict:
+        """Live document frequency of each term, summed over shards."""
+        doc_freqs = dict.fromkeys(terms, 0)
+        for shard_freqs in self._broadcast(_call_shard, "document_frequencies", terms):
+            for term, doc_freq in shard_freqs.items():
+                doc_freqs[term] += doc_freq
+        return doc_freqs
+    
+    def normalize_query(self, query: str) -> tuple:
+        """Sorted unique query terms and quoted phrases (see `VectorStore.normalize_query`)."""
+        phrases = query_phrases(query, self.tokenizer.tokenize)
+        return tuple(sorted(set(self.tokenizer.tokenize(query)))) + tuple(sorted(phrases))
+    
+    def embed_texts(self, texts: list[str]) -> np.ndarray:
+        """Unit-length embeddings of texts (see `VectorStore.embed_texts`)."""
+        return self._embedder.embed_documents([self.tokenizer.tokenize(text) for text in texts])
+    
+    def search(
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        k: int = 5,
+        mode: Optional[str] = None,
+        since: Union[str, date, None] = None,
+        until: Union[str, date, None] = None
+    ) -> list[dict]:
+        """Search all shards (see `VectorStore.search`)."""
+        return self.search_many([query], [filters], k=k, mode=mode, since=since, until=until)[0]
+    
+    def search_many(
+        self,
+        queries: list[str],
+        filters_list: Optional[list[Optional[dict]]] = None,
+        k: Union[int, list[int]] = 5,
+        mode: Optional[str] = None,
+        since=None,
+        until=None
+    ) -> list[list[dict]]:
+        """
+        Search all shards for a batch of queries (see `VectorStore.search_many`).
+        
+        Every shard runs the whole batch concurrently and returns its own
+        top-k per query; the lists are merged into the global top-k.
+        """
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        ks = k if isinstance(k, list) else [k] * len(queries)
+        
+        corpus_stats = None
+        if mode != "keyword":
+            corpus_stats = self._corpus_stats(queries, mode)
+        
+        if mode != "hybrid":
+            futures = self._scatter(queries, filters_list, ks, mode, since, until, corpus_stats)
+            return self._gather(futures, ks)
+        
+        pages = self._search_hybrid(queries, filters_list, ks, since, until, corpus_stats)
+        return [[result for result, _ in page] for page in pages]
+    
+    def _search_hybrid(self, queries, filters_list, ks, since, until, corpus_stats, afters=None) -> list[list[tuple]]:
+        """
+        Hybrid results as (result, (score, day, index)) pairs per query.
+        
+        The corpus-wide BM25 and ANN rankings are fused, not each shard's
+        local ones. The index (first appearance in the rankings) breaks
+        remaining ties; it is stable across pages of the same query.
+        """
+        afters = afters or [None] * len(queries)
+        depths = [max(k * VectorStore.HYBRID_DEPTH_FACTOR, VectorStore.HYBRID_MIN_DEPTH) for k in ks]
+        lexical_futures = self._scatter(queries, filters_list, depths, "bm25", since, until, corpus_stats)
+        dense_futures = self._scatter(queries, filters_list, depths, "ann", since, until, corpus_stats)
+        lexical, dense = self._gather(lexical_futures, depths), self._gather(dense_futures, depths)
+        
+        results = []
+        for lexical_docs, dense_docs, query_k, after in zip(lexical, dense, ks, afters):
+            by_id = {}
+            for result in lexical_docs + dense_docs:
+                by_id.setdefault(result["id"], result)
+            rankings = [[result["id"] for result in ranking] for ranking in (lexical_docs, dense_docs)]
+            fused = fuse_rankings(rankings, VectorStore.RRF_K)
+            ids = list(by_id)  # first appearance order breaks remaining ties
+            items = [
+                (i, fused[doc_id], to_day_number(by_id[doc_id]["metadata"]["timestamp"]))
+                for i, doc_id in enumerate(ids)
+            ]
+            results.append([
+                ({**by_id[ids[i]], "relevance_score": score}, (score, day, i))
+                for i, score, day in top_k_items(items, query_k, after)
+            ])
+        return results
+    
+    def search_page(
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+        mode: Optional[str] = None,
+        since: Union[str, date, None] = None,
+        until: Union[str, date, None] = None
+    ) -> dict:
+        """
+        One page of search results over all shards (see `VectorStore.search_page`).
+        
+        Results are ordered by score, day, shard and position. The cursor
+        holds all four, and each shard resumes from its own bound on that
+        order, so no shard returns more than one page.
+        """
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        corpus_stats = self._corpus_stats([query], mode) if mode != "keyword" else None
+        
+        if mode == "hybrid":
+            after = decode_cursor(cursor, "hybrid", 3)
+            page = self._search_hybrid([query], [filters], [page_size], since, until, corpus_stats, [after])[0]
+            next_cursor = encode_cursor("hybrid", page[-1][1]) if len(page) == page_size else None
+            return {"results": [result for result, _ in page], "next_cursor": next_cursor}
+        
+        after = decode_cursor(cursor, "search", 4)
+        futures = []
+        for shard_index, shard in enumerate(self._shards):
+            shard_after = None
+            if after is not None:
+                score, day, cursor_shard, cursor_position = after
+                if shard_index == cursor_shard:
+                    bound = cursor_position
+                else:
+                    bound = -1 if shard_index > cursor_shard else MAX_POSITION
+                shard_after = (score, day, bound)
+            futures.append(shard.submit(
+                _search_shard_page, query, filters, page_size, shard_after, mode, since, until, corpus_stats
+            ))
+        
+        items = []
+        for shard_index, future in enumerate(futures):
+            results, keys = future.result()
+            for result, (score, day, position) in zip(results, keys):
+                items.append(((shard_index, position), score, day, result))
+        page = top_k_items(items, page_size)
+        next_cursor = None
+        if len(page) == page_size:
+            (shard_index, position), score, day, _ = page[-1]
+            next_cursor = encode_cursor("search", (score, day, shard_index, position))
+        return {"results": [item[3] for item in page], "next_cursor": next_cursor}
+    
+    def list_page(
+        self,
+        filters: Optional[dict] = None,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        since: Union[str, date, None] = None,
+        until: Union[str, date, None] = None
+    ) -> dict:
+        """
+        One page of documents over all shards, newest first (see
+        `VectorStore.list_page`); equal days are ordered by shard, then
+        newest position first.
+        """
+        after = decode_cursor(cursor, "list", 3)
+        futures = []
+        for shard_index, shard in enumerate(self._shards):
+            shard_after = None
+            if after is not None:
+                day, cursor_shard, cursor_position = after
+                if shard_index == cursor_shard:
+                    bound = cursor_position
+                else:
+                    bound = MAX_POSITION if shard_index > cursor_shard else 0
+                shard_after = (day, bound)
+            futures.append(shard.submit(_list_shard_page, filters, page_size, shard_after, since, until))
+        
+        items = []
+        for shard_index, future in enumerate(futures):
+            results, keys = future.result()
+            for result, (day, position) in zip(results, keys):
+                items.append(((shard_index, -position), 0.0, day, result))
+        page = top_k_items(items, page_size)
+        next_cursor = None
+        if len(page) == page_size:
+            (shard_index, negative_position), _, day, _ = page[-1]
+            next_cursor = encode_cursor("list", (day, shard_index, -negative_position))
+        return {"results": [item[3] for item in page], "next_cursor": next_cursor}
+    
+    def _query_terms(self, queries: list[str]) -> list[str]:
+        """Distinct terms the shards score the queries with (see `VectorStore._query_weights`)."""
+        terms = {}
+        for query in queries:
+            tokens = self.tokenizer.tokenize(query)
+            terms.update(dict.fromkeys(self._expansion.expand(tokens) if self._expansion is not None else tokens))
+        return list(terms)
+    
+    def _corpus_stats(self, queries: list[str], mode: str) -> dict:
+        """
+        Corpus-wide statistics of the query terms, summed over shards.
+        
+        Statistics are cached until the next write, and only terms missing
+        from the cache are fetched, so once a query's terms have been seen a
+        search makes a single round trip to the shards. Context vectors
+        are only fetched (and cached) for dense modes.
+        """
+        generation = self._generation
+        cache = self._stats_cache
+        if cache["generation"] != generation:
+            cache = {
+                "generation": generation, "num_docs": None, "total_length": 0,
+                "doc_freqs": {}, "contexts": {}, "with_contexts": set()
+            }
+        dense = mode in VectorStore.DENSE_MODES
+        terms = self._query_terms(queries)
+        missing = [
+            term for term in terms
+            if term not in cache["doc_freqs"] or (dense and term not in cache["with_contexts"])
+        ]
+        
+        with tracing.span("statistics", candidates=len(terms)) as span:
+            if missing or cache["num_docs"] is None:
+                doc_freqs, contexts = dict.fromkeys(missing, 0), {}
+                num_docs = total_length = 0
+                for stats in self._broadcast(_call_shard, "term_statistics", [], mode, missing):
+                    num_docs += stats["num_docs"]
+                    total_length += stats["total_length"]
+                    for term, doc_freq in stats["doc_freqs"].items():
+                        doc_freqs[term] += doc_freq
+                    # Context vectors are co-occurrence sums, so shard sums add up
+                    for term, context in stats["contexts"].items():
+                        contexts[term] = contexts[term] + context if term in contexts else context
+                cache["num_docs"], cache["total_length"] = num_docs, total_length
+                cache["doc_freqs"].update(doc_freqs)
+                if dense:
+                    cache["contexts"].update(contexts)
+                    cache["with_contexts"].update(missing)
+                # A write may have finished meanwhile; then the cache is stale
+                if self._generation == generation:
+                    self._stats_cache = cache
+            span.results = len(missing)
+        
+        return {
+            "num_docs": cache["num_docs"],
+            "total_length": cache["total_length"],
+            "doc_freqs": {term: cache["doc_freqs"][term] for term in terms},
+            "contexts": {term: cache["contexts"][term] for term in terms if term in cache["contexts"]}
+        }
+    
+    def _scatter(self, queries, filters_list, ks, mode, since, until, corpus_stats=None) -> list:
+        """Start the batch on every shard; one future per shard."""
+        options = {"k": ks, "mode": mode, "since": since, "until": until}
+        if corpus_stats is not None:
+            options["corpus_stats"] = corpus_stats
+        return [
+            shard.submit(_call_shard, "search_many", queries, filters_list, **options)
+            for shard in self._shards
+        ]
+    
+    def _gather(self, futures: list, ks: list[int]) -> list[list[dict]]:
+        """
+        Merge per-shard result lists into the top-k of each query.
+        
+        Shards time their stages in their own processes, so a trace shows
+        the wait for all shards as one "shards" span.
+        """
+        with tracing.span("shards") as span:
+            shard_results = [future.result() for future in futures]
+            span.results = sum(len(query_results) for results in shard_results for query_results in results)
+        merged = []
+        with tracing.span("sort") as span:
+            for i, query_k in enumerate(ks):
+                items = []
+                for shard, results in enumerate(shard_results):
+                    for rank, result in enumerate(results[i]):
+                        day = to_day_number(result["metadata"]["timestamp"])
+                        items.append(((rank, shard), result["relevance_score"], day))
+                top = top_k_items(items, query_k)
+                merged.append([shard_results[shard][i][rank] for (rank, shard), _, _ in top])
+                span.candidates += len(items)
+                span.results += len(top)
+        return merged
+    
+    def save(self, directory: Optional[str] = None, metadata: Optional[dict] = None) -> None:
+        """
+        Write every shard's snapshot, plus a manifest of the shard layout.
+        
+        Args:
+            directory: Snapshot directory (defaults to persist_directory)
+            metadata: Extra JSON-serializable data stored in the manifest
+        """
+        directory = directory or self.persist_directory
+        with self._write_lock:
+            futures = [
+                shard.submit(_call_shard, "save", self._shard_directory(directory, i))
+                for i, shard in enumerate(self._shards)
+            ]
+            for future in futures:
+                future.result()
+            
+            manifest = {
+                "num_shards": self.num_shards,
+                "embedding_dim": self.embedding_dim,
+                "tokenizer": self.tokenizer.settings(),
+                "metadata": metadata or {}
+            }
+            # Written last and swapped in, so it only describes complete shards
+            staging = os.path.join(directory, f"{SHARDS_FILE}.tmp-{os.getpid()}")
+            with open(staging, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(staging, os.path.join(directory, SHARDS_FILE))
+    
+    @classmethod
+    def load(cls, directory: str, mode: str = "keyword", ann_nprobe: int = 8) -> "ShardedVectorStore":
+        """
+        Open shard snapshots written by `save`.
+        
+        Each worker memory-maps its own shard, so start-up is fast and the
+        shards share the page cache with any other process mapping them.
+        """
+        with open(os.path.join(directory, SHARDS_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        store = cls.__new__(cls)
+        store.tokenizer = Tokenizer(**manifest["tokenizer"])
+        options = {"mode": mode, "ann_nprobe": ann_nprobe}
+        store._start(directory, manifest["num_shards"], mode, manifest["embedding_dim"], options, load=True)
+        store.snapshot_metadata = manifest["metadata"]
+        return store
+    
+    @staticmethod
+    def snapshot_exists(directory: str) -> bool:
+        """Check whether a directory holds saved shard snapshots."""
+        return os.path.exists(os.path.join(directory, SHARDS_FILE))
+    
+    def close(self) -> None:
+        """Stop the shard worker processes."""
+        for shard in self._shards:
+            shard.shutdown()
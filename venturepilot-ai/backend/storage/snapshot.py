@@ -0,0 +1,253 @@
+"""
+On-disk snapshots of a VectorStore.
+
+A snapshot is a directory of flat NumPy arrays plus a small JSON manifest:
+
+- documents: the DocumentTable columns (UTF-8 arena, offsets, codes and
+  passage parents and offsets), stable ids, content hashes and the deletion marks
+- id maps: sorted hashes of the live positions' ids and parent ids, with
+  the positions in the same order (see `id_map.KeyIndex`)
+- postings: CSR layout (term offsets into flat position/frequency arrays),
+  with each posting's encoded token offsets, plus each document's term ids
+  in the same layout, and the terms with their hash index
+- embeddings, co-occurrence context vectors (with their terms and hash
+  index) and the IVF index arrays, all empty until the store has used a
+  dense mode; document lengths, day numbers, the time-ordered index with
+  its sorted days and partitions
+- facet counts
+
+Strings (ids, parent ids, terms) are stored as UTF-8 arenas with offsets
+(see `buffers.StringList`). Every array is loaded with `mmap_mode="r"`
+and nothing is decoded or rebuilt per document, so start-up cost does not
+grow with the corpus and every worker process maps the same page-cache
+pages.
+"""
+from typing import Optional
+import json
+import os
+import shutil
+
+import numpy as np
+
+from .buffers import GrowableArray, StringList
+from .postings import PostingIndex
+from .ann_index import IVFIndex
+from .document_table import DocumentTable
+from .id_map import KeyIndex, PositionMap, hash_pairs
+from .facets import FacetCounts
+
+
+SNAPSHOT_VERSION = 12
+MANIFEST_FILE = "manifest.json"
+
+
+def snapshot_exists(directory: str) -> bool:
+    """Check whether a directory holds a snapshot."""
+    return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+
+def read_manifest(directory: str) -> dict:
+    """Read a snapshot manifest."""
+    with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+    return manifest
+
+
+def _save_array(directory: str, name: str, array: np.ndarray) -> None:
+    np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def _load_array(directory: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+
+def _save_json(directory: str, name: str, value) -> None:
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+
+
+def _load_json(directory: str, name: str):
+    with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_csr(directory: str, name: str, lists: list[np.ndarray]) -> None:
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values in lists])
+    values = np.concatenate(lists) if lists else np.zeros(0, dtype=np.int32)
+    _save_array(directory, f"{name}_offsets", offsets)
+    _save_array(directory, f"{name}_values", values.astype(np.int32))
+
+
+def _save_strings(directory: str, name: str, strings: StringList) -> None:
+    _save_array(directory, f"{name}_arena", strings.arena.view())
+    _save_array(directory, f"{name}_offsets", strings.offsets.view())
+
+
+def _load_strings(directory: str, name: str) -> StringList:
+    return StringList.from_arrays(_load_array(directory, f"{name}_arena"), _load_array(directory, f"{name}_offsets"))
+
+
+def _save_key_index(directory: str, name: str, pairs) -> None:
+    hashes, values = hash_pairs(pairs)
+    _save_array(directory, f"{name}_hashes", hashes)
+    _save_array(directory, f"{name}_values", values)
+
+
+def _load_key_index(directory: str, name: str, key_of) -> KeyIndex:
+    return KeyIndex(_load_array(directory, f"{name}_hashes"), _load_array(directory, f"{name}_values"), key_of)
+
+
+def save_snapshot(store, directory: str, metadata: Optional[dict] = None) -> None:
+    """
+    Write a store to a snapshot directory.
+    
+    The snapshot is written next to the target and swapped in with renames,
+    so processes loading concurrently never see a half-written snapshot.
+    Processes that already mapped the old files keep reading them.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = f"{os.path.abspath(directory)}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    
+    # Documents
+    document_arrays, field_values = store.documents.to_arrays()
+    for name, array in document_arrays.items():
+        _save_array(staging, name, array)
+    _save_strings(staging, "doc_keys", store.doc_keys)
+    _save_array(staging, "content_hashes", store.content_hashes.view())
+    # Deletion epochs restart when loaded: deleted positions are saved as 0
+    deleted_at = store.deleted_at.view()
+    _save_array(staging, "deleted_at", np.where(deleted_at == store.NOT_DELETED, deleted_at, 0))
+    
+    # Id maps over the live positions
+    parent_ids = store.documents.parent_ids
+    live = np.flatnonzero(deleted_at == store.NOT_DELETED).tolist()
+    _save_key_index(staging, "key_index", ((store.doc_keys[position], position) for position in live))
+    _save_key_index(staging, "parent_index", (
+        (parent_ids[position] or store.doc_keys[position], position) for position in live
+    ))
+    
+    # Inverted index
+    terms, offsets, positions, term_freqs, offset_starts, offset_bytes = store.postings.to_csr()
+    _save_strings(staging, "terms", terms)
+    _save_key_index(staging, "term_index", ((term, term_id) for term_id, term in enumerate(terms)))
+    _save_array(staging, "postings_offsets", offsets)
+    _save_array(staging, "postings_positions", positions)
+    _save_array(staging, "postings_term_freqs", term_freqs)
+    _save_array(staging, "postings_offset_starts", offset_starts)
+    _save_array(staging, "postings_offset_bytes", offset_bytes)
+    _save_array(staging, "doc_freqs", store.postings.doc_freqs.to_array())
+    _save_array(staging, "doc_term_ids", store.doc_term_ids.view())
+    _save_array(staging, "doc_term_offsets", store.doc_term_offsets.view())
+    
+    # Per-document columns
+    _save_array(staging, "doc_lengths", store.doc_lengths.view())
+    _save_array(staging, "day_numbers", store.day_numbers.view())
+    time_order = np.argsort(store.day_numbers.view(), kind="stable").astype(np.int32)
+    _save_array(staging, "time_order", time_order)
+    _save_array(staging, "time_days", store.day_numbers.view()[time_order])
+    _save_array(staging, "vectors", store.vectors.view())
+    
+    # Embedding co-occurrence state
+    context_terms, contexts = store.embedder.context_arrays()
+    _save_strings(staging, "context_terms", StringList(context_terms))
+    _save_key_index(staging, "context_index", ((term, row) for row, term in enumerate(context_terms)))
+    _save_array(staging, "contexts", contexts)
+    
+    # Partitions, in the same value order as the manifest
+    partition_values = {}
+    for field, partition in store.partitions.items():
+        values = sorted(partition)
+        partition_values[field] = values
+        _save_csr(staging, f"partition_{field}", [partition[value].view() for value in values])
+    
+    for name, array in store.ann_index.to_arrays().items():
+        _save_array(staging, f"ann_{name}", array)
+    _save_json(staging, "facets.json", store.facets.to_dict())
+    
+    _save_json(staging, MANIFEST_FILE, {
+        "version": SNAPSHOT_VERSION,
+        "num_documents": len(store.documents),
+        "num_alive": store.num_alive,
+        "total_length": int(store.total_length),
+        "embedding_dim": store.embedder.dim,
+        "dense": store._dense,
+        "tokenizer": store.tokenizer.settings(),
+        "field_values": field_values,
+        "partition_values": partition_values,
+        "metadata": metadata or {}
+    })
+    
+    # Swap the new snapshot in
+    retired = None
+    if os.path.exists(directory):
+        retired = f"{os.path.abspath(directory)}.old-{os.getpid()}"
+        os.rename(directory, retired)
+    os.rename(staging, directory)
+    if retired:
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+def load_snapshot(store, directory: str) -> None:
+    """Populate an empty store from a snapshot, memory-mapping its arrays."""
+    manifest = read_manifest(directory)
+    
+    store.documents = DocumentTable.from_arrays(
+        {name: _load_array(directory, name) for name in DocumentTable.array_names()},
+        manifest["field_values"]
+    )
+    doc_keys = store.doc_keys = _load_strings(directory, "doc_keys")
+    store.content_hashes = GrowableArray.from_array(_load_array(directory, "content_hashes"))
+    store.deleted_at = GrowableArray.from_array(_load_array(directory, "deleted_at"))
+    store.num_alive = manifest["num_alive"]
+    parent_ids = store.documents.parent_ids
+    store._positions_by_key = PositionMap(_load_key_index(directory, "key_index", doc_keys.__getitem__))
+    store._positions_by_parent = PositionMap(_load_key_index(
+        directory, "parent_index", lambda position: parent_ids[position] or doc_keys[position]
+    ))
+    
+    terms = _load_strings(directory, "terms")
+    store.postings = PostingIndex.from_csr(
+        terms,
+        _load_array(directory, "postings_offsets"),
+        _load_array(directory, "postings_positions"),
+        _load_array(directory, "postings_term_freqs"),
+        _load_array(directory, "postings_offset_starts"),
+        _load_array(directory, "postings_offset_bytes"),
+        _load_array(directory, "doc_freqs"),
+        _load_key_index(directory, "term_index", terms.__getitem__)
+    )
+    store.doc_term_ids = GrowableArray.from_array(_load_array(directory, "doc_term_ids"))
+    store.doc_term_offsets = GrowableArray.from_array(_load_array(directory, "doc_term_offsets"))
+    
+    store.doc_lengths = GrowableArray.from_array(_load_array(directory, "doc_lengths"))
+    store.total_length = manifest["total_length"]
+    store.day_numbers = GrowableArray.from_array(_load_array(directory, "day_numbers"))
+    store._time_order = GrowableArray.from_array(_load_array(directory, "time_order"))
+    store._time_days = GrowableArray.from_array(_load_array(directory, "time_days"))
+    store.vectors = GrowableArray.from_array(_load_array(directory, "vectors"))
+    
+    context_terms = _load_strings(directory, "context_terms")
+    store.embedder._context_rows = PositionMap(_load_key_index(directory, "context_index", context_terms.__getitem__))
+    store.embedder._contexts = GrowableArray.from_array(_load_array(directory, "contexts"))
+    
+    for field, values in manifest["partition_values"].items():
+        offsets = _load_array(directory, f"partition_{field}_offsets")
+        positions = _load_array(directory, f"partition_{field}_values")
+        store.partitions[field] = {
+            value: GrowableArray.from_array(positions[offsets[i]:offsets[i + 1]])
+            for i, value in enumerate(values)
+        }
+    
+    store.ann_index = IVFIndex.from_arrays({
+        name: _load_array(directory, f"ann_{name}") for name in IVFIndex.ARRAY_NAMES
+    })
+    store.ann_index.nprobe = store.ann_nprobe
+    store._dense = manifest["dense"]
+    store.facets = FacetCounts.from_dict(_load_json(directory, "facets.json"))
+    store.snapshot_metadata = manifest["metadata"]
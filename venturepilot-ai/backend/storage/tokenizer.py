@@ -0,0 +1,127 @@
+"""
+Text tokenizer shared by ingestion and queries.
+
+Text is lowercased and split with one precompiled pattern into alphanumeric
+tokens. Tokens containing digits are kept whole, so "80-IAC", "UPI 2.0" and
+"$375M" stay searchable as "80-iac", "2.0" and "375m"; other hyphenated or
+dotted words are split into their parts. Stop words are dropped and the
+remaining words are reduced with a light plural stemmer ("policies" ->
+"policy", "investors" -> "investor").
+
+Each distinct raw word is normalized once and cached, so re-tokenizing a
+corpus or a stream of queries mostly costs one regex pass and dict lookups.
+"""
+from typing import Iterable, Optional
+import re
+
+
+DEFAULT_STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because
+been before being below between both but by can could did do does doing down
+during each few for from further had has have having he her here hers herself
+him himself his how i if in into is it its itself just me more most my myself
+no nor not now of off on once only or other our ours ourselves out over own
+same she should so some such than that the their theirs them themselves then
+there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours
+yourself yourselves
+startup stage
+""".split())
+
+
+class Tokenizer:
+    """
+    Lowercasing tokenizer with stop-word removal and light stemming.
+    
+    The same instance must tokenize documents and queries, so the store
+    keeps it (and persists its settings in snapshots).
+    """
+    
+    WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+|,[0-9]{3})*")
+    SPLIT_PATTERN = re.compile(r"[.\-]")
+    DIGIT_PATTERN = re.compile(r"[0-9]")
+    
+    # Words ending in -s that are not plurals
+    STEM_EXCEPTIONS = frozenset(["news", "series", "saas", "always", "perhaps", "whereas"])
+    
+    def __init__(
+        self,
+        stop_words: Optional[Iterable[str]] = None,
+        min_length: int = 2,
+        stem: bool = True,
+        cache_size: int = 200_000
+    ):
+        """
+        Initialize the tokenizer.
+        
+        Args:
+            stop_words: Words to drop (defaults to DEFAULT_STOP_WORDS)
+            min_length: Minimum length of tokens without digits
+            stem: Reduce plural word forms to their singular
+            cache_size: Maximum number of cached raw words
+        """
+        self.stop_words = frozenset(DEFAULT_STOP_WORDS if stop_words is None else stop_words)
+        self.min_length = min_length
+        self.stem = stem
+        self.cache_size = cache_size
+        self._cache = {}  # raw word -> tuple of tokens
+    
+    def tokenize(self, text: str) -> list[str]:
+        """Split text into normalized tokens, in text order."""
+        tokens = []
+        cache = self._cache
+        for word in self.WORD_PATTERN.findall(text.lower()):
+            normalized = cache.get(word)
+            if normalized is None:
+                normalized = self._normalize(word)
+                if len(cache) < self.cache_size:
+                    cache[word] = normalized
+            tokens.extend(normalized)
+        return tokens
+    
+    def _normalize(self, word: str) -> tuple:
+        """Tokens of one raw word matched by WORD_PATTERN."""
+        if self.DIGIT_PATTERN.search(word):
+            # Numbers and codes stay whole; "1,000" and "1000" match
+            return (word.replace(",", ""),)
+        
+        tokens = []
+        for part in self.SPLIT_PATTERN.split(word):
+            if len(part) < self.min_length or part in self.stop_words:
+                continue
+            if self.stem:
+                part = stem_plural(part, self.STEM_EXCEPTIONS)
+                if part in self.stop_words:
+                    continue
+            tokens.append(part)
+        return tuple(tokens)
+    
+    def settings(self) -> dict:
+        """Constructor arguments, for snapshots."""
+        return {
+            "stop_words": sorted(self.stop_words),
+            "min_length": self.min_length,
+            "stem": self.stem
+        }
+
+
+def stem_plural(word: str, exceptions: frozenset = frozenset()) -> str:
+    """
+    Reduce an English plural to its singular (Harman's S-stemmer).
+    
+    "policies" -> "policy", "schemes" -> "scheme", "investors" -> "investor";
+    -es after a sibilant is dropped as well ("taxes" -> "tax"). Documents and
+    queries go through the same rules, so the stems only need to be
+    consistent, not proper words.
+    """
+    if len(word) <= 3 or word in exceptions:
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "zes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if word.endswith("s") and not word.endswith(("us", "ss", "is")):
+        return word[:-1]
+    return word
@@ -0,0 +1,120 @@
+"""
+Bounded top-k selection with deterministic tie-breaking.
+
+Results are ordered by score (highest first), then by day number (newest
+first), then by document position (oldest first), so equal scores always
+come back in the same order.
+
+Both selectors take an optional `after` cursor, the (score, day number,
+position) of the last result of the previous page: only entries ranked
+strictly below it are selected, so later pages never re-sort earlier ones.
+"""
+from typing import Iterable, Optional
+import heapq
+
+import numpy as np
+
+
+def top_k(
+    scores: np.ndarray,
+    k: int,
+    positions: Optional[np.ndarray] = None,
+    day_numbers: Optional[np.ndarray] = None,
+    after: Optional[tuple] = None
+) -> np.ndarray:
+    """
+    Indices of the k best entries of `scores`, best first.
+    
+    `np.partition` finds the k-th best score in O(n). Only the (fewer than
+    k) entries scoring strictly more are sorted; the remaining slots go to
+    the entries tied with the k-th score, chosen by their tie-break key with
+    another partition. Low-cardinality scores, where most entries tie, thus
+    stay O(n) instead of sorting every tie.
+    
+    Args:
+        scores: Score of each entry
+        k: Number of entries to select
+        positions: Document position of each entry (defaults to its index)
+        day_numbers: Day number of every document position (None skips
+            the recency tie-break)
+        after: Only select entries ranked below this (score, day, position)
+    
+    Returns:
+        Indices into `scores`
+    """
+    if after is not None:
+        remaining = np.flatnonzero(ranked_after(scores, positions, day_numbers, after))
+        remaining_positions = remaining if positions is None else positions[remaining]
+        return remaining[top_k(scores[remaining], k, remaining_positions, day_numbers)]
+    
+    count = len(scores)
+    if k <= 0 or count == 0:
+        return np.zeros(0, dtype=np.int64)
+    
+    if k >= count:
+        candidates = np.arange(count)
+        return candidates[np.lexsort((_tie_keys(candidates, positions, day_numbers), -scores))]
+    
+    kth_score = np.partition(scores, count - k)[count - k]
+    above = np.flatnonzero(scores > kth_score)
+    above = above[np.lexsort((_tie_keys(above, positions, day_numbers), -scores[above]))]
+    
+    ties = np.flatnonzero(scores == kth_score)
+    tie_keys = _tie_keys(ties, positions, day_numbers)
+    needed = k - len(above)
+    if needed < len(ties):
+        chosen = np.argpartition(tie_keys, needed - 1)[:needed]
+        ties, tie_keys = ties[chosen], tie_keys[chosen]
+    return np.concatenate([above, ties[np.argsort(tie_keys, kind="stable")]])
+
+
+def _tie_keys(
+    indices: np.ndarray,
+    positions: Optional[np.ndarray],
+    day_numbers: Optional[np.ndarray]
+) -> np.ndarray:
+    """
+    One int64 sort key per entry for ordering equal scores: newer day first,
+    then lower position (day numbers fit in 22 bits, positions in 32).
+    """
+    entry_positions = (indices if positions is None else positions[indices]).astype(np.int64, copy=False)
+    if day_numbers is None:
+        return entry_positions
+    keys = day_numbers[entry_positions].astype(np.int64)
+    keys <<= 32
+    return np.subtract(entry_positions, keys, out=keys)
+
+
+def ranked_after(
+    scores: np.ndarray,
+    positions: Optional[np.ndarray],
+    day_numbers: Optional[np.ndarray],
+    after: tuple
+) -> np.ndarray:
+    """Mask of the entries ranked strictly below an (score, day, position) cursor."""
+    score, day, position = after
+    if positions is None:
+        positions = np.arange(len(scores))
+    days = day_numbers[positions] if day_numbers is not None else np.zeros(len(scores), dtype=np.int64)
+    later = (days < day) | ((days == day) & (positions > position))
+    return (scores < score) | ((scores == score) & later)
+
+
+def _item_key(item: tuple) -> tuple:
+    return (-item[1], -item[2], item[0])
+
+
+def top_k_items(items: Iterable[tuple], k: int, after: Optional[tuple] = None) -> list[tuple]:
+    """
+    The k best (position, score, day_number) tuples, best first.
+    
+    Pure-Python counterpart of `top_k` for results that are already
+    materialized (e.g. merged result lists): a bounded heap keeps memory at
+    O(k) instead of sorting every item. Any comparable value (such as a
+    document id) can stand in for the position.
+    """
+    if after is not None:
+        score, day, position = after
+        cursor_key = (-score, -day, position)
+        items = (item for item in items if _item_key(item) > cursor_key)
+    return heapq.nsmallest(k, items, key=_item_key)
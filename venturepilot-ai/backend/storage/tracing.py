@@ -0,0 +1,117 @@
+"""
+Per-stage timing of retrieval.
+
+A trace collects spans, one per stage of a search (tokenize, filter, score,
+sort, format, ...), timed with the monotonic `time.perf_counter` clock and
+annotated with how many candidates went in and how many results came out.
+The active trace is held in a context variable, so the store and retriever
+record spans without passing a trace through every call, and concurrent
+requests in other threads or tasks never see each other's spans. Without
+an active trace, a span costs one context variable lookup.
+
+Span durations exclude the spans nested in them (e.g. "score" excludes
+the "sort" of its top-k selection), so the spans of a trace add up to the
+traced time instead of counting it twice.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import time
+
+
+class Span:
+    """One timed stage; `candidates` and `results` may be updated while it is open."""
+    
+    __slots__ = ("stage", "candidates", "results", "duration_ms", "_nested_seconds")
+    
+    def __init__(self, stage: str, candidates: int = 0, results: int = 0):
+        self.stage = stage
+        self.candidates = candidates
+        self.results = results
+        self.duration_ms = 0.0
+        self._nested_seconds = 0.0
+    
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "duration_ms": round(self.duration_ms, 3),
+            "candidates": self.candidates,
+            "results": self.results
+        }
+
+
+class Trace:
+    """Spans recorded while the trace was active, in the order they ended."""
+    
+    def __init__(self):
+        self.spans = []
+        self._open = []  # stack of spans being timed
+    
+    def to_list(self, start: int = 0) -> list[dict]:
+        """The spans from index `start` on, as JSON-serializable dicts."""
+        return [span.to_dict() for span in self.spans[start:]]
+    
+    def stages(self) -> dict:
+        """Totals per stage (see `stage_totals`)."""
+        return stage_totals(self.spans)
+
+
+def stage_totals(spans: list[Span]) -> dict:
+    """Totals per stage: {stage: {"duration_ms", "spans", "candidates", "results"}}."""
+    totals = {}
+    for span in spans:
+        total = totals.setdefault(span.stage, {"duration_ms": 0.0, "spans": 0, "candidates": 0, "results": 0})
+        total["duration_ms"] += span.duration_ms
+        total["spans"] += 1
+        total["candidates"] += span.candidates
+        total["results"] += span.results
+    for total in totals.values():
+        total["duration_ms"] = round(total["duration_ms"], 3)
+    return totals
+
+
+_active_trace: ContextVar[Optional[Trace]] = ContextVar("retrieval_trace", default=None)
+
+# Stands in for spans when no trace is active; writes to it are never read
+_UNTRACED = Span("untraced")
+
+
+@contextmanager
+def trace():
+    """Record the spans of everything run inside the block into a new Trace."""
+    active = Trace()
+    token = _active_trace.set(active)
+    try:
+        yield active
+    finally:
+        _active_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str, candidates: int = 0, results: int = 0):
+    """Time a stage of the active trace (if any); yields the Span to annotate."""
+    active = _active_trace.get()
+    if active is None:
+        yield _UNTRACED
+        return
+    
+    current = Span(stage, candidates, results)
+    active._open.append(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        elapsed = time.perf_counter() - start
+        active._open.pop()
+        current.duration_ms = (elapsed - current._nested_seconds) * 1000
+        if active._open:
+            active._open[-1]._nested_seconds += elapsed
+        active.spans.append(current)
+
+
+def current_span() -> Span:
+    """Innermost open span of the active trace, to annotate from nested code."""
+    active = _active_trace.get()
+    if active is None or not active._open:
+        return _UNTRACED
+    return active._open[-1]
@@ -1,18 +1,347 @@
-from typing import Optional
-from datetime import datetime, timedelta
-import uuid
-import re
+from collections import OrderedDict
+from typing import Optional, Union
+from datetime import date, datetime, timedelta
+import hashlib
+import itertools
+import math
+import threading
+
+import numpy as np
+
+from .buffers import GrowableArray, StringList, gather_ranges
+from .embeddings import HashedEmbedder
+from .ann_index import IVFIndex
+from .postings import PostingIndex
+from .document_table import DocumentTable
+from .id_map import PositionMap
+from .topk import top_k, top_k_items
+from .tokenizer import Tokenizer
+from .facets import FacetCounts
+from .expansion import QueryExpansion
+from .pagination import encode_cursor, decode_cursor
+from .positional import query_phrases, contains_phrase, proximity_score, posting_indexes, posting_offsets
+from . import snapshot
+from . import tracing
+
+
+SEARCH_MODES = ("keyword", "bm25", "dense", "ann", "hybrid")
+
+# Write generations, unique across all stores in the process
+_generations = itertools.count(1)
+
+# `after` value asking the scorers to rank every candidate (see `search_page`)
+RANK_ALL = object()
+
+# Fields that make up a document's content hash
+CONTENT_FIELDS = ("text", "title", "category", "timestamp", "geography", "source")
+
+
+def to_day_number(value: Union[str, date, None]) -> int:
+    """Convert an ISO date string, date or datetime to a proleptic day number.
+    
+    Only the date part is used. Unparseable values map to 0 (oldest).
+    """
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def content_hash(doc: dict) -> int:
+    """Stable 64-bit hash of a document's content fields (and passage span)."""
+    content = "\x1f".join(str(doc.get(field, "")) for field in CONTENT_FIELDS)
+    if doc.get("parent_id"):
+        content += f"\x1f{doc['parent_id']}\x1f{doc.get('passage_start', 0)}"
+    digest = hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def document_key(doc: dict) -> str:
+    """
+    Stable id of a document: the caller-supplied "id" if present, otherwise
+    the hex content hash, so re-ingesting the same file yields the same ids.
+    """
+    if doc.get("id") is not None:
+        return str(doc["id"])
+    return f"{content_hash(doc):016x}"
+
+
+def parent_key(doc: dict) -> str:
+    """Id of the document a stored record belongs to: its "parent_id" for passages, else its own id."""
+    if doc.get("parent_id"):
+        return str(doc["parent_id"])
+    return document_key(doc)
+
+
+def search_sorted(values: np.ndarray, value: int, side: str = "left") -> int:
+    """`np.searchsorted` of an integer in a sorted integer array, in O(log n).
+    
+    The value is clamped to and passed in the array's dtype: a Python int
+    would make NumPy cast the whole array before searching it.
+    """
+    info = np.iinfo(values.dtype)
+    return int(np.searchsorted(values, values.dtype.type(min(max(value, info.min), info.max)), side=side))
+
+
+def time_keys(days: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Sort keys of (day, position) pairs: int64s that order like the pairs."""
+    return (days.astype(np.int64) << 32) | positions.astype(np.int64)
+
+
+def split_time_keys(keys: np.ndarray) -> tuple:
+    """(positions, days) of `time_keys` values, as int32 arrays."""
+    return (keys & 0xFFFFFFFF).astype(np.int32), (keys >> 32).astype(np.int32)
+
+
+def merge_sorted(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Merge two ascending arrays with one binary search per element of `right`."""
+    indexes = np.searchsorted(left, right) + np.arange(len(right))
+    merged = np.empty(len(left) + len(right), dtype=left.dtype)
+    merged[indexes] = right
+    rest = np.ones(len(merged), dtype=bool)
+    rest[indexes] = False
+    merged[rest] = left
+    return merged
+
+
+def fuse_rankings(rankings: list[list], rrf_k: int) -> dict:
+    """Reciprocal rank fusion: item -> sum over best-first rankings of 1 / (rrf_k + rank)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return fused
+
+
+class IndexGeneration:
+    """
+    Read-only view of a VectorStore as of one published write.
+    
+    Searches take the current generation once and only look at positions
+    below `num_docs`. Append-only buffers are shared with the writer (their
+    published views never change), and so are the deletion epochs: a
+    position is alive in this generation while its deletion epoch is later
+    than `epoch`, and writers stamp deletes with the epoch that will
+    publish them. Document frequencies are frozen copy-on-write chunks, so
+    publishing copies nothing in proportion to the corpus.
+    
+    The position-addressed structures are referenced as published, so a
+    search keeps reading them even if `VectorStore.compact` replaces them;
+    the id maps only ever grow (see `storage.id_map`), and queries are
+    embedded with the embedder's context vectors as published.
+    """
+    
+    __slots__ = (
+        "generation", "epoch", "num_docs", "num_alive", "total_length",
+        "deleted_at", "doc_freqs", "doc_lengths", "day_numbers", "vectors",
+        "time_runs", "facets", "expansion", "documents", "doc_keys",
+        "positions_by_key", "positions_by_parent", "doc_term_ids",
+        "doc_term_offsets", "postings", "partitions", "ann_index", "contexts"
+    )
+    
+    def __init__(self, store: "VectorStore"):
+        self.generation = next(_generations)
+        self.epoch = store._epoch
+        self.num_docs = len(store.documents)
+        self.num_alive = store.num_alive
+        self.total_length = store.total_length
+        self.deleted_at = store.deleted_at.view()
+        self.doc_freqs = store.postings.doc_freqs.freeze()
+        self.doc_lengths = store.doc_lengths.view()
+        self.day_numbers = store.day_numbers.view()
+        self.vectors = store.vectors.view()
+        self.documents = store.documents
+        self.doc_keys = store.doc_keys
+        self.positions_by_key = store._positions_by_key
+        self.positions_by_parent = store._positions_by_parent
+        self.doc_term_ids = store.doc_term_ids.view()
+        self.doc_term_offsets = store.doc_term_offsets.view()
+        self.postings = store.postings
+        self.partitions = store.partitions
+        self.ann_index = store.ann_index
+        self.contexts = store.embedder.publish()
+        # Sorted runs of the time index: (positions, their days)
+        self.time_runs = ((store._time_order.view(), store._time_days.view()), store._time_delta)
+        self.facets = store.facets.copy()
+        self.expansion = store.expansion
+    
+    def has_deletions(self) -> bool:
+        """Whether any visible position is a tombstone."""
+        return self.num_alive < self.num_docs
+    
+    def visible(self, positions: np.ndarray) -> np.ndarray:
+        """Cut an ascending position array to the positions in this generation."""
+        return positions[:np.searchsorted(positions, self.num_docs)]
+    
+    def is_alive(self, positions):
+        """Whether positions (an array, or one position below `num_docs`) are alive in this generation."""
+        return self.deleted_at[positions] > self.epoch
+    
+    def live(self, positions: list[int]) -> list[int]:
+        """The positions that are alive in this generation."""
+        return [position for position in positions if position < self.num_docs and self.is_alive(position)]
 
 
 class VectorStore:
     """Simple in-memory vector storage for document storage and retrieval.
-    Uses keyword matching for search (can be upgraded to embeddings later).
+    
+    Search modes:
+    - "keyword": keyword overlap ratio
+    - "bm25": Okapi BM25 over term statistics collected at ingest
+    - "dense": cosine similarity of offline hashed embeddings
+    - "ann": approximate dense search through an IVF index
+    - "hybrid": BM25 and ANN rankings fused with reciprocal rank fusion
+    
+    BM25 (also within hybrid) re-ranks its best candidates by how close
+    together the query terms occur. Quoted phrases in a query, as in
+    `"digital lending" guidelines`, restrict every mode to documents
+    containing the phrase; both use the token offsets stored in postings.
+    
+    Documents have stable string ids (see `document_key`). Passages from
+    `rag.chunking` are stored as records of their own but are written,
+    deleted and fetched by their parent's id as one document. Deleting or
+    replacing a document tombstones its positions: every index is updated
+    incrementally and dead positions are masked out at query time. Once
+    tombstones make up a large share of the positions, the store is
+    compacted (see `compact`).
+    
+    Writes are serialized by a lock and end by publishing a new
+    `IndexGeneration`, swapped in with a single assignment. Searches never
+    take the lock: they read one generation from start to finish, so they
+    can run on any number of threads while documents are being ingested.
     """
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    # BM25 parameters
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    
+    # Reciprocal rank fusion: score = sum(1 / (RRF_K + rank)); each ranking
+    # contributes max(k * HYBRID_DEPTH_FACTOR, HYBRID_MIN_DEPTH) candidates
+    RRF_K = 60
+    HYBRID_DEPTH_FACTOR = 4
+    HYBRID_MIN_DEPTH = 20
+    
+    # Term proximity: the best max(k * PROXIMITY_DEPTH_FACTOR,
+    # PROXIMITY_MIN_DEPTH) BM25 candidates gain PROXIMITY_WEIGHT times the
+    # proximity score of query terms at most PROXIMITY_WINDOW tokens apart
+    PROXIMITY_WEIGHT = 1.0
+    PROXIMITY_WINDOW = 5
+    PROXIMITY_DEPTH_FACTOR = 4
+    PROXIMITY_MIN_DEPTH = 50
+    
+    # Metadata fields with a partition index for filter push-down
+    PARTITION_FIELDS = ("category", "geography")
+    
+    # Modes that score document embeddings
+    DENSE_MODES = ("dense", "ann", "hybrid")
+    
+    # Full rankings of the most recently paged queries kept for later pages
+    PAGE_RANKINGS = 16
+    
+    # Deletion epoch of positions that are not deleted
+    NOT_DELETED = np.iinfo(np.uint32).max
+    
+    # Out-of-order timestamps go to a sorted delta run of the time index,
+    # merged into the main run once it outgrows max(TIME_DELTA_MIN, sqrt(n))
+    TIME_DELTA_MIN = 4096
+    
+    # Writes that leave at least COMPACT_MIN_DEAD tombstoned positions, and
+    # at least COMPACT_DEAD_FRACTION of all positions, compact the store
+    COMPACT_DEAD_FRACTION = 0.25
+    COMPACT_MIN_DEAD = 1024
+    
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        mode: str = "keyword",
+        embedding_dim: int = 128,
+        ann_nprobe: int = 8,
+        tokenizer: Optional[Tokenizer] = None
+    ):
         """Initialize the vector store."""
-        self.documents = []  # List of document dicts
-        self.doc_index = {}  # id -> document mapping
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        
+        self.mode = mode
+        self.tokenizer = tokenizer or Tokenizer()
+        self.persist_directory = persist_directory
+        self.ann_nprobe = ann_nprobe
+        self.snapshot_metadata = {}
+        self.documents = DocumentTable()  # columnar documents, addressed by position
+        self.postings = PostingIndex()  # term id -> PostingList over document positions
+        
+        # Stable ids: key per position, positions per key, and positions per
+        # parent document (a whole document is its own parent); the maps keep
+        # dead positions until compaction, callers filter them out
+        self.doc_keys = StringList()
+        self._positions_by_key = PositionMap()
+        self._positions_by_parent = PositionMap()
+        self.content_hashes = GrowableArray(np.uint64)
+        self.num_alive = 0
+        
+        # Deletion epoch per position (NOT_DELETED while alive), and the
+        # epoch of the last published generation
+        self.deleted_at = GrowableArray(np.uint32)
+        self._epoch = 0
+        
+        # Unique term ids of each document (CSR: offsets into a flat buffer)
+        self.doc_term_ids = GrowableArray(np.int32, capacity=1024)
+        self.doc_term_offsets = GrowableArray(np.int64)
+        self.doc_term_offsets.append(0)
+        
+        # Corpus statistics for BM25, maintained incrementally
+        self.doc_lengths = GrowableArray(np.float32)
+        self.total_length = 0
+        
+        # Dense embeddings, one contiguous float32 row per document. They,
+        # the co-occurrence contexts and the ANN index are only maintained
+        # once a dense mode is used (see `_enable_dense`)
+        self.embedder = HashedEmbedder(dim=embedding_dim)
+        self.vectors = GrowableArray(np.float32, width=embedding_dim)
+        self.ann_index = IVFIndex(dim=embedding_dim, nprobe=ann_nprobe)
+        self._dense = mode in self.DENSE_MODES
+        
+        # Partition index: field -> value -> sorted positions
+        self.partitions = {field: {} for field in self.PARTITION_FIELDS}
+        
+        # Time index: day number per position, plus positions sorted by
+        # (day, position) and their day numbers in that order (for binary
+        # searches), in a main run and a small delta run
+        self.day_numbers = GrowableArray(np.int32)
+        self._time_order = GrowableArray(np.int32)
+        self._time_days = GrowableArray(np.int32)
+        self._time_delta = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        
+        # Document counts per category, geography, source and month
+        self.facets = FacetCounts()
+        
+        # Weighted related terms added to BM25 queries (see `set_query_expansion`)
+        self.expansion = None
+        
+        # Writers hold the lock; readers use the published generation
+        self._write_lock = threading.Lock()
+        self._current = None
+        self._publish()
+        
+        # Rankings read by `search_page` after its first page (LRU)
+        self._page_rankings = OrderedDict()
+        self._page_lock = threading.Lock()
+    
+    @property
+    def generation(self) -> int:
+        """Id of the published generation; changes on every write."""
+        return self._current.generation
+    
+    def _publish(self) -> None:
+        """Swap in a new read-only generation reflecting every write so far."""
+        self._epoch += 1
+        self._current = IndexGeneration(self)
     
     def add_documents(self, documents: list[dict]) -> None:
         """
@@ -24,7 +353,117 @@ class VectorStore:
         - timestamp: ISO_DATE
         - geography: str
         - source: str
+        
+        An optional "id" is used as the document's stable id; otherwise the
+        id is a hash of its content. Documents whose id is already stored
+        are skipped, so re-ingesting a file does not create duplicates.
+        
+        Passages from `rag.chunking` also carry "parent_id" and
+        "passage_start" (character offset in the parent's text), which are
+        returned with their search results.
         """
+        valid_documents = self._validate_documents(documents)
+        if not valid_documents:
+            print("No valid documents to add")
+            return
+        
+        with self._write_lock:
+            new_documents = {}
+            for doc in valid_documents:
+                key = document_key(doc)
+                if not self._live(self._positions_by_key.get(key)) and key not in new_documents:
+                    new_documents[key] = doc
+            
+            if new_documents:
+                self._append_documents(new_documents)
+                self._publish()
+        
+        duplicates = len(valid_documents) - len(new_documents)
+        suffix = f" (skipped {duplicates} duplicates)" if duplicates else ""
+        print(f"Added {len(new_documents)} documents to vector store{suffix}")
+    
+    def upsert_documents(self, documents: list[dict]) -> dict:
+        """
+        Insert new documents and replace changed ones, matched by stable id.
+        
+        Unchanged documents are left alone. A changed document is deleted
+        and re-added, keeping its id. The records given for a parent id
+        (its passages, or the whole document) are its complete new version:
+        stored passages of that parent missing from the batch, e.g. the
+        trailing passages of a document that got shorter, are deleted.
+        
+        Args:
+            documents: Documents in the `add_documents` format
+        
+        Returns:
+            Counts of added, updated and unchanged records, and of stale
+            passages removed
+        """
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        valid_documents = self._validate_documents(documents)
+        with self._write_lock:
+            changed = {}
+            keys_by_parent = {}
+            for doc in valid_documents:
+                key = document_key(doc)
+                keys_by_parent.setdefault(parent_key(doc), set()).add(key)
+                if key in changed:
+                    changed[key] = doc  # the last version of a key in the batch wins
+                    continue
+                live = self._live(self._positions_by_key.get(key))
+                if live and int(self.content_hashes.view()[live[0]]) == content_hash(doc):
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated" if live else "added"] += 1
+                if live:
+                    self._delete_position(live[0])
+                changed[key] = doc
+            
+            for parent, keys in keys_by_parent.items():
+                for position in self._live(self._positions_by_parent.get(parent)):
+                    if self.doc_keys[position] not in keys:
+                        self._delete_position(position)
+                        counts["removed"] += 1
+            
+            # Old and new versions become visible together
+            if changed:
+                self._append_documents(changed)
+            if changed or counts["removed"]:
+                self._compact_if_needed()
+                self._publish()
+        print(f"Upserted documents: {counts}")
+        return counts
+    
+    def delete_documents(self, doc_ids: list[str]) -> int:
+        """
+        Delete documents by stable id.
+        
+        A parent id deletes every passage of the document; a passage id
+        deletes only that passage.
+        
+        Args:
+            doc_ids: Ids of the documents to delete (unknown ids are ignored)
+        
+        Returns:
+            Number of documents deleted
+        """
+        deleted = 0
+        with self._write_lock:
+            for doc_id in doc_ids:
+                positions = self._live(self._positions_by_parent.get(str(doc_id)))
+                if not positions:
+                    positions = self._live(self._positions_by_key.get(str(doc_id)))
+                for position in positions:
+                    self._delete_position(position)
+                deleted += bool(positions)
+            if deleted:
+                self._compact_if_needed()
+                self._publish()
+        print(f"Deleted {deleted} documents from vector store")
+        return deleted
+    
+    def _validate_documents(self, documents: list[dict]) -> list[dict]:
+        """Documents with every required field and a valid category."""
         required_fields = ["text", "category", "timestamp", "geography", "source"]
         
         valid_documents = []
@@ -43,82 +482,775 @@ class VectorStore:
             
             valid_documents.append(doc)
         
-        if not valid_documents:
-            print("No valid documents to add")
-            return
+        return valid_documents
+    
+    def _append_documents(self, documents: dict) -> None:
+        """Append documents (stable id -> document) to every index.
         
-        # Add documents to in-memory store
-        for doc in valid_documents:
-            doc_id = str(uuid.uuid4())
-            doc_entry = {
-                "id": doc_id,
-                "text": doc["text"],
-                "category": doc["category"],
-                "timestamp": doc["timestamp"],
-                "geography": doc["geography"],
-                "source": doc["source"],
-                "title": doc.get("title", ""),
-                "keywords": self._extract_keywords(doc["text"])
-            }
-            self.documents.append(doc_entry)
-            self.doc_index[doc_id] = doc_entry
+        Per-document values are collected and appended once per batch, and
+        postings once per term. Embeddings and contexts are only computed
+        while dense modes are enabled.
         
-        print(f"Added {len(valid_documents)} documents to vector store")
+        Callers hold the write lock and publish afterwards.
+        """
+        first_position = len(self.documents)
+        token_lists = []
+        postings = {}  # term id -> (positions, token offsets in each)
+        term_ids = []
+        term_counts = []
+        for key, doc in documents.items():
+            position = self.documents.append(doc)
+            tokens = self._tokenize(doc["text"])
+            token_lists.append(tokens)
+            
+            self.doc_keys.append(key)
+            self._positions_by_key.add(key, position)
+            self._positions_by_parent.add(parent_key(doc), position)
+            
+            # Update partition index
+            for field, partition in self.partitions.items():
+                positions = partition.get(doc[field])
+                if positions is None:
+                    positions = partition[doc[field]] = GrowableArray(np.int32)
+                positions.append(position)
+            
+            # Passages repeat their document's metadata; count it once
+            if not doc.get("passage_start"):
+                self.facets.add(doc)
+            
+            # Collect postings (with token offsets) per term
+            token_offsets = {}
+            for offset, term in enumerate(tokens):
+                token_offsets.setdefault(term, []).append(offset)
+            for term, offsets in token_offsets.items():
+                term_id = self.postings.term_id(term, create=True)
+                entry = postings.get(term_id)
+                if entry is None:
+                    entry = postings[term_id] = ([], [])
+                entry[0].append(position)
+                entry[1].append(offsets)
+                term_ids.append(term_id)
+            term_counts.append(len(token_offsets))
+        
+        count = len(token_lists)
+        lengths = [len(tokens) for tokens in token_lists]
+        self.content_hashes.extend([content_hash(doc) for doc in documents.values()])
+        self.deleted_at.extend(np.full(count, self.NOT_DELETED, dtype=np.uint32))
+        self.num_alive += count
+        self.day_numbers.extend([to_day_number(doc["timestamp"]) for doc in documents.values()])
+        
+        # Update inverted index and term statistics
+        self.postings.add_postings(postings)
+        self.doc_term_ids.extend(term_ids)
+        self.doc_term_offsets.extend(len(self.doc_term_ids) - len(term_ids) + np.cumsum(term_counts, dtype=np.int64))
+        self.doc_lengths.extend(lengths)
+        self.total_length += sum(lengths)
+        
+        # Update embeddings
+        new_positions = np.arange(first_position, len(self.documents))
+        if self._dense:
+            self.vectors.extend(self.embedder.embed_documents(token_lists))
+            self.embedder.observe_documents(token_lists)
+            self.ann_index.add(new_positions, self.vectors.view())
+        self._extend_time_order(new_positions)
+    
+    def _enable_dense(self) -> None:
+        """
+        Start maintaining embeddings, co-occurrence contexts and the ANN
+        index, computing them for the documents indexed so far.
+        
+        Called before the first search in a dense mode. Contexts count live
+        documents only, like after deletions.
+        """
+        with self._write_lock:
+            if self._dense:
+                return
+            texts = [self.documents.text(position) for position in range(len(self.documents))]
+            token_lists = [self._tokenize(text) for text in texts]
+            self.vectors.extend(self.embedder.embed_documents(token_lists))
+            deleted_at = self.deleted_at.view()
+            self.embedder.observe_documents([
+                tokens for tokens, deleted in zip(token_lists, deleted_at) if deleted == self.NOT_DELETED
+            ])
+            self.ann_index.add(np.arange(len(token_lists)), self.vectors.view())
+            self._dense = True
+            self._publish()
+    
+    def _delete_position(self, position: int) -> None:
+        """
+        Tombstone a document position.
+        
+        Term and length statistics and the co-occurrence contexts are
+        updated right away; postings, partitions, the time index, the id
+        maps and the ANN index keep the position and rely on the deletion
+        epochs at query time until the next compaction. Callers hold the
+        write lock and publish afterwards.
+        """
+        offsets = self.doc_term_offsets.view()
+        term_ids = self.doc_term_ids.view()[offsets[position]:offsets[position + 1]]
+        self.postings.remove_document(term_ids)
+        self.total_length -= int(self.doc_lengths.view()[position])
+        
+        # The stored term ids give the document's terms without re-tokenizing
+        if self._dense:
+            self.embedder.forget([self.postings.term(term_id) for term_id in term_ids.tolist()])
+        
+        if not self.documents.passage_starts.view()[position]:
+            columns = self.documents.columns
+            self.facets.remove({field: columns[field][position] for field in columns})
+        
+        # Published generations keep seeing the position until the next one
+        self.deleted_at.make_writable()
+        self.deleted_at.view()[position] = self._epoch + 1
+        self.num_alive -= 1
+    
+    def _live(self, positions: list[int]) -> list[int]:
+        """The positions that are alive as of the last write; for writers."""
+        deleted_at = self.deleted_at.view()
+        return [position for position in positions if deleted_at[position] == self.NOT_DELETED]
+    
+    def compact(self) -> int:
+        """
+        Rebuild every index without tombstoned positions.
+        
+        Writes do this on their own once tombstones pass
+        `COMPACT_DEAD_FRACTION` of the positions. Live documents keep their
+        order but are renumbered, so page cursors taken before a compaction
+        may skip or repeat results.
+        
+        Returns:
+            Number of tombstoned positions dropped
+        """
+        with self._write_lock:
+            dropped = len(self.documents) - self.num_alive
+            if dropped:
+                self._compact()
+                self._publish()
+        if dropped:
+            print(f"Compacted vector store: dropped {dropped} deleted positions")
+        return dropped
+    
+    def _compact_if_needed(self) -> None:
+        """Compact once tombstones pass the thresholds; callers hold the write lock and publish afterwards."""
+        dead = len(self.documents) - self.num_alive
+        if dead >= self.COMPACT_MIN_DEAD and dead >= self.COMPACT_DEAD_FRACTION * len(self.documents):
+            self._compact()
+    
+    def _compact(self) -> None:
+        """
+        Replace every position-addressed structure with a copy holding only
+        the live positions, renumbered in order.
+        
+        The new structures are built aside and swapped in by the next
+        `_publish`; generations already published keep the old ones. Term
+        ids, document frequencies, co-occurrence contexts and facets only
+        ever counted live documents, so they are kept as they are.
+        """
+        live = np.flatnonzero(self.deleted_at.view() == self.NOT_DELETED)
+        remap = np.full(len(self.documents), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        
+        def renumber(positions: np.ndarray) -> np.ndarray:
+            positions = remap[positions]
+            return positions[positions >= 0].astype(np.int32)
+        
+        term_offsets = self.doc_term_offsets.view()
+        starts, ends = term_offsets[live], term_offsets[live + 1]
+        doc_term_offsets = np.zeros(len(live) + 1, dtype=np.int64)
+        doc_term_offsets[1:] = np.cumsum(ends - starts)
+        
+        partitions = {field: {} for field in self.PARTITION_FIELDS}
+        for field, partition in self.partitions.items():
+            for value, positions in partition.items():
+                positions = renumber(positions.view())
+                if len(positions):
+                    partitions[field][value] = GrowableArray.from_array(positions)
+        
+        delta_order, delta_days = self._time_delta
+        keys = merge_sorted(
+            time_keys(self._time_days.view(), self._time_order.view()), time_keys(delta_days, delta_order)
+        )
+        order, days = split_time_keys(keys)
+        self._time_order = GrowableArray.from_array(renumber(order))
+        self._time_days = GrowableArray.from_array(days[remap[order] >= 0])
+        self._time_delta = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        
+        self.documents = self.documents.take(live)
+        self.doc_keys = self.doc_keys.take(live)
+        self.content_hashes = GrowableArray.from_array(self.content_hashes.view()[live])
+        self.deleted_at = GrowableArray.from_array(np.full(len(live), self.NOT_DELETED, dtype=np.uint32))
+        self.doc_term_ids = GrowableArray.from_array(gather_ranges(self.doc_term_ids.view(), starts, ends))
+        self.doc_term_offsets = GrowableArray.from_array(doc_term_offsets)
+        self.doc_lengths = GrowableArray.from_array(self.doc_lengths.view()[live])
+        self.day_numbers = GrowableArray.from_array(self.day_numbers.view()[live])
+        if self._dense:
+            self.vectors = GrowableArray.from_array(self.vectors.view()[live])
+        self.postings = self.postings.compact(remap)
+        self.partitions = partitions
+        self.ann_index = self.ann_index.compact(remap)
+        
+        parent_ids = self.documents.parent_ids
+        self._positions_by_key = PositionMap.from_pairs((key, position) for position, key in enumerate(self.doc_keys))
+        self._positions_by_parent = PositionMap.from_pairs(
+            (str(parent_ids[position] or key), position) for position, key in enumerate(self.doc_keys)
+        )
+    
+    def _tokenize(self, text: str) -> list[str]:
+        """Split text into normalized tokens (see `Tokenizer`)."""
+        return self.tokenizer.tokenize(text)
+    
+    def normalize_query(self, query: str) -> tuple:
+        """
+        Sorted unique query terms, then any quoted phrases (as token
+        tuples); queries with equal terms and phrases score identically.
+        """
+        phrases = query_phrases(query, self._tokenize)
+        return tuple(sorted(set(self._tokenize(query)))) + tuple(sorted(phrases))
+    
+    def embed_texts(self, texts: list[str]) -> np.ndarray:
+        """
+        Unit-length embeddings of texts as the rows of a matrix, computed
+        like those of indexed documents (they depend only on the text).
+        """
+        return self.embedder.embed_documents([self._tokenize(text) for text in texts])
     
     def _extract_keywords(self, text: str) -> set:
         """Extract keywords from text for simple search."""
-        # Convert to lowercase and extract words
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
-        return set(words)
+        return set(self._tokenize(text))
+    
+    def _extend_time_order(self, new_positions: np.ndarray) -> None:
+        """Keep the time index sorted after appending documents.
+        
+        Feeds usually arrive in time order, so a batch that is already sorted
+        and not older than the newest indexed document is appended to the
+        main run. Anything else is merged into the delta run, and the delta
+        run into the main run once it outgrows max(TIME_DELTA_MIN, sqrt(n)),
+        so out-of-order writes cost O(sqrt(n)) amortized instead of a re-sort.
+        Both runs are replaced rather than modified, as published
+        generations share them.
+        """
+        new_days = self.day_numbers.view()[new_positions]
+        sorted_days = self._time_days.view()
+        in_order = len(new_days) < 2 or bool(np.all(np.diff(new_days) >= 0))
+        if in_order and (len(sorted_days) == 0 or new_days[0] >= sorted_days[-1]):
+            self._time_order.extend(new_positions)
+            self._time_days.extend(new_days)
+            return
+        
+        delta_order, delta_days = self._time_delta
+        keys = merge_sorted(time_keys(delta_days, delta_order), np.sort(time_keys(new_days, new_positions)))
+        if len(keys) <= max(self.TIME_DELTA_MIN, math.isqrt(len(sorted_days))):
+            self._time_delta = split_time_keys(keys)
+            return
+        order, days = split_time_keys(merge_sorted(time_keys(sorted_days, self._time_order.view()), keys))
+        self._time_order = GrowableArray.from_array(order)
+        self._time_days = GrowableArray.from_array(days)
+        self._time_delta = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+    
+    def _time_positions(self, state: IndexGeneration, since, until) -> Optional[np.ndarray]:
+        """Sorted positions with a timestamp inside [since, until] (inclusive).
+        
+        Two binary searches over the sorted days of each run of the time
+        index find the window, so only the positions inside it are touched.
+        """
+        if since is None and until is None:
+            return None
+        
+        windows = []
+        for order, sorted_days in state.time_runs:
+            start = 0 if since is None else search_sorted(sorted_days, to_day_number(since))
+            end = len(order) if until is None else search_sorted(sorted_days, to_day_number(until), "right")
+            windows.append(order[start:end])
+        return np.sort(np.concatenate(windows))
+    
+    def _filter_positions(
+        self,
+        state: IndexGeneration,
+        filters: Optional[dict],
+        since=None,
+        until=None
+    ) -> Optional[np.ndarray]:
+        """
+        Resolve filters and the time window to the sorted positions that
+        satisfy all of them.
+        
+        Partitions are intersected before any scoring happens, so a
+        category="policy", geography="India" query only ever looks at
+        Indian policy documents. Deleted positions are dropped. Returns None
+        when nothing is filtered.
+        """
+        allowed = self._time_positions(state, since, until)
+        for field in self.PARTITION_FIELDS:
+            value = (filters or {}).get(field)
+            if not value:
+                continue
+            positions = state.partitions[field].get(value)
+            if positions is None:
+                return np.zeros(0, dtype=np.int32)
+            positions = state.visible(positions.view())
+            if allowed is None:
+                allowed = positions
+            else:
+                allowed = np.intersect1d(allowed, positions, assume_unique=True)
+        if allowed is not None and state.has_deletions():
+            allowed = allowed[state.is_alive(allowed)]
+        return allowed
+    
+    def has_deletions(self) -> bool:
+        """Whether any stored position is a tombstone."""
+        return self._current.has_deletions()
+    
+    def _filter_mask(self, state: IndexGeneration, allowed: Optional[np.ndarray]):
+        """
+        Function from a position array to whether each position is live
+        (and in the filtered set), or None when every position passes.
+        """
+        if allowed is None:
+            return state.is_alive if state.has_deletions() else None
+        mask = np.zeros(state.num_docs, dtype=bool)
+        mask[allowed] = True
+        return mask.__getitem__
     
     def search(
-        self, 
-        query: str, 
-        filters: Optional[dict] = None, 
-        k: int = 5
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        k: int = 5,
+        mode: Optional[str] = None,
+        since: Union[str, date, None] = None,
+        until: Union[str, date, None] = None
     ) -> list[dict]:
         """
         Search the vector store for relevant documents.
         
         Args:
-            query: Search query string
+            query: Search query string; "quoted phrases" must match exactly
             filters: Optional filters (category, geography, etc.)
             k: Number of results to return
+            mode: Override the store's search mode for this query
+            since: Only score documents on or after this date
+            until: Only score documents on or before this date
         
         Returns:
             List of matching documents with metadata
         """
-        # Extract query keywords
-        query_keywords = self._extract_keywords(query)
-        
-        # Filter and score documents
-        scored_docs = []
-        for doc in self.documents:
-            # Apply filters
-            if filters:
-                if "category" in filters and filters["category"]:
-                    if doc["category"] != filters["category"]:
-                        continue
-                if "geography" in filters and filters["geography"]:
-                    if doc["geography"] != filters["geography"]:
-                        continue
-            
-            # Calculate relevance score (keyword overlap)
-            doc_keywords = doc["keywords"]
-            overlap = len(query_keywords & doc_keywords)
-            
-            if overlap > 0:
-                # Score based on overlap ratio
-                score = overlap / max(len(query_keywords), 1)
-                scored_docs.append((doc, score))
-        
-        # Sort by score descending
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        
-        # Format results
+        return self.search_many([query], [filters], k=k, mode=mode, since=since, until=until)[0]
+    
+    def search_many(
+        self,
+        queries: list[str],
+        filters_list: Optional[list[Optional[dict]]] = None,
+        k: Union[int, list[int]] = 5,
+        mode: Optional[str] = None,
+        since=None,
+        until=None,
+        corpus_stats: Optional[dict] = None,
+        after=None
+    ) -> list[list[dict]]:
+        """
+        Search for a batch of queries in one pass over the index.
+        
+        Work is shared across the batch: each distinct filter set is resolved
+        once, each distinct query term's posting list is read and weighted
+        once, and dense modes score every query with a single query-matrix
+        times document-matrix product.
+        
+        Args:
+            queries: Search query strings
+            filters_list: Optional filters for each query (aligned with queries)
+            k: Number of results, for all queries or one value per query
+            mode: Override the store's search mode for this batch
+            since: Window start, for all queries or one value per query
+            until: Window end, for all queries or one value per query
+            corpus_stats: Corpus statistics to use instead of this store's
+                own (see `term_statistics`; used by sharded stores)
+            after: Only return results ranked below this (score, day number,
+                position), for all queries or one value per query (see
+                `search_page`)
+        
+        Returns:
+            One result list per query, as returned by `search`
+        """
+        state, scored = self._search_scored(queries, filters_list, k, mode, since, until, corpus_stats, after)
+        with tracing.span("format") as span:
+            results = [self._format_results(state, scored_docs) for scored_docs in scored]
+            span.candidates = span.results = sum(len(query_results) for query_results in results)
+        return results
+    
+    def search_page(
+        self,
+        query: str,
+        filters: Optional[dict] = None,
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+        mode: Optional[str] = None,
+        since: Union[str, date, None] = None,
+        until: Union[str, date, None] = None
+    ) -> dict:
+        """
+        One page of search results, resuming after a cursor.
+        
+        The first page only selects the page_size best results. Later pages
+        rank every result of the query once, cache that ranking for the
+        generation, and binary-search the cursor in it, so paging through a
+        query costs one sort instead of a scoring pass per page. Pages are
+        consistent while the store is not written.
+        
+        Args:
+            query: Search query string
+            filters: Optional filters (category, geography, etc.)
+            page_size: Number of results per page
+            cursor: `next_cursor` of the previous page (None for the first)
+            mode: Override the store's search mode
+            since: Only score documents on or after this date
+            until: Only score documents on or before this date
+        
+        Returns:
+            {"results": [...], "next_cursor": str or None when exhausted}
+        """
+        after = decode_cursor(cursor, "search", 3)
+        state, scored_docs = self._page_scored(query, filters, page_size, mode, since, until, None, after)
+        next_cursor = None
+        if scored_docs and len(scored_docs) == page_size:
+            position, score = scored_docs[-1]
+            next_cursor = encode_cursor("search", (score, int(state.day_numbers[position]), position))
+        return {"results": self._format_results(state, scored_docs), "next_cursor": next_cursor}
+    
+    def _page_scored(self, query, filters, page_size, mode, since, until, corpus_stats, after) -> tuple:
+        """(generation, (position, score) list) of the `search_page` page below a cursor."""
+        if after is None:
+            state, scored = self._search_scored([query], [filters], page_size, mode, since, until, corpus_stats, [None])
+            return state, scored[0]
+        
+        def key(generation: int) -> tuple:
+            # Sharded stores pass statistics summed over every shard, which
+            # change with other shards' writes
+            stats = None
+            if corpus_stats is not None:
+                stats = (
+                    corpus_stats["num_docs"], corpus_stats["total_length"],
+                    tuple(sorted(corpus_stats["doc_freqs"].items())),
+                    tuple((term, context.tobytes()) for term, context in sorted(corpus_stats["contexts"].items()))
+                )
+            filters_key = tuple(sorted((filters or {}).items()))
+            return (generation, mode or self.mode, query, filters_key, str(since), str(until), page_size, stats)
+        
+        cache_key = key(self._current.generation)
+        with self._page_lock:
+            entry = self._page_rankings.get(cache_key)
+            if entry is not None:
+                self._page_rankings.move_to_end(cache_key)
+        if entry is None:
+            state, scored = self._search_scored([query], [filters], page_size, mode, since, until, corpus_stats, [RANK_ALL])
+            ranking = scored[0]
+            positions = np.array([position for position, _ in ranking], dtype=np.int64)
+            scores = np.array([score for _, score in ranking], dtype=np.float64)
+            # The ranking's sort key, ascending: (-score, -day, position)
+            entry = (state, ranking, -scores, -state.day_numbers[positions].astype(np.int64), positions)
+            with self._page_lock:
+                self._page_rankings[key(state.generation)] = entry
+                while len(self._page_rankings) > self.PAGE_RANKINGS:
+                    self._page_rankings.popitem(last=False)
+        
+        # Narrow to the cursor's score, then its day, then the positions after it
+        state, ranking, negative_scores, negative_days, positions = entry
+        score, day, position = after
+        start = int(np.searchsorted(negative_scores, -score))
+        end = int(np.searchsorted(negative_scores, -score, "right"))
+        days = negative_days[start:end]
+        start, end = start + int(np.searchsorted(days, -day)), start + int(np.searchsorted(days, -day, "right"))
+        start += int(np.searchsorted(positions[start:end], position, "right"))
+        return state, ranking[start:start + page_size]
+    
+    def list_page(
+        self,
+        filters: Optional[dict] = None,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        since: Union[str, date, None] = None,
+        until: Union[str, date, None] = None
+    ) -> dict:
+        """
+        One page of documents, newest first, resuming after a cursor.
+        
+        The time index is walked backwards from the cursor (found with a
+        binary search), so every page costs O(page_size + log n) for
+        unfiltered listings, whatever its depth. Each document is listed
+        once, by its first passage.
+        
+        Args:
+            filters: Optional filters (category, geography, etc.)
+            page_size: Number of documents per page
+            cursor: `next_cursor` of the previous page (None for the first)
+            since: Only list documents on or after this date
+            until: Only list documents on or before this date
+        
+        Returns:
+            {"results": [...], "next_cursor": str or None when exhausted}
+        """
+        after = decode_cursor(cursor, "list", 2)
+        state = self._current
+        listed = self._list_positions(state, filters, page_size, after, since, until)
+        next_cursor = None
+        if listed and len(listed) == page_size:
+            next_cursor = encode_cursor("list", (int(state.day_numbers[listed[-1]]), listed[-1]))
+        results = self._format_results(state, [(position, 0.0) for position in listed])
+        return {"results": results, "next_cursor": next_cursor}
+    
+    def _list_positions(
+        self,
+        state: IndexGeneration,
+        filters: Optional[dict],
+        page_size: int,
+        after: Optional[tuple],
+        since,
+        until
+    ) -> list[int]:
+        """
+        Positions of the next page of `list_page`, below an (day, position) cursor.
+        
+        The runs of the time index are walked backwards in chunks and merged.
+        Each step only takes the entries no older than the oldest entry read
+        from a run that continues below its chunk, so the merge stays exact.
+        """
+        allowed = self._filter_positions(state, filters)
+        if allowed is not None and len(allowed) == 0:
+            return []
+        
+        runs = []  # [positions, days, start, end] of each run's window
+        for order, sorted_days in state.time_runs:
+            start, end = 0, len(order)
+            if since is not None:
+                start = search_sorted(sorted_days, to_day_number(since))
+            if until is not None:
+                end = search_sorted(sorted_days, to_day_number(until), "right")
+            if after is not None:
+                # Runs are sorted by (day, position); resume just below the cursor
+                day, position = after
+                first, last = search_sorted(sorted_days, day), search_sorted(sorted_days, day, "right")
+                end = min(end, first + search_sorted(order[first:last], position))
+            if end > start:
+                runs.append([order, sorted_days, start, end])
+        
+        passage_starts = state.documents.passage_starts.view()
+        chunk_size = max(page_size * 4, 256)
+        listed = []
+        while runs and len(listed) < page_size:
+            chunks = []
+            floor = None  # entries below this key wait for the next step
+            for run in runs:
+                order, sorted_days, start, end = run
+                first = max(start, end - chunk_size)
+                keys = time_keys(sorted_days[first:end], order[first:end])
+                chunks.append((run, first, keys))
+                if first > start:
+                    floor = keys[0] if floor is None else max(floor, keys[0])
+            taken = []
+            for run, first, keys in chunks:
+                cut = 0 if floor is None else int(np.searchsorted(keys, floor))
+                taken.append(keys[cut:])
+                run[3] = first + cut
+            runs = [run for run in runs if run[3] > run[2]]
+            chunk = split_time_keys(np.sort(np.concatenate(taken))[::-1])[0]
+            keep = passage_starts[chunk] == 0
+            if allowed is not None:
+                indexes = np.minimum(np.searchsorted(allowed, chunk), len(allowed) - 1)
+                keep &= allowed[indexes] == chunk
+            elif state.has_deletions():
+                keep &= state.is_alive(chunk)
+            listed.extend(chunk[keep][:page_size - len(listed)].tolist())
+        return listed
+    
+    def _search_scored(self, queries, filters_list, k, mode, since, until, corpus_stats, after) -> tuple:
+        """(generation, (position, score) lists per query) for `search_many`."""
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode in self.DENSE_MODES and not self._dense:
+            self._enable_dense()
+        
+        # Everything below reads this one generation, so concurrent writes
+        # are either fully visible or not at all
+        state = self._current
+        
+        count = len(queries)
+        filters_list = filters_list or [None] * count
+        ks = k if isinstance(k, list) else [k] * count
+        sinces = since if isinstance(since, list) else [since] * count
+        untils = until if isinstance(until, list) else [until] * count
+        afters = after if isinstance(after, list) else [after] * count
+        if not (len(filters_list) == len(ks) == len(sinces) == len(untils) == len(afters) == count):
+            raise ValueError("Per-query arguments must have one value per query")
+        
+        with tracing.span("filter", candidates=state.num_alive * count) as span:
+            # Resolve each distinct filter set once
+            resolved = {}
+            allowed_list = []
+            for filters, query_since, query_until in zip(filters_list, sinces, untils):
+                key = (tuple(sorted((filters or {}).items())), str(query_since), str(query_until))
+                if key not in resolved:
+                    resolved[key] = self._filter_positions(state, filters, query_since, query_until)
+                allowed_list.append(resolved[key])
+            
+            # Quoted phrases restrict a query to the documents containing them
+            phrase_positions = {}
+            for i, query in enumerate(queries):
+                for phrase in query_phrases(query, self._tokenize):
+                    if phrase not in phrase_positions:
+                        phrase_positions[phrase] = self._phrase_positions(state, phrase)
+                    allowed = allowed_list[i]
+                    positions = phrase_positions[phrase]
+                    if allowed is None:
+                        allowed_list[i] = positions
+                    else:
+                        allowed_list[i] = np.intersect1d(allowed, positions, assume_unique=True)
+            span.results = sum(state.num_alive if allowed is None else len(allowed) for allowed in allowed_list)
+        
+        # Queries whose filters match nothing are not scored
+        active = [
+            i for i, allowed in enumerate(allowed_list)
+            if not (allowed is not None and len(allowed) == 0)
+        ]
+        scored = [[] for _ in queries]
+        if active:
+            with tracing.span("tokenize", candidates=len(active)) as span:
+                token_lists = [self._tokenize(queries[i]) for i in active]
+                span.results = sum(len(tokens) for tokens in token_lists)
+            active_allowed = [allowed_list[i] for i in active]
+            active_ks = [ks[i] for i in active]
+            active_afters = [afters[i] for i in active]
+            
+            # Candidate counts are added by `_select` as each query is ranked
+            with tracing.span("score") as span:
+                if mode == "bm25":
+                    batch = self._score_bm25(state, token_lists, active_allowed, active_ks, corpus_stats, active_afters)
+                elif mode == "keyword":
+                    batch = self._score_keyword(state, token_lists, active_allowed, active_ks, active_afters)
+                elif mode == "dense":
+                    batch = self._score_dense(state, token_lists, active_allowed, active_ks, corpus_stats, active_afters)
+                elif mode == "ann":
+                    batch = self._score_ann(state, token_lists, active_allowed, active_ks, corpus_stats, active_afters)
+                else:
+                    batch = self._score_hybrid(state, token_lists, active_allowed, active_ks, corpus_stats, active_afters)
+                span.results = sum(len(scored_docs) for scored_docs in batch)
+            for i, scored_docs in zip(active, batch):
+                scored[i] = scored_docs
+        
+        return state, scored
+    
+    def term_statistics(
+        self,
+        queries: list[str],
+        mode: Optional[str] = None,
+        terms: Optional[list[str]] = None
+    ) -> dict:
+        """
+        Live document count, total length, and each query term's document
+        frequency and embedding context vector.
+        
+        Sharded stores sum these over their shards and pass them back as
+        `search_many(..., corpus_stats=...)`, so every shard scores BM25 with
+        corpus-wide IDF and average length and embeds queries identically.
+        Context vectors are only maintained once a dense mode is used, so
+        pass the mode the statistics are for. `terms`, if given, replaces
+        the (expanded) terms of the queries.
+        """
+        if (mode or self.mode) in self.DENSE_MODES and not self._dense:
+            self._enable_dense()
+        state = self._current
+        if terms is None:
+            terms = [term for query in queries for term in self._query_weights(state, self._tokenize(query))]
+        doc_freqs = {}
+        contexts = {}
+        for term in terms:
+            if term not in doc_freqs:
+                term_id = state.postings.term_id(term)
+                known = term_id is not None and term_id < len(state.doc_freqs)
+                doc_freqs[term] = int(state.doc_freqs[term_id]) if known else 0
+                context = state.contexts.get(term)
+                if context is not None:
+                    contexts[term] = context.copy()
+        return {
+            "num_docs": state.num_alive,
+            "total_length": state.total_length,
+            "doc_freqs": doc_freqs,
+            "contexts": contexts
+        }
+    
+    def set_query_expansion(self, expansion: Optional[QueryExpansion]) -> None:
+        """
+        Expand BM25 queries (also in hybrid mode) with weighted related
+        terms, or stop expanding with None; see `storage.expansion`.
+        """
+        with self._write_lock:
+            self.expansion = expansion
+            self._publish()
+    
+    def _query_weights(self, state: IndexGeneration, tokens: list[str]) -> dict:
+        """Query term -> weight: 1.0 for the query's terms, plus any expansion terms."""
+        if state.expansion is None:
+            return dict.fromkeys(tokens, 1.0)
+        return state.expansion.expand(tokens)
+    
+    def cooccurrence_statistics(self, anchors: list[str]) -> dict:
+        """
+        Live passage count, and how many live passages each anchor term
+        shares with every other term, for mining query expansions.
+        
+        Returns:
+            {"num_docs": int, "pairs": {anchor: {term: shared passages}}}
+        """
+        state = self._current
+        pairs = {}
+        for anchor in dict.fromkeys(anchors):
+            entry = self._read_postings(state, anchor)
+            if entry is None:
+                continue
+            positions = entry[1][state.is_alive(entry[1])]
+            if len(positions) == 0:
+                continue
+            
+            # Gather the term ids of the anchor's passages from their CSR rows
+            offsets = state.doc_term_offsets
+            counts = np.bincount(gather_ranges(state.doc_term_ids, offsets[positions], offsets[positions + 1]))
+            pairs[anchor] = {
+                state.postings.term(term_id): int(counts[term_id])
+                for term_id in np.flatnonzero(counts).tolist()
+            }
+        return {"num_docs": state.num_alive, "pairs": pairs}
+    
+    def document_frequencies(self, terms: list[str]) -> dict:
+        """Live document frequency of each term (0 if unknown)."""
+        state = self._current
+        doc_freqs = {}
+        for term in terms:
+            term_id = state.postings.term_id(term)
+            known = term_id is not None and term_id < len(state.doc_freqs)
+            doc_freqs[term] = int(state.doc_freqs[term_id]) if known else 0
+        return doc_freqs
+    
+    def corpus_statistics(self) -> dict:
+        """
+        Live document and passage counts, plus document counts per category,
+        geography, source and month ("YYYY-MM").
+        
+        Counts are maintained as documents are written, so this costs
+        O(number of facet values) regardless of corpus size.
+        """
+        state = self._current
+        return {"passages": state.num_alive, **state.facets.to_dict()}
+    
+    def _format_results(self, state: IndexGeneration, scored_docs: list[tuple]) -> list[dict]:
+        """Materialize (position, score) pairs of a generation as result dicts."""
         documents = []
-        for doc, score in scored_docs[:k]:
+        for position, score in scored_docs:
+            doc = state.documents.get(position)
+            start = doc.get("passage_start", 0)
             documents.append({
+                "id": state.doc_keys[position],
+                "parent_id": doc.get("parent_id", state.doc_keys[position]),
+                "start": start,
+                "end": start + len(doc["text"]),
                 "text": doc["text"],
                 "metadata": {
                     "category": doc["category"],
@@ -129,22 +1261,475 @@ class VectorStore:
                 },
                 "relevance_score": score
             })
-        
         return documents
     
+    def _filter_masks(
+        self,
+        state: IndexGeneration,
+        allowed_list: list[Optional[np.ndarray]]
+    ) -> list[Optional[np.ndarray]]:
+        """`_filter_mask` functions for a batch, built once per distinct position set."""
+        masks = {}
+        for allowed in allowed_list:
+            if id(allowed) not in masks:
+                masks[id(allowed)] = self._filter_mask(state, allowed)
+        return [masks[id(allowed)] for allowed in allowed_list]
+    
+    def _read_postings(self, state: IndexGeneration, term: str) -> Optional[tuple]:
+        """(term id, positions, term_freqs) of a term as of a generation, or None."""
+        term_id = state.postings.term_id(term)
+        if term_id is None or term_id >= len(state.doc_freqs):
+            return None
+        positions, term_freqs = state.postings.read(term_id)
+        count = np.searchsorted(positions, state.num_docs)
+        return term_id, positions[:count], term_freqs[:count]
+    
+    def _phrase_positions(self, state: IndexGeneration, phrase: tuple) -> np.ndarray:
+        """
+        Sorted live positions of the documents containing a phrase.
+        
+        The phrase terms' posting lists are intersected first; token offsets
+        are decoded only for documents containing every term.
+        """
+        entries = [self._read_postings(state, term) for term in phrase]
+        if any(entry is None for entry in entries):
+            return np.zeros(0, dtype=np.int32)
+        
+        candidates = min((positions for _, positions, _ in entries), key=len)
+        for _, positions, _ in entries:
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+        if len(phrase) > 1:
+            readers = []
+            for term_id, _, _ in entries:
+                positions, starts, encoded = state.postings.read_offsets(term_id)
+                readers.append((starts, encoded, posting_indexes(positions, candidates).tolist()))
+            matched = [
+                contains_phrase([posting_offsets(starts, encoded, indexes[i]) for starts, encoded, indexes in readers])
+                for i in range(len(candidates))
+            ]
+            candidates = candidates[np.array(matched, dtype=bool)]
+        if state.has_deletions():
+            candidates = candidates[state.is_alive(candidates)]
+        return candidates
+    
+    def _score_keyword(
+        self,
+        state: IndexGeneration,
+        token_lists: list[list[str]],
+        allowed_list: list[Optional[np.ndarray]],
+        ks: list[int],
+        afters: Optional[list[Optional[tuple]]] = None
+    ) -> list[list[tuple]]:
+        """Top-k documents by keyword overlap ratio for each query, best first."""
+        afters = afters or [None] * len(token_lists)
+        postings = {}  # term -> positions, read once per batch
+        results = []
+        for tokens, mask, k, after in zip(token_lists, self._filter_masks(state, allowed_list), ks, afters):
+            query_keywords = set(tokens)
+            
+            # Count keyword overlap using the inverted index, so only documents
+            # sharing at least one query term (and passing the filters) are touched
+            parts = []
+            for term in query_keywords:
+                if term not in postings:
+                    entry = self._read_postings(state, term)
+                    postings[term] = None if entry is None else entry[1]
+                positions = postings[term]
+                if positions is None:
+                    continue
+                if mask is not None:
+                    positions = positions[mask(positions)]
+                parts.append(positions)
+            if not parts:
+                results.append([])
+                continue
+            
+            overlap_counts = np.bincount(np.concatenate(parts), minlength=state.num_docs)
+            candidates = np.flatnonzero(overlap_counts)
+            
+            # Score based on overlap ratio
+            scores = overlap_counts[candidates] / max(len(query_keywords), 1)
+            top = self._select(scores, k, candidates, state.day_numbers, after)
+            results.append([
+                (position, score)
+                for position, score in zip(candidates[top].tolist(), scores[top].tolist())
+            ])
+        return results
+    
+    def _score_bm25(
+        self,
+        state: IndexGeneration,
+        token_lists: list[list[str]],
+        allowed_list: list[Optional[np.ndarray]],
+        ks: list[int],
+        corpus_stats: Optional[dict] = None,
+        afters: Optional[list[Optional[tuple]]] = None
+    ) -> list[list[tuple]]:
+        """Top-k documents by BM25 for each query, best first.
+        
+        Each distinct term's BM25 contribution is computed once per batch.
+        Every query then concatenates its terms' postings into one sparse
+        query-document product, accumulated with a single `np.bincount`.
+        IDF and average length come from `corpus_stats` when given.
+        """
+        if state.num_alive == 0:
+            return [[] for _ in token_lists]
+        afters = afters or [None] * len(token_lists)
+        
+        num_docs, total_length = state.num_alive, state.total_length
+        global_doc_freqs = {}
+        if corpus_stats is not None:
+            num_docs, total_length = corpus_stats["num_docs"], corpus_stats["total_length"]
+            global_doc_freqs = corpus_stats["doc_freqs"]
+        
+        k1, b = self.BM25_K1, self.BM25_B
+        avg_length = max(total_length / num_docs, 1e-9)
+        doc_lengths = state.doc_lengths
+        
+        term_weights = {}  # term -> (positions, weights), or None if unknown
+        term_idfs = {}  # term -> (term id, idf)
+        
+        def weigh(term: str):
+            if term not in term_weights:
+                entry = self._read_postings(state, term)
+                if entry is None:
+                    term_weights[term] = None
+                    return None
+                term_id, positions, term_freqs = entry
+                
+                # IDF uses the whole live corpus; filters only drop postings
+                doc_freq = global_doc_freqs.get(term, int(state.doc_freqs[term_id]))
+                idf = math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+                norm = term_freqs + k1 * (1 - b + b * doc_lengths[positions] / avg_length)
+                term_weights[term] = (positions, idf * term_freqs * (k1 + 1) / norm)
+                term_idfs[term] = (term_id, idf)
+            return term_weights[term]
+        
+        results = []
+        for tokens, mask, k, after in zip(token_lists, self._filter_masks(state, allowed_list), ks, afters):
+            positions_parts = []
+            weight_parts = []
+            query_terms = set(tokens)
+            for term, query_weight in self._query_weights(state, tokens).items():
+                entry = weigh(term)
+                if entry is None:
+                    continue
+                positions, weights = entry
+                if mask is not None:
+                    keep = mask(positions)
+                    positions, weights = positions[keep], weights[keep]
+                positions_parts.append(positions)
+                weight_parts.append(weights if query_weight == 1.0 else weights * query_weight)
+            
+            if not positions_parts:
+                results.append([])
+                continue
+            
+            scores = np.bincount(
+                np.concatenate(positions_parts),
+                weights=np.concatenate(weight_parts),
+                minlength=state.num_docs
+            )
+            
+            candidates = np.flatnonzero(scores > 0)
+            known_terms = [term for term in query_terms if term_weights[term] is not None]
+            if len(known_terms) > 1 and self.PROXIMITY_WEIGHT > 0:
+                self._add_proximity(state, scores, candidates, k, known_terms, term_idfs)
+            
+            top = self._select(scores[candidates], k, candidates, state.day_numbers, after)
+            results.append([
+                (position, float(scores[position]))
+                for position in candidates[top].tolist()
+            ])
+        return results
+    
+    @staticmethod
+    def _select(scores: np.ndarray, k: int, candidates, day_numbers: np.ndarray, after) -> np.ndarray:
+        """`top_k`, traced as a "sort" span whose candidates also count toward the enclosing span."""
+        if after is RANK_ALL:
+            k, after = len(scores), None
+        tracing.current_span().candidates += len(scores)
+        with tracing.span("sort", candidates=len(scores)) as span:
+            top = top_k(scores, k, candidates, day_numbers, after)
+            span.results = len(top)
+        return top
+    
+    def _add_proximity(
+        self,
+        state: IndexGeneration,
+        scores: np.ndarray,
+        candidates: np.ndarray,
+        k: int,
+        terms: list[str],
+        term_idfs: dict
+    ) -> None:
+        """
+        Add a term proximity bonus to the best BM25 candidates' scores.
+        
+        The re-ranked candidates depend only on k, not on a page cursor, so
+        every page of a query sees the same scores.
+        """
+        depth = max(k * self.PROXIMITY_DEPTH_FACTOR, self.PROXIMITY_MIN_DEPTH)
+        best = candidates[top_k(scores[candidates], depth, candidates, state.day_numbers)]
+        idfs = {term: term_idfs[term][1] for term in terms}
+        readers = {}
+        for term in terms:
+            positions, starts, encoded = state.postings.read_offsets(term_idfs[term][0])
+            readers[term] = (starts, encoded, posting_indexes(positions, best))
+        # Only documents with two or more query terms can have a bonus
+        terms_present = sum((indexes >= 0).astype(np.int32) for _, _, indexes in readers.values())
+        for i in np.flatnonzero(terms_present > 1).tolist():
+            term_offsets = {
+                term: posting_offsets(starts, encoded, indexes[i])
+                for term, (starts, encoded, indexes) in readers.items() if indexes[i] >= 0
+            }
+            scores[best[i]] += self.PROXIMITY_WEIGHT * proximity_score(term_offsets, idfs, self.PROXIMITY_WINDOW)
+    
+    def _embed_queries(
+        self,
+        state: IndexGeneration,
+        token_lists: list[list[str]],
+        corpus_stats: Optional[dict] = None
+    ) -> np.ndarray:
+        """Query embeddings as the rows of one matrix, expanded with a generation's contexts."""
+        contexts = corpus_stats["contexts"] if corpus_stats is not None else state.contexts
+        return np.stack([self.embedder.embed_query(tokens, contexts) for tokens in token_lists])
+    
+    def _score_dense(
+        self,
+        state: IndexGeneration,
+        token_lists: list[list[str]],
+        allowed_list: list[Optional[np.ndarray]],
+        ks: list[int],
+        corpus_stats: Optional[dict] = None,
+        afters: Optional[list[Optional[tuple]]] = None
+    ) -> list[list[tuple]]:
+        """Top-k documents by exact embedding cosine similarity, best first.
+        
+        One matrix product scores the whole batch against the corpus, or
+        against the union of the filtered rows.
+        """
+        query_matrix = self._embed_queries(state, token_lists, corpus_stats)
+        return self._rank_vectors(state, query_matrix, allowed_list, ks, afters)
+    
+    def _score_ann(
+        self,
+        state: IndexGeneration,
+        token_lists: list[list[str]],
+        allowed_list: list[Optional[np.ndarray]],
+        ks: list[int],
+        corpus_stats: Optional[dict] = None,
+        afters: Optional[list[Optional[tuple]]] = None
+    ) -> list[list[tuple]]:
+        """Top-k documents by approximate embedding similarity, best first.
+        
+        Only the vectors in the IVF clusters nearest to each query are scored.
+        Filters are applied to those candidates, so a filtered query that
+        allows fewer rows than the probed clusters hold scores the allowed
+        rows exactly instead; otherwise it probes twice as many clusters
+        until k allowed candidates turn up (or every cluster was probed).
+        """
+        query_matrix = self._embed_queries(state, token_lists, corpus_stats)
+        masks = self._filter_masks(state, allowed_list)
+        candidates_list = []
+        for query_vector, allowed, mask, k in zip(query_matrix, allowed_list, masks, ks):
+            if allowed is not None and len(allowed) <= state.ann_index.probe_size():
+                candidates_list.append(allowed)
+                continue
+            nprobe = state.ann_index.nprobe
+            while True:
+                candidates = state.ann_index.candidates(query_vector, nprobe)
+                # The index may already hold positions from an unpublished write
+                candidates = candidates[candidates < state.num_docs]
+                if mask is not None:
+                    candidates = candidates[mask(candidates)]
+                if mask is None or len(candidates) >= k or nprobe >= state.ann_index.num_lists:
+                    break
+                nprobe *= 2
+            candidates_list.append(candidates)
+        return self._rank_vectors(state, query_matrix, candidates_list, ks, afters)
+    
+    def _score_hybrid(
+        self,
+        state: IndexGeneration,
+        token_lists: list[list[str]],
+        allowed_list: list[Optional[np.ndarray]],
+        ks: list[int],
+        corpus_stats: Optional[dict] = None,
+        afters: Optional[list[Optional[tuple]]] = None
+    ) -> list[list[tuple]]:
+        """Top-k documents by reciprocal rank fusion of BM25 and ANN, best first.
+        
+        Both candidate generators read their own index (postings and IVF
+        clusters), so neither scans the corpus. They run one after the other:
+        both score in GIL-bound Python/NumPy code, and running them on two
+        threads measured slower than running them in sequence.
+        
+        Only the fused candidates are ranked, so paging with `afters` ends
+        once they run out.
+        """
+        afters = afters or [None] * len(token_lists)
+        depths = [max(k * self.HYBRID_DEPTH_FACTOR, self.HYBRID_MIN_DEPTH) for k in ks]
+        lexical = self._score_bm25(state, token_lists, allowed_list, depths, corpus_stats)
+        dense = self._score_ann(state, token_lists, allowed_list, depths, corpus_stats)
+        
+        results = []
+        for lexical_docs, dense_docs, k, after in zip(lexical, dense, ks, afters):
+            rankings = [[position for position, _ in ranking] for ranking in (lexical_docs, dense_docs)]
+            fused = fuse_rankings(rankings, self.RRF_K)
+            
+            items = ((position, score, int(state.day_numbers[position])) for position, score in fused.items())
+            if after is RANK_ALL:
+                k, after = len(fused), None
+            with tracing.span("sort", candidates=len(fused)) as span:
+                top = top_k_items(items, k, after)
+                span.results = len(top)
+            results.append([(position, score) for position, score, _ in top])
+        return results
+    
+    def _rank_vectors(
+        self,
+        state: IndexGeneration,
+        query_matrix: np.ndarray,
+        candidates_list: list[Optional[np.ndarray]],
+        ks: list[int],
+        afters: Optional[list[Optional[tuple]]] = None
+    ) -> list[list[tuple]]:
+        """Score each query's candidate rows (or all rows) against its vector.
+        
+        The rows needed by the batch are scored with one matrix product;
+        `top_k` then selects each query's best rows without sorting
+        everything.
+        """
+        vectors = state.vectors
+        if any(candidates is None for candidates in candidates_list):
+            rows = None
+            score_matrix = vectors @ query_matrix.T
+        else:
+            rows = np.unique(np.concatenate(candidates_list))
+            score_matrix = vectors[rows] @ query_matrix.T
+        
+        afters = afters or [None] * len(ks)
+        results = []
+        for column, candidates, k, after in zip(score_matrix.T, candidates_list, ks, afters):
+            if candidates is None:
+                scores = column.copy()
+                if state.has_deletions():
+                    scores[state.deleted_at <= state.epoch] = -np.inf
+            elif rows is None:
+                scores = column[candidates]
+            else:
+                scores = column[np.searchsorted(rows, candidates)]
+            
+            top = self._select(scores, k, candidates, state.day_numbers, after)
+            positions = top if candidates is None else candidates[top]
+            
+            results.append([
+                (position, float(scores[index]))
+                for index, position in zip(top.tolist(), positions.tolist())
+                if scores[index] > 0
+            ])
+        return results
+    
+    def save(self, directory: Optional[str] = None, metadata: Optional[dict] = None) -> None:
+        """
+        Write a snapshot of the whole store to disk.
+        
+        Args:
+            directory: Snapshot directory (defaults to persist_directory)
+            metadata: Extra JSON-serializable data stored in the manifest
+        """
+        directory = directory or self.persist_directory
+        # Writers wait while saving; searches keep running
+        with self._write_lock:
+            snapshot.save_snapshot(self, directory, metadata)
+        print(f"Saved vector store snapshot ({self.num_alive} documents) to {directory}")
+    
+    @classmethod
+    def load(cls, directory: str, **kwargs) -> "VectorStore":
+        """
+        Open a snapshot written by `save`.
+        
+        Arrays are memory-mapped rather than read, so loading takes roughly
+        constant time and worker processes share the same pages. Adding
+        documents afterwards copies only the structures being extended.
+        
+        Args:
+            directory: Snapshot directory
+            **kwargs: Other VectorStore options (mode, ann_nprobe); the
+                tokenizer is rebuilt from the snapshot's settings, so queries
+                are tokenized like the indexed documents
+        """
+        manifest = snapshot.read_manifest(directory)
+        store = cls(
+            persist_directory=directory,
+            embedding_dim=manifest["embedding_dim"],
+            tokenizer=Tokenizer(**manifest["tokenizer"]),
+            **kwargs
+        )
+        snapshot.load_snapshot(store, directory)
+        store._publish()
+        return store
+    
+    @staticmethod
+    def snapshot_exists(directory: str) -> bool:
+        """Check whether a directory holds a saved snapshot."""
+        return snapshot.snapshot_exists(directory)
+    
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        """
+        Materialize a stored document by its stable id, or None if absent.
+        
+        A parent id returns the whole document, its text reassembled from
+        its passages (overlaps are merged; whitespace between passages that
+        do not overlap comes back as spaces). A passage id returns just that
+        passage. Like search, this reflects the last published write.
+        """
+        state = self._current
+        doc_id = str(doc_id)
+        positions = state.live(state.positions_by_parent.get(doc_id))
+        if not positions:
+            positions = state.live(state.positions_by_key.get(doc_id))
+        if not positions:
+            return None
+        
+        passages = sorted((state.documents.get(p) for p in positions), key=lambda doc: doc.get("passage_start", 0))
+        if len(passages) == 1 and state.doc_keys[positions[0]] == doc_id:
+            return {**passages[0], "id": doc_id}
+        text = ""
+        for passage in passages:
+            start = passage["passage_start"]
+            text = text.ljust(start) + passage["text"][max(len(text) - start, 0):]
+        document = {field: value for field, value in passages[0].items() if field not in ("parent_id", "passage_start")}
+        return {**document, "id": doc_id, "text": text}
+    
+    def save_ann_index(self, path: str) -> None:
+        """Write the ANN index to disk."""
+        self.ann_index.save(path)
+    
+    def load_ann_index(self, path: str) -> None:
+        """Replace the ANN index with one saved by `save_ann_index`."""
+        with self._write_lock:
+            self.ann_index = IVFIndex.load(path)
+            self._publish()
+    
     def filter_by_recency(
-        self, 
-        documents: list[dict], 
+        self,
+        documents: list[dict],
         recency_days: int
     ) -> list[dict]:
-        """Filter documents by recency."""
+        """
+        Filter already-retrieved documents by recency.
+        
+        Prefer `search(..., since=...)`, which applies the window through the
+        time index before scoring instead of after it.
+        """
         if not recency_days:
             return documents
         
-        cutoff_date = datetime.now() - timedelta(days=recency_days)
-        cutoff_str = cutoff_date.isoformat()[:10]
+        cutoff_day = to_day_number(datetime.now() - timedelta(days=recency_days))
         
         return [
             doc for doc in documents
-            if doc["metadata"].get("timestamp", "") >= cutoff_str
+            if to_day_number(doc["metadata"].get("timestamp")) >= cutoff_day
         ]
@@ -82,10 +82,1193 @@ def test_vector_store():
     return True
 
 
+def test_bm25_search():
+    """Test BM25 ranking in the vector store."""
+    print("\n=== Testing BM25 Search ===")
+    from storage.vector_store import VectorStore
+    
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([
+        {
+            "text": "Digital lending guidelines for fintech lending apps",
+            "category": "policy",
+            "timestamp": "2024-12-01",
+            "geography": "India",
+            "source": "RBI"
+        },
+        {
+            "text": "Fintech startups see growth in payments",
+            "category": "policy",
+            "timestamp": "2024-12-01",
+            "geography": "India",
+            "source": "Test Source"
+        },
+        {
+            "text": "Lending news from the fintech sector",
+            "category": "news",
+            "timestamp": "2024-12-01",
+            "geography": "India",
+            "source": "Test Source"
+        }
+    ])
+    
+    results = vs.search("fintech lending", filters={"category": "policy"}, k=5)
+    print(f"BM25 Results: {[r['metadata']['source'] for r in results]}")
+    
+    assert len(results) == 2, "Category filter should keep both policy documents"
+    assert results[0]["metadata"]["source"] == "RBI", "Repeated query terms should rank first"
+    assert results[0]["relevance_score"] > results[1]["relevance_score"], "BM25 should break ties"
+    print("✅ BM25 Search Tests Passed!")
+    return True
+
+
+def test_dense_search():
+    """Test offline embedding search in the vector store."""
+    print("\n=== Testing Dense Search ===")
+    from storage.vector_store import VectorStore
+    
+    vs = VectorStore(mode="dense")
+    base = {"category": "news", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    vs.add_documents([
+        {**base, "text": "UPI payments volume grows across India", "title": "both"},
+        {**base, "text": "UPI adoption by small merchants", "title": "upi"},
+        {**base, "text": "Hospitals expand city clinics", "title": "health"}
+    ])
+    
+    results = vs.search("payments", k=3)
+    titles = [r["metadata"]["title"] for r in results]
+    print(f"Dense Results: {titles}")
+    
+    assert titles[0] == "both", "Exact term match should rank first"
+    assert "upi" in titles, "Co-occurring terms should produce semantic matches"
+    assert "health" not in titles[:2], "Unrelated documents should rank last"
+    
+    # Keyword and BM25 stores skip embeddings until a dense mode is used;
+    # they then match a store that embedded every write
+    docs = [
+        {**base, "id": f"d{i}", "text": f"UPI payments {word} merchants India", "title": word}
+        for i, word in enumerate(["growth", "volume", "fraud", "lending", "wallets", "credit"])
+    ]
+    eager, lazy = VectorStore(mode="dense"), VectorStore(mode="bm25")
+    for store in (eager, lazy):
+        store.add_documents(docs[:4])
+        store.delete_documents(["d1"])
+        store.add_documents(docs[4:])
+    assert len(lazy.vectors) == 0 and len(lazy.embedder.context_arrays()[0]) == 0
+    for mode in ["dense", "ann", "hybrid"]:
+        expected = [(r["id"], round(r["relevance_score"], 4)) for r in eager.search("payments fraud", k=5, mode=mode)]
+        assert [(r["id"], round(r["relevance_score"], 4)) for r in lazy.search("payments fraud", k=5, mode=mode)] == expected, mode
+    assert len(lazy.vectors) == 6
+    lazy.add_documents([{**base, "id": "d6", "text": "UPI fraud alerts", "title": "alerts"}])
+    assert len(lazy.vectors) == 7 and lazy.search("fraud alerts", k=1, mode="dense")[0]["id"] == "d6"
+    print("✅ Dense Search Tests Passed!")
+    return True
+
+
+def test_ann_index():
+    """Test the IVF approximate nearest neighbour index."""
+    print("\n=== Testing ANN Index ===")
+    import tempfile
+    import numpy as np
+    from storage.ann_index import IVFIndex
+    
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(600, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    index = IVFIndex(dim=16, nlist=8, nprobe=8, min_train_size=200)
+    index.add(np.arange(100), vectors)
+    assert not index.is_trained, "Small indexes should answer exactly"
+    
+    # Incremental inserts train the index and keep every position reachable
+    index.add(np.arange(100, 600), vectors)
+    assert index.is_trained
+    assert sorted(index.candidates(vectors[0]).tolist()) == list(range(600)), "Probing all lists should see everything"
+    
+    # Fewer probes should still find the query's own vector
+    assert 42 in index.candidates(vectors[42], nprobe=1).tolist()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ivf")
+        index.save(path)
+        loaded = IVFIndex.load(path)
+    assert np.array_equal(loaded.candidates(vectors[7], nprobe=2), index.candidates(vectors[7], nprobe=2))
+    
+    # Filtered queries keep their recall: a small filtered set is ranked
+    # exactly, a larger one probes more clusters until k rows match
+    from storage.vector_store import VectorStore
+    words = [f"term{i}" for i in range(300)]
+    base = {"timestamp": "2024-06-01", "source": "Test Source"}
+    vs = VectorStore(mode="ann")
+    vs.ann_index = IVFIndex(dim=vs.embedder.dim, nlist=16, nprobe=1, min_train_size=200)
+    vs.add_documents([
+        {**base, "category": "policy" if i < 20 else "news", "geography": "Singapore" if i % 6 == 0 else "India",
+         "text": " ".join(rng.choice(words, size=20).tolist())}
+        for i in range(1200)
+    ])
+    assert vs.ann_index.is_trained
+    query = "term1 term2 term3 term4"
+    policy = vs.search(query, filters={"category": "policy"}, k=10)
+    assert [r["id"] for r in policy] == [r["id"] for r in vs.search(query, filters={"category": "policy"}, k=10, mode="dense")]
+    singapore = vs.search(query, filters={"geography": "Singapore"}, k=15)
+    assert len(singapore) == 15 and all(r["metadata"]["geography"] == "Singapore" for r in singapore)
+    
+    print("✅ ANN Index Tests Passed!")
+    return True
+
+
+def test_time_window_search():
+    """Test that recency filtering happens inside search."""
+    print("\n=== Testing Time Window Search ===")
+    from datetime import datetime, timedelta
+    import numpy as np
+    from storage.vector_store import VectorStore
+    from rag.retriever import retrieve_context
+    
+    today = datetime.now().date()
+    base = {"category": "news", "geography": "India", "source": "Test Source"}
+    
+    vs = VectorStore(mode="bm25")
+    # Many highly relevant old articles, then a few weaker recent ones
+    vs.add_documents([
+        {**base, "text": "fintech funding fintech funding", "timestamp": str(today - timedelta(days=400 - i))}
+        for i in range(20)
+    ])
+    vs.add_documents([
+        {**base, "text": f"fintech update number {i}", "timestamp": str(today - timedelta(days=i))}
+        for i in range(3)
+    ])
+    
+    results = vs.search("fintech funding", k=3, since=today - timedelta(days=30))
+    print(f"Recent Results: {[r['metadata']['timestamp'] for r in results]}")
+    assert len(results) == 3, "Window should still yield k recent results"
+    
+    old = vs.search("fintech funding", k=5, until=today - timedelta(days=390))
+    assert len(old) == 5 and all(r["metadata"]["timestamp"] <= str(today - timedelta(days=390)) for r in old)
+    
+    context = retrieve_context("fintech funding", category="news", recency_days=30, vector_store=vs, k=3)
+    assert len(context) == 3, "Retriever should not lose recent results to older ones"
+    
+    # Each run of the time index keeps its sorted days in step with its order
+    state = vs._current
+    for order, sorted_days in state.time_runs:
+        assert (sorted_days == state.day_numbers[order]).all()
+        assert (sorted_days[:-1] <= sorted_days[1:]).all()
+    
+    # Out-of-order batches go to the delta run, which merges into the main
+    # run once it outgrows TIME_DELTA_MIN; listings and windows stay exact
+    vs = VectorStore(mode="bm25")
+    vs.TIME_DELTA_MIN = 8
+    rng = np.random.default_rng(3)
+    stamps = {}
+    for batch in range(12):
+        offsets = rng.integers(0, 60, size=3)
+        docs = [
+            {**base, "id": f"ooo{batch}-{i}", "text": "fintech note", "timestamp": str(today - timedelta(days=int(offset)))}
+            for i, offset in enumerate(offsets)
+        ]
+        vs.add_documents(docs)
+        stamps.update((doc["id"], doc["timestamp"]) for doc in docs)
+        runs = vs._current.time_runs
+        assert sum(len(order) for order, _ in runs) == len(stamps)
+        assert len(runs[1][0]) <= 8
+        for order, sorted_days in runs:
+            assert (sorted_days == vs._current.day_numbers[order]).all()
+            assert (sorted_days[:-1] <= sorted_days[1:]).all()
+        
+        listed, cursor = [], None
+        while True:
+            page = vs.list_page(page_size=5, cursor=cursor)
+            listed.extend(r["id"] for r in page["results"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(listed) == sorted(stamps)
+        assert [stamps[doc_id] for doc_id in listed] == sorted(stamps.values(), reverse=True)
+    
+    since, until = today - timedelta(days=40), today - timedelta(days=20)
+    windowed = vs.search("fintech", k=100, since=since, until=until)
+    assert sorted(r["id"] for r in windowed) == sorted(
+        doc_id for doc_id, stamp in stamps.items() if str(since) <= stamp <= str(until)
+    )
+    print("✅ Time Window Search Tests Passed!")
+    return True
+
+
+def test_snapshot_persistence():
+    """Test saving and memory-mapped loading of the vector store."""
+    print("\n=== Testing Snapshot Persistence ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    
+    base = {"category": "policy", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([
+        {**base, "text": "Startup India provides tax benefits for registered startups", "title": "tax"},
+        {**base, "text": "Digital lending guidelines for regulated entities", "title": "lending"}
+    ])
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot")
+        vs.save(path, metadata={"build": 1})
+        loaded = VectorStore.load(path, mode="bm25")
+        
+        assert loaded.snapshot_metadata == {"build": 1}
+        for mode in ["keyword", "bm25", "dense"]:
+            expected = vs.search("tax benefits", filters={"category": "policy"}, k=2, mode=mode)
+            actual = loaded.search("tax benefits", filters={"category": "policy"}, k=2, mode=mode)
+            assert [r["text"] for r in actual] == [r["text"] for r in expected], f"{mode} results should survive a reload"
+        
+        # The loaded store keeps accepting documents
+        loaded.add_documents([{**base, "text": "Angel tax exemption for startups", "title": "angel"}])
+        results = loaded.search("angel tax", k=1)
+        assert results[0]["metadata"]["title"] == "angel"
+    
+    # Ids, parent ids, terms and contexts are looked up in memory-mapped
+    # hash indexes, and the IVF index is memory-mapped, so loading decodes
+    # nothing per document
+    import numpy as np
+    from rag.chunking import chunk_document
+    words = [f"word{i}" for i in range(60)] + ["zebra"]
+    vs = VectorStore(mode="ann")
+    vs.ann_index.min_train_size = 64
+    vs.add_documents([
+        {**base, "id": f"note{i}", "text": f"UPI payments note {i} merchants"} for i in range(100)
+    ])
+    vs.upsert_documents(chunk_document({**base, "id": "doc1", "text": " ".join(words)}, passage_words=25, overlap_words=5))
+    vs.delete_documents(["note7"])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot")
+        vs.save(path)
+        loaded = VectorStore.load(path, mode="ann")
+        
+        assert len(loaded._positions_by_key._entries) == len(loaded._positions_by_parent._entries) == 0
+        assert loaded.postings.vocabulary == {} and isinstance(loaded.ann_index.centroids, np.memmap)
+        assert loaded.get_document("doc1") == vs.get_document("doc1")
+        assert loaded.get_document("doc1#1")["parent_id"] == "doc1"
+        assert loaded.get_document("note3")["text"] == "UPI payments note 3 merchants"
+        assert loaded.get_document("note7") is None and loaded.get_document("missing") is None
+        for mode in ["bm25", "dense", "ann"]:
+            expected = [r["id"] for r in vs.search("payments zebra", k=5, mode=mode)]
+            assert [r["id"] for r in loaded.search("payments zebra", k=5, mode=mode)] == expected, mode
+        
+        # Writes after loading see the snapshot's ids, terms and contexts
+        counts = loaded.upsert_documents([{**base, "id": "note3", "text": "UPI zebra crossing"}])
+        assert counts["updated"] == 1
+        loaded.upsert_documents(chunk_document({**base, "id": "doc1", "text": " ".join(words[:30])}, passage_words=25, overlap_words=5))
+        assert loaded.get_document("doc1")["text"] == " ".join(words[:30])
+        assert [r["id"] for r in loaded.search("zebra", k=5, mode="bm25")] == ["note3"]
+        assert loaded.postings.doc_freq(loaded.postings.term_id("zebra")) == 1
+        assert len(loaded.embedder._context_rows) == len(vs.embedder._context_rows) + 1  # "crossing"
+    
+    print("✅ Snapshot Persistence Tests Passed!")
+    return True
+
+
+def test_document_table():
+    """Test columnar document storage."""
+    print("\n=== Testing Document Table ===")
+    from storage.document_table import DocumentTable
+    
+    table = DocumentTable()
+    docs = [
+        {"text": "Startup India benefits", "title": "Startup India", "category": "policy",
+         "timestamp": "2024-12-01", "geography": "India", "source": "DPIIT"},
+        {"text": "Seed funding in Bengaluru ₹5 crore", "title": "", "category": "news",
+         "timestamp": "2024-12-02", "geography": "India", "source": "Inc42"}
+    ]
+    positions = [table.append(doc) for doc in docs]
+    
+    assert positions == [0, 1]
+    assert len(table) == 2
+    for position, doc in zip(positions, docs):
+        assert table[position] == {"id": position, **doc}
+    assert table.columns["geography"].values == ["India"], "Repeated values should be interned"
+    
+    arrays, values = table.to_arrays()
+    restored = DocumentTable.from_arrays(arrays, values)
+    assert list(restored) == list(table)
+    
+    print("✅ Document Table Tests Passed!")
+    return True
+
+
+def test_upsert_delete():
+    """Test stable ids, deduplication, upserts and deletes."""
+    print("\n=== Testing Upsert and Delete ===")
+    from storage.vector_store import VectorStore
+    
+    base = {"category": "news", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    docs = [
+        {**base, "text": "Fintech startup raises seed round for UPI payments", "title": "seed"},
+        {**base, "id": "story-2", "text": "Edtech startup lays off staff", "title": "layoffs"}
+    ]
+    vs = VectorStore(mode="bm25")
+    vs.add_documents(docs)
+    vs.add_documents(docs)
+    assert vs.num_alive == 2, "Re-ingesting the same documents should not duplicate them"
+    
+    counts = vs.upsert_documents([{**docs[1], "text": "Edtech startup raises bridge round"}, docs[0]])
+    assert counts == {"added": 0, "updated": 1, "unchanged": 1, "removed": 0}
+    results = vs.search("edtech", k=5)
+    assert len(results) == 1 and results[0]["id"] == "story-2"
+    assert "bridge" in results[0]["text"]
+    
+    assert vs.delete_documents(["story-2", "missing"]) == 1
+    assert vs.get_document("story-2") is None
+    for mode in ["keyword", "bm25", "dense", "ann"]:
+        assert all(r["id"] != "story-2" for r in vs.search("startup round", k=5, mode=mode))
+    assert vs.postings.doc_freq(vs.postings.term_id("edtech")) == 0
+    
+    # Chunked documents are written, fetched and deleted by their parent id
+    from rag.chunking import chunk_document
+    words = [f"word{i}" for i in range(60)] + ["zebra"]
+    report = {**base, "id": "doc1", "category": "report", "title": "Report", "text": " ".join(words)}
+    vs.upsert_documents(chunk_document(report, passage_words=25, overlap_words=5))
+    assert [r["id"] for r in vs.search("zebra", k=5)] == ["doc1#2"]
+    assert vs.get_document("doc1")["text"] == report["text"]
+    assert vs.get_document("doc1#1")["parent_id"] == "doc1"
+    
+    # Readers keep seeing the old version until an upsert is published
+    old_version = vs.get_document("doc1")
+    seen = []
+    append_documents = vs._append_documents
+    
+    def append_and_read(documents):
+        seen.append((vs.get_document("doc1"), vs.get_document("doc1#0"), vs.search("zebra", k=5)))
+        append_documents(documents)
+        seen.append((vs.get_document("doc1"), vs.get_document("doc1#0"), vs.search("zebra", k=5)))
+    
+    vs._append_documents = append_and_read
+    edited = {**report, "text": " ".join(["edited"] + words)}
+    vs.upsert_documents(chunk_document(edited, passage_words=25, overlap_words=5))
+    del vs._append_documents
+    for document, passage, results in seen:
+        assert document == old_version and passage["text"] == report["text"][:len(passage["text"])]
+        assert [r["id"] for r in results] == ["doc1#2"]
+    assert vs.get_document("doc1")["text"] == edited["text"]
+    vs.upsert_documents(chunk_document(report, passage_words=25, overlap_words=5))
+    
+    shorter = {**report, "text": " ".join(words[:30])}
+    counts = vs.upsert_documents(chunk_document(shorter, passage_words=25, overlap_words=5))
+    assert counts["removed"] == 1, "The old trailing passage should be deleted"
+    assert vs.search("zebra", k=5) == []
+    fetched = vs.get_document("doc1")
+    assert fetched["text"] == shorter["text"] and fetched["title"] == "Report" and fetched["id"] == "doc1"
+    assert "parent_id" not in fetched
+    
+    assert vs.delete_documents(["doc1"]) == 1
+    assert vs.get_document("doc1") is None and vs.get_document("doc1#0") is None
+    assert all(r["parent_id"] != "doc1" for r in vs.search("word1 word2", k=10))
+    
+    print("✅ Upsert and Delete Tests Passed!")
+    return True
+
+
+def test_compaction():
+    """Test that compaction drops tombstones without changing any result."""
+    print("\n=== Testing Compaction ===")
+    import numpy as np
+    from storage.vector_store import VectorStore
+    from rag.chunking import chunk_document
+    
+    rng = np.random.default_rng(3)
+    words = [f"term{i}" for i in range(200)]
+    docs = [
+        {
+            "id": f"doc{i}", "category": ["policy", "news", "investor"][i % 3],
+            "timestamp": f"2024-{i % 12 + 1:02d}-01", "geography": "India" if i % 4 else "Singapore",
+            "source": "Test Source", "text": " ".join(rng.choice(words, size=60).tolist()) + " digital lending"
+        }
+        for i in range(300)
+    ]
+    vs = VectorStore(mode="hybrid")
+    # Probe every cluster: compaction shrinks the index, which could
+    # otherwise switch filtered ANN queries between exact and approximate
+    vs.ann_index.min_train_size = 64
+    vs.ann_index.nprobe = 1000
+    for doc in docs:
+        vs.add_documents(chunk_document(doc, passage_words=25, overlap_words=5))
+    vs.delete_documents([f"doc{i}" for i in range(0, 300, 3)])
+    vs.upsert_documents([{**docs[i], "text": docs[i]["text"] + " term7"} for i in range(1, 300, 5)])
+    assert vs.num_alive < len(vs.documents), "Small stores should not compact on their own"
+    
+    def snapshot_results():
+        results = []
+        for mode in ["keyword", "bm25", "dense", "ann", "hybrid"]:
+            results.append(vs.search("term1 term2 term7", k=10, mode=mode))
+            results.append(vs.search('"digital lending" term3', filters={"geography": "Singapore"}, k=10, mode=mode))
+            results.append(vs.search("term5", k=10, mode=mode, since="2024-03-01", until="2024-06-30"))
+        results.append(vs.list_page({"category": "news"}, page_size=15)["results"])
+        results.append([vs.get_document(f"doc{i}") for i in range(10)])
+        results.append(vs.corpus_statistics())
+        results.append(vs.term_statistics(["term1 term7"])["doc_freqs"])
+        return results
+    
+    before = snapshot_results()
+    state = vs._current
+    dropped = len(vs.documents) - vs.num_alive
+    assert vs.compact() == dropped > 0
+    assert len(vs.documents) == vs.num_alive and not vs.has_deletions()
+    assert snapshot_results() == before, "Compaction should not change any result"
+    assert vs.compact() == 0
+    
+    # Searches that took the old generation keep reading the old positions
+    position = state.positions_by_key.get("doc2#0")[0]
+    assert vs._format_results(state, [(position, 0.0)])[0]["id"] == "doc2#0"
+    
+    # Writes after compaction extend the rebuilt indexes, and enough
+    # tombstones trigger the next compaction on their own
+    vs.add_documents([{**docs[0], "id": "fresh", "text": "zebra crossing grant"}])
+    assert [r["id"] for r in vs.search("zebra", k=5, mode="bm25")] == ["fresh"]
+    vs.COMPACT_MIN_DEAD = 10
+    vs.delete_documents([f"doc{i}" for i in range(1, 150)])
+    assert len(vs.documents) == vs.num_alive
+    assert vs.get_document("doc1") is None and vs.get_document("doc200")["id"] == "doc200"
+    assert [r["id"] for r in vs.search('"zebra crossing"', k=5)] == ["fresh"]
+    
+    print("✅ Compaction Tests Passed!")
+    return True
+
+
+def test_search_many():
+    """Test batched multi-query search."""
+    print("\n=== Testing Batch Search ===")
+    from storage.vector_store import VectorStore
+    
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([
+        {"text": "Startup India tax benefits for fintech startups", "category": "policy",
+         "timestamp": "2024-12-01", "geography": "India", "source": "DPIIT"},
+        {"text": "Seed investors backing fintech and SaaS founders", "category": "investor",
+         "timestamp": "2024-11-01", "geography": "India", "source": "VC Database"},
+        {"text": "Fintech startup raises seed funding", "category": "news",
+         "timestamp": "2024-12-10", "geography": "USA", "source": "TechCrunch"}
+    ])
+    
+    queries = ["fintech tax benefits", "seed investors fintech", "fintech seed funding"]
+    filters_list = [{"category": "policy"}, None, {"geography": "USA"}]
+    for mode in ["keyword", "bm25", "dense", "ann"]:
+        batch = vs.search_many(queries, filters_list, k=[1, 2, 3], mode=mode, since=[None, None, "2024-12-01"])
+        expected = [
+            vs.search(q, f, k=k, mode=mode, since=since)
+            for q, f, k, since in zip(queries, filters_list, [1, 2, 3], [None, None, "2024-12-01"])
+        ]
+        for got, want in zip(batch, expected):
+            assert [r["id"] for r in got] == [r["id"] for r in want], f"{mode} batch results should match single searches"
+            for r, w in zip(got, want):
+                assert abs(r["relevance_score"] - w["relevance_score"]) < 1e-5
+    
+    print("✅ Batch Search Tests Passed!")
+    return True
+
+
+def test_top_k():
+    """Test bounded top-k selection and its tie-breaking."""
+    print("\n=== Testing Top-k Selection ===")
+    import numpy as np
+    from storage.topk import top_k, top_k_items
+    
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.1])
+    day_numbers = np.array([10, 10, 12, 10, 20])
+    
+    # Equal scores: newest first, then lowest position
+    assert top_k(scores, 3, day_numbers=day_numbers).tolist() == [1, 2, 0]
+    assert top_k(scores, 10, day_numbers=day_numbers).tolist() == [1, 2, 0, 3, 4]
+    items = [(position, float(scores[position]), int(day_numbers[position])) for position in range(5)]
+    assert [item[0] for item in top_k_items(items, 3)] == [1, 2, 0]
+    
+    # Mostly or entirely tied scores match a full sort, with and without positions
+    rng = np.random.default_rng(0)
+    days = rng.integers(738000, 738010, size=2000)
+    for levels in (1, 3):
+        tied = rng.integers(0, levels, size=1000).astype(float)
+        positions = rng.choice(2000, size=1000, replace=False)
+        for entry_positions in (None, positions):
+            keys = np.arange(1000) if entry_positions is None else entry_positions
+            expected = np.lexsort((keys, -days[keys], -tied))[:7].tolist()
+            assert top_k(tied, 7, entry_positions, days).tolist() == expected
+    
+    # Results are reproducible through the store
+    from storage.vector_store import VectorStore
+    base = {"category": "news", "geography": "India", "source": "Test Source"}
+    vs = VectorStore(mode="keyword")
+    vs.add_documents([
+        {**base, "text": "Fintech funding roundup", "timestamp": "2024-11-01"},
+        {**base, "text": "Fintech funding weekly", "timestamp": "2024-12-01"}
+    ])
+    results = vs.search("fintech funding", k=2)
+    assert [r["metadata"]["timestamp"] for r in results] == ["2024-12-01", "2024-11-01"]
+    
+    print("✅ Top-k Selection Tests Passed!")
+    return True
+
+
+def test_concurrent_search():
+    """Test lock-free searches while documents are being written."""
+    print("\n=== Testing Concurrent Search ===")
+    import threading
+    from storage.vector_store import VectorStore
+    
+    base = {"category": "news", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    vs = VectorStore(mode="bm25")
+    vs.ann_index.min_train_size = 64
+    errors = []
+    done = threading.Event()
+    
+    def read():
+        while not done.is_set():
+            try:
+                for mode in ["keyword", "bm25", "dense", "ann", "hybrid"]:
+                    for result in vs.search("fintech seed funding", filters={"category": "news"}, k=5, mode=mode):
+                        assert result["metadata"]["category"] == "news"
+            except Exception as e:
+                errors.append(e)
+                return
+    
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for batch in range(20):
+        docs = [{**base, "id": f"{batch}-{i}", "text": f"Fintech startup {i} raises seed funding round"} for i in range(10)]
+        vs.add_documents(docs)
+        vs.upsert_documents([{**docs[0], "text": "Fintech startup raises a bigger seed round"}])
+        vs.delete_documents([docs[1]["id"]])
+    done.set()
+    for reader in readers:
+        reader.join()
+    
+    assert not errors, f"Searches failed during writes: {errors[0]!r}"
+    assert vs.num_alive == 180
+    assert len(vs.search("fintech", k=500)) == 180
+    
+    # Dense scores of the published generation do not move while a write
+    # updates the co-occurrence contexts, until it is published
+    def dense_scores():
+        return [
+            [r["relevance_score"] for r in vs.search("fintech seed funding", k=5, mode=mode)]
+            for mode in ["dense", "ann", "hybrid"]
+        ] + [vs.term_statistics(["fintech"])["contexts"]["fintech"].tolist()]
+    
+    publish = vs._publish
+    
+    def read_then_publish():
+        seen.append(dense_scores())
+        publish()
+    
+    vs._publish = read_then_publish
+    for write in [
+        lambda: vs.add_documents([{**base, "text": "Fintech seed funding for payments lending and insurance"}]),
+        lambda: vs.delete_documents(["0-2"])
+    ]:
+        before, seen = dense_scores(), []
+        write()
+        assert seen == [before], "Writes in progress should not change published scores"
+        assert dense_scores() != before
+    del vs._publish
+    
+    print("✅ Concurrent Search Tests Passed!")
+    return True
+
+
+def test_hybrid_search():
+    """Test reciprocal rank fusion of BM25 and ANN rankings."""
+    print("\n=== Testing Hybrid Search ===")
+    from storage.vector_store import VectorStore
+    from rag.retriever import retrieve_context
+    
+    base = {"timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([
+        {**base, "category": "investor", "text": "Razorpay raises Series F funding from Tiger Global"},
+        {**base, "category": "investor", "text": "Fintech payments startups raise venture funding in India"},
+        {**base, "category": "policy", "text": "RBI guidelines for payment aggregators and fintech lending"},
+        {**base, "category": "news", "text": "Payments companies expand merchant lending products"},
+        {**base, "category": "news", "text": "Agritech startups adopt drones for crop monitoring"}
+    ])
+    
+    query = "Razorpay payments funding"
+    results = vs.search(query, k=3, mode="hybrid")
+    assert len(results) == 3
+    assert "Razorpay" in results[0]["text"]
+    
+    # Fused score is the sum of 1 / (RRF_K + rank) over both rankings
+    expected = {}
+    for mode in ["bm25", "ann"]:
+        for rank, result in enumerate(vs.search(query, k=vs.HYBRID_MIN_DEPTH, mode=mode), start=1):
+            expected[result["id"]] = expected.get(result["id"], 0.0) + 1.0 / (vs.RRF_K + rank)
+    for result in results:
+        assert abs(result["relevance_score"] - expected[result["id"]]) < 1e-9
+    assert [r["relevance_score"] for r in results] == sorted(expected.values(), reverse=True)[:3]
+    
+    # Filters apply to both candidate generators
+    results = vs.search(query, filters={"category": "news"}, k=5, mode="hybrid")
+    assert results and all(r["metadata"]["category"] == "news" for r in results)
+    
+    # Batched hybrid searches match single ones
+    batch = vs.search_many([query, "crop drones"], k=2, mode="hybrid")
+    assert [r["id"] for r in batch[0]] == [r["id"] for r in vs.search(query, k=2, mode="hybrid")]
+    assert "drones" in batch[1][0]["text"]
+    
+    context = retrieve_context("Razorpay funding", category="investor", vector_store=vs, k=1, mode="hybrid")
+    assert len(context) == 1 and "Razorpay" in context[0]
+    
+    print("✅ Hybrid Search Tests Passed!")
+    return True
+
+
+def test_passage_chunking():
+    """Test passage chunking, passage-level retrieval and passage merging."""
+    print("\n=== Testing Passage Chunking ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    from rag.chunking import chunk_document, chunk_documents, merge_adjacent_passages
+    from rag.retriever import retrieve_context
+    
+    words = [f"filler{chr(ord('a') + i % 26)}{chr(ord('a') + i // 26)}" for i in range(50)]
+    words[5] = "semiconductor"
+    words[42] = "biotechnology"
+    report = {
+        "id": "report-1", "text": "  ".join(words), "category": "report", "timestamp": "2024-12-01",
+        "geography": "India", "source": "Test Source", "title": "Sector Report"
+    }
+    
+    passages = chunk_document(report, passage_words=20, overlap_words=5)
+    assert [p["id"] for p in passages] == ["report-1#0", "report-1#1", "report-1#2"]
+    assert all(p["parent_id"] == "report-1" and p["title"] == "Sector Report" for p in passages)
+    for passage in passages:
+        start = passage["passage_start"]
+        assert report["text"][start:start + len(passage["text"])] == passage["text"]
+    assert passages[0]["text"].split()[-5:] == passages[1]["text"].split()[:5]
+    assert passages[-1]["text"].split()[-1] == words[-1]
+    assert len(chunk_document({**report, "text": "short text"}, 20, 5)) == 1
+    
+    # Retrieval returns the matching passage, not the whole report
+    vs = VectorStore(mode="bm25")
+    vs.add_documents(chunk_documents([report], passage_words=20, overlap_words=5))
+    results = vs.search("biotechnology", k=1)
+    assert results[0]["id"] == "report-1#2" and results[0]["parent_id"] == "report-1"
+    assert report["text"][results[0]["start"]:results[0]["end"]] == results[0]["text"]
+    assert "semiconductor" not in results[0]["text"]
+    
+    # Overlapping passages of one parent merge into one span
+    results = vs.search("fillerpa fillergb", k=3, mode="keyword")
+    merged = merge_adjacent_passages(results)
+    assert len(merged) == 1
+    assert merged[0]["text"] == report["text"][merged[0]["start"]:merged[0]["end"]]
+    context = retrieve_context("fillerpa fillergb", vector_store=vs, k=3, mode="keyword", merge_adjacent=True)
+    assert len(context) == 1 and "semiconductor" in context[0] and "biotechnology" in context[0]
+    
+    # Passage metadata survives snapshots
+    with tempfile.TemporaryDirectory() as tmp:
+        vs.save(tmp)
+        loaded = VectorStore.load(tmp)
+        expected = vs.search("biotechnology", k=1)[0]
+        result = loaded.search("biotechnology", k=1)[0]
+        assert [result[field] for field in ["id", "parent_id", "start", "end", "text"]] == \
+            [expected[field] for field in ["id", "parent_id", "start", "end", "text"]]
+    
+    print("✅ Passage Chunking Tests Passed!")
+    return True
+
+
+def test_tokenizer():
+    """Test tokenization, stop words, stemming and alphanumeric terms."""
+    print("\n=== Testing Tokenizer ===")
+    import tempfile
+    from storage.tokenizer import Tokenizer, DEFAULT_STOP_WORDS
+    from storage.vector_store import VectorStore
+    
+    tokenizer = Tokenizer()
+    tokens = tokenizer.tokenize("The startups raised $375M for 80-IAC policies via UPI 2.0 and early-stage taxes")
+    assert tokens == ["raised", "375m", "80-iac", "policy", "via", "upi", "2.0", "early", "tax"]
+    assert tokenizer.tokenize("1,000 investors") == tokenizer.tokenize("1000 investor")
+    assert tokenizer.tokenize("news series") == ["news", "series"]
+    assert "fintech" not in Tokenizer(stop_words=DEFAULT_STOP_WORDS | {"fintech"}).tokenize("fintech lending")
+    
+    base = {"category": "policy", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    vs = VectorStore(mode="bm25", tokenizer=Tokenizer(stop_words=DEFAULT_STOP_WORDS | {"scheme"}))
+    vs.add_documents([
+        {**base, "id": "iac", "text": "Section 80-IAC tax holiday for recognised startups"},
+        {**base, "id": "upi", "text": "NPCI launches UPI 2.0 with overdraft support"},
+        {**base, "id": "seed", "text": "Seed fund scheme for early startups"}
+    ])
+    assert [r["id"] for r in vs.search("80-IAC", k=3)] == ["iac"]
+    assert [r["id"] for r in vs.search("UPI 2.0", k=3)] == ["upi"]
+    assert [r["id"] for r in vs.search("seed funds", k=3)] == ["seed"]
+    assert vs.search("startup scheme", k=3) == []
+    
+    # Deleting a document reuses its interned term ids
+    vs.delete_documents(["upi"])
+    assert vs.search("UPI", k=3) == []
+    
+    # Snapshots keep the tokenizer settings
+    with tempfile.TemporaryDirectory() as tmp:
+        vs.save(tmp)
+        loaded = VectorStore.load(tmp)
+        assert "scheme" in loaded.tokenizer.stop_words
+        assert [r["id"] for r in loaded.search("80-IAC", k=3)] == ["iac"]
+    
+    print("✅ Tokenizer Tests Passed!")
+    return True
+
+
+def test_sharded_search():
+    """Test scatter-gather search over worker process shards."""
+    print("\n=== Testing Sharded Search ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    from storage.sharded_store import ShardedVectorStore
+    
+    base = {"timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    topics = ["fintech lending", "agritech supply chain", "healthtech diagnostics", "edtech tutoring"]
+    docs = [
+        {**base, "id": f"doc-{i}", "category": ["news", "policy"][i % 2],
+         "timestamp": f"2024-{i % 12 + 1:02d}-01",
+         "text": f"{topics[i % 4]} startup {i} raises seed funding from {topics[(i + 1) % 4]} investors"}
+        for i in range(40)
+    ]
+    vs = VectorStore()
+    vs.add_documents(docs)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        sharded = ShardedVectorStore(persist_directory=tmp, num_shards=3)
+        try:
+            sharded.add_documents(docs)
+            assert sharded.num_alive == 40
+            
+            # Corpus-wide statistics make shard scores equal unsharded ones
+            # (up to float32 rounding of the summed context vectors)
+            for mode in ["keyword", "bm25", "dense"]:
+                expected = vs.search("fintech lending seed", k=5, mode=mode)
+                actual = sharded.search("fintech lending seed", k=5, mode=mode)
+                assert [round(r["relevance_score"], 5) for r in actual] == [round(r["relevance_score"], 5) for r in expected], mode
+                if mode != "keyword":  # keyword scores tie, and ties may order differently
+                    assert [r["id"] for r in actual] == [r["id"] for r in expected], mode
+            expected = vs.search_many(["agritech", "edtech"], [{"category": "news"}, None], k=3, mode="bm25", since="2024-06-01")
+            actual = sharded.search_many(["agritech", "edtech"], [{"category": "news"}, None], k=3, mode="bm25", since="2024-06-01")
+            assert [[round(r["relevance_score"], 5) for r in results] for results in actual] == \
+                [[round(r["relevance_score"], 5) for r in results] for results in expected]
+            assert all(r["metadata"]["category"] == "news" for r in actual[0])
+            assert len(sharded.search("fintech", k=5, mode="hybrid")) == 5
+            
+            # Statistics are cached until the next write, so a repeated query
+            # makes one round trip to the shards
+            broadcasts = []
+            broadcast = sharded._broadcast
+            sharded._broadcast = lambda *args: broadcasts.append(args[1]) or broadcast(*args)
+            first = sharded.search("agritech supply", k=3, mode="bm25")
+            assert sharded.search("agritech supply", k=3, mode="bm25") == first
+            assert broadcasts == ["term_statistics"]
+            sharded._broadcast = broadcast
+            
+            # Writes are routed to the shard owning each id
+            assert sharded.upsert_documents([{**docs[0], "text": "Quantum computing startup"}])["updated"] == 1
+            assert sharded.delete_documents(["doc-1", "missing"]) == 1
+            assert sharded.get_document("doc-0")["text"] == "Quantum computing startup"
+            assert [r["id"] for r in sharded.search("quantum", k=3)] == ["doc-0"]
+            # ...and the write dropped the cached statistics
+            vs.upsert_documents([{**docs[0], "text": "Quantum computing startup"}])
+            vs.delete_documents(["doc-1"])
+            expected = vs.search("agritech supply", k=3, mode="bm25")
+            actual = sharded.search("agritech supply", k=3, mode="bm25")
+            assert [round(r["relevance_score"], 5) for r in actual] == [round(r["relevance_score"], 5) for r in expected]
+            assert [r["relevance_score"] for r in actual] != [r["relevance_score"] for r in first]
+            assert sharded.corpus_statistics()["facets"]["category"] == {"news": 20, "policy": 19}
+            
+            # Passages stay on their parent's shard, so the parent id reaches all of them
+            from rag.chunking import chunk_document
+            report = {**docs[2], "id": "long-report", "text": " ".join(f"word{i}" for i in range(40))}
+            sharded.add_documents(chunk_document(report, passage_words=10, overlap_words=2))
+            assert sharded.get_document("long-report")["text"] == report["text"]
+            assert sharded.get_document("long-report#3")["parent_id"] == "long-report"
+            assert sharded.delete_documents(["long-report"]) == 1
+            assert sharded.get_document("long-report") is None
+            
+            sharded.save(metadata={"build": 1})
+        finally:
+            sharded.close()
+        
+        # Each worker memory-maps its own shard snapshot
+        loaded = ShardedVectorStore.load(tmp, mode="bm25")
+        try:
+            assert loaded.num_shards == 3 and loaded.snapshot_metadata == {"build": 1}
+            assert loaded.num_alive == 39
+            assert [r["id"] for r in loaded.search("quantum", k=3)] == ["doc-0"]
+        finally:
+            loaded.close()
+    
+    print("✅ Sharded Search Tests Passed!")
+    return True
+
+
+def test_corpus_statistics():
+    """Test incrementally maintained facet counts."""
+    print("\n=== Testing Corpus Statistics ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    from rag.chunking import chunk_documents
+    
+    base = {"geography": "India", "source": "Inc42"}
+    vs = VectorStore()
+    vs.add_documents([
+        {**base, "id": "a", "category": "news", "timestamp": "2024-11-03", "text": "Fintech raises seed round"},
+        {**base, "id": "b", "category": "news", "timestamp": "2024-12-01", "text": "Agritech raises series A"},
+        {**base, "id": "c", "category": "policy", "timestamp": "2024-12-15", "geography": "USA", "text": "New lending rules"}
+    ])
+    # A long document indexed as several passages counts once
+    long_text = " ".join(f"word{i}" for i in range(300))
+    vs.add_documents(chunk_documents([{**base, "id": "d", "category": "report", "timestamp": "not a date", "text": long_text}]))
+    
+    stats = vs.corpus_statistics()
+    assert stats["documents"] == 4 and stats["passages"] > 4
+    assert stats["facets"]["category"] == {"news": 2, "policy": 1, "report": 1}
+    assert stats["facets"]["geography"] == {"India": 3, "USA": 1}
+    assert stats["facets"]["month"] == {"2024-11": 1, "2024-12": 2, "unknown": 1}
+    
+    # Deletes and updates adjust the counts; empty facet values disappear
+    vs.delete_documents(["c"])
+    vs.upsert_documents([{**base, "id": "a", "category": "news", "timestamp": "2024-10-01", "text": "Fintech raises seed"}])
+    stats = vs.corpus_statistics()
+    assert stats["documents"] == 3
+    assert stats["facets"]["geography"] == {"India": 3}
+    assert stats["facets"]["month"] == {"2024-10": 1, "2024-12": 1, "unknown": 1}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        vs.save(tmp)
+        assert VectorStore.load(tmp).corpus_statistics() == stats
+    
+    print("✅ Corpus Statistics Tests Passed!")
+    return True
+
+
+def test_phrase_search():
+    """Test quoted phrase queries and term proximity ranking."""
+    print("\n=== Testing Phrase Search ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    from storage.positional import encode_offsets, decode_offsets
+    
+    offsets = [0, 3, 4, 130, 20000, 3000000]
+    assert decode_offsets(encode_offsets(offsets)) == offsets
+    assert len(encode_offsets([3, 17, 18])) == 3
+    
+    base = {"category": "policy", "timestamp": "2024-12-01", "geography": "India", "source": "RBI"}
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([
+        {**base, "id": "phrase", "text": "RBI issues digital lending guidelines for regulated entities"},
+        {**base, "id": "apart", "text": "Lending rules tighten while digital payments and new guidelines grow"},
+        {**base, "id": "reversed", "text": "Guidelines on lending by regulated entities through digital channels"}
+    ])
+    
+    # Phrases match consecutive tokens, in order, in every mode
+    for mode in ["keyword", "bm25", "dense", "hybrid"]:
+        results = vs.search('"digital lending" guidelines', k=3, mode=mode)
+        assert [r["id"] for r in results] == ["phrase"], mode
+    assert [r["id"] for r in vs.search('"lending guidelines" "RBI issues"', k=3)] == ["phrase"]
+    assert vs.search('"guidelines digital"', k=3) == []
+    assert vs.normalize_query('"digital lending"') != vs.normalize_query("digital lending")
+    
+    # Without quotes every document matches, closest terms first
+    results = vs.search("digital lending guidelines", k=3)
+    assert [r["id"] for r in results] == ["phrase", "reversed", "apart"]
+    
+    # Token offsets survive snapshots and keep growing after a load
+    with tempfile.TemporaryDirectory() as tmp:
+        vs.save(tmp)
+        loaded = VectorStore.load(tmp, mode="bm25")
+        assert [r["id"] for r in loaded.search('"digital lending"', k=3)] == ["phrase"]
+        loaded.add_documents([{**base, "id": "new", "text": "Draft digital lending directions"}])
+        loaded.delete_documents(["phrase"])
+        assert [r["id"] for r in loaded.search('"digital lending"', k=3)] == ["new"]
+    
+    print("✅ Phrase Search Tests Passed!")
+    return True
+
+
+def test_pagination():
+    """Test cursor pagination of search results and listings."""
+    print("\n=== Testing Pagination ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    from storage.sharded_store import ShardedVectorStore
+    
+    base = {"geography": "India", "source": "Test Source"}
+    docs = [
+        {**base, "id": f"doc-{i}", "category": ["news", "policy"][i % 2],
+         "timestamp": f"2024-{i % 12 + 1:02d}-{i % 3 + 1:02d}",
+         "text": f"fintech startup {i} raises seed funding" + " lending" * (i % 5)}
+        for i in range(50)
+    ]
+    
+    def collect(page_fn, **kwargs):
+        ids, cursor = [], None
+        while True:
+            page = page_fn(cursor=cursor, **kwargs)
+            ids.extend(r["id"] for r in page["results"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+    
+    vs = VectorStore()
+    vs.add_documents(docs)
+    
+    # Paging through a query visits the full ranking once, in order
+    for mode in ["keyword", "bm25", "dense", "ann"]:
+        expected = [r["id"] for r in vs.search("fintech lending", k=50, mode=mode)]
+        assert collect(vs.search_page, query="fintech lending", page_size=7, mode=mode) == expected, mode
+    assert len(set(collect(vs.search_page, query="fintech lending", page_size=7, mode="hybrid"))) > 7
+    
+    # Listings are newest first, each document once, with filters applied
+    news = collect(vs.list_page, filters={"category": "news"}, page_size=4)
+    assert sorted(news) == sorted(d["id"] for d in docs if d["category"] == "news")
+    days = [vs.get_document(doc_id)["timestamp"] for doc_id in news]
+    assert days == sorted(days, reverse=True)
+    
+    try:
+        vs.search_page("fintech", cursor="not-a-cursor")
+        assert False, "invalid cursor accepted"
+    except ValueError:
+        pass
+    try:
+        vs.search_page("fintech", cursor=vs.list_page(page_size=1)["next_cursor"])
+        assert False, "listing cursor accepted by search"
+    except ValueError:
+        pass
+    from storage.pagination import encode_cursor
+    for key in [("high", 730000, 3), (1.0, "day", 3), (1.0, 730000, 2.5), (float("nan"), 730000, 3), (True, 0, 0)]:
+        try:
+            vs.search_page("fintech", cursor=encode_cursor("search", key))
+            assert False, f"malformed cursor accepted: {key}"
+        except ValueError:
+            pass
+    
+    # Pages after the first read one cached ranking, until the next write
+    calls = []
+    search_scored = vs._search_scored
+    vs._search_scored = lambda *args: calls.append(args) or search_scored(*args)
+    first = collect(vs.search_page, query="fintech lending", page_size=7, mode="bm25")
+    assert len(calls) == 2
+    vs.add_documents([{**base, "id": "late", "category": "report", "timestamp": "2024-06-01", "text": "fintech lending lending"}])
+    second = collect(vs.search_page, query="fintech lending", page_size=7, mode="bm25")
+    assert len(calls) == 4
+    vs._search_scored = search_scored
+    assert second == [r["id"] for r in vs.search("fintech lending", k=51, mode="bm25")] != first
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        sharded = ShardedVectorStore(persist_directory=tmp, num_shards=3)
+        try:
+            sharded.add_documents(docs)
+            expected = [r["id"] for r in sharded.search("fintech lending", k=50, mode="bm25")]
+            assert collect(sharded.search_page, query="fintech lending", page_size=6, mode="bm25") == expected
+            listed = collect(sharded.list_page, filters={"category": "news"}, page_size=4)
+            assert sorted(listed) == sorted(news)
+            assert [vs.get_document(doc_id)["timestamp"] for doc_id in listed] == days
+        finally:
+            sharded.close()
+    
+    print("✅ Pagination Tests Passed!")
+    return True
+
+
+def test_query_expansion():
+    """Test query expansion with curated synonyms and corpus neighbours."""
+    print("\n=== Testing Query Expansion ===")
+    import tempfile
+    from storage.vector_store import VectorStore
+    from storage.sharded_store import ShardedVectorStore
+    from storage.expansion import QueryExpansion, build_query_expansion
+    
+    expansion = QueryExpansion({("vc",): {"venture": 0.35, "capital": 0.35}, ("venture", "capital"): {"vc": 0.7}})
+    assert expansion.expand(["seed", "vc"]) == {"seed": 1.0, "vc": 1.0, "venture": 0.35, "capital": 0.35}
+    assert expansion.expand(["venture", "capital", "fund"])["vc"] == 0.7
+    assert expansion.expand(["capital", "venture"]) == {"capital": 1.0, "venture": 1.0}  # phrases match in order
+    
+    base = {"category": "investor", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    docs = (
+        [{**base, "id": f"health-{i}", "text": f"Healthcare provider {i} expands hospital diagnostics"} for i in range(4)] +
+        [{**base, "id": f"fund-{i}", "text": f"Venture capital firm {i} backs payments companies"} for i in range(4)] +
+        [{**base, "id": f"other-{i}", "text": f"Weather report {i} for the coastal region"} for i in range(30)]
+    )
+    vs = VectorStore(mode="bm25")
+    vs.add_documents(docs)
+    assert vs.search("healthtech VCs", k=5) == []
+    
+    expansion = build_query_expansion(vs)
+    assert expansion.expansions[("healthcare",)]["hospital"] == 0.3  # corpus neighbour
+    assert expansion.expansions[("healthtech",)]["healthcare"] == 0.7  # curated synonym
+    
+    generation = vs.generation
+    vs.set_query_expansion(expansion)
+    assert vs.generation != generation
+    results = vs.search("healthtech VCs", k=8)
+    assert {r["id"].split("-")[0] for r in results} == {"health", "fund"}
+    
+    # Expansion terms weigh less than the query's own terms
+    literal = vs.search("healthcare", k=1)[0]["relevance_score"]
+    assert vs.search("healthtech", k=1)[0]["relevance_score"] < literal
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        sharded = ShardedVectorStore(persist_directory=tmp, num_shards=2, mode="bm25")
+        try:
+            sharded.add_documents(docs)
+            sharded.set_query_expansion(build_query_expansion(sharded))
+            actual = sharded.search("healthtech VCs", k=8)
+            assert [round(r["relevance_score"], 5) for r in actual] == [round(r["relevance_score"], 5) for r in results]
+        finally:
+            sharded.close()
+    
+    print("✅ Query Expansion Tests Passed!")
+    return True
+
+
+def test_context_packing():
+    """Test packing retrieved context into a token budget."""
+    print("\n=== Testing Context Packing ===")
+    from rag.packing import estimate_tokens, pack_context
+    from rag.retriever import retrieve_context, _format_entry
+    from storage.vector_store import VectorStore
+    
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Seed funding, India.") == 6  # "funding" counts twice, punctuation once
+    
+    def result(text, score, source="Test Source"):
+        return {"text": text, "relevance_score": score, "metadata": {"source": source, "timestamp": "2024-12-01"}}
+    
+    shared = "The scheme offers collateral free loans to startups."
+    results = [
+        result(f"Digital lending rules were tightened. {shared}", 3.0),
+        result(f"{shared} Applications open in March.", 2.5),
+        result("A very long report on agritech supply chains. " * 40, 2.0),
+        result("Seed rounds grew in fintech.", 0.5)
+    ]
+    
+    # Everything fits: search order is kept and the shared sentence appears once
+    packed = pack_context(results, 10_000, _format_entry)
+    assert len(packed) == 4 and packed[0].endswith(shared)
+    assert sum(entry.count(shared) for entry in packed) == 1
+    assert packed[1].endswith("\nApplications open in March.")
+    
+    # Only whole sentences count as duplicates, not sentences contained in others
+    distinct = pack_context([result("Seed funding rose.", 2.0), result("Funding rose.", 1.0)], 10_000, _format_entry)
+    assert len(distinct) == 2 and distinct[1].endswith("\nFunding rose.")
+    
+    # A tight budget prefers relevance per token over raw relevance
+    budget = sum(estimate_tokens(entry) for entry in (packed[0], packed[1], packed[3]))
+    packed = pack_context(results, budget, _format_entry)
+    assert len(packed) == 3 and not any("agritech" in entry for entry in packed)
+    assert sum(estimate_tokens(entry) for entry in packed) <= budget
+    
+    # If nothing fits, the best result is cut to the budget
+    packed = pack_context(results, 18, _format_entry)
+    assert len(packed) == 1 and packed[0].startswith("[Source: Test Source]")
+    assert estimate_tokens(packed[0]) <= 18 and "Digital lending" in packed[0]
+    assert pack_context(results, 0, _format_entry) == []
+    
+    # Overlapping passages of one document share their boundary words
+    vs = VectorStore()
+    text = " ".join(f"Sentence {i} about fintech lending schemes." for i in range(60))
+    vs.add_documents([
+        {"id": f"report#{i}", "parent_id": "report", "text": " ".join(text.split()[start:start + 60]),
+         "category": "report", "timestamp": "2024-12-01", "geography": "India", "source": "Report"}
+        for i, start in enumerate(range(0, 300, 50))
+    ])
+    unpacked = retrieve_context("fintech lending schemes", vector_store=vs, k=6)
+    packed = retrieve_context("fintech lending schemes", vector_store=vs, k=6, token_budget=10_000)
+    assert sum(map(estimate_tokens, packed)) < sum(map(estimate_tokens, unpacked))
+    packed = retrieve_context("fintech lending schemes", vector_store=vs, k=6, token_budget=200)
+    assert 0 < sum(map(estimate_tokens, packed)) <= 200
+    
+    print("✅ Context Packing Tests Passed!")
+    return True
+
+
+def test_mmr_reranking():
+    """Test diversity reranking of retrieval candidates."""
+    print("\n=== Testing MMR Reranking ===")
+    import numpy as np
+    from rag.retriever import mmr_rerank, retrieve_context
+    from storage.vector_store import VectorStore
+    
+    # Two near-duplicates and one distinct candidate
+    results = [{"id": name, "relevance_score": score} for name, score in (("a", 1.0), ("a2", 0.95), ("b", 0.6))]
+    vectors = np.array([[1.0, 0.0], [0.995, 0.0998], [0.0, 1.0]], dtype=np.float32)
+    assert [r["id"] for r in mmr_rerank(results, vectors, 2, 1.0)] == ["a", "a2"]
+    assert [r["id"] for r in mmr_rerank(results, vectors, 2, 0.5)] == ["a", "b"]
+    assert [r["id"] for r in mmr_rerank(results, vectors, 5, 0.5)] == ["a", "b", "a2"]
+    
+    base = {"category": "investor", "timestamp": "2024-12-01", "geography": "India", "source": "VC Database"}
+    vs = VectorStore()
+    vs.add_documents(
+        [{**base, "id": f"fund-{i}", "text": f"Alpha Ventures fund {i} invests in fintech seed rounds in India"}
+         for i in range(4)] +
+        [{**base, "id": "beta", "text": "Beta Capital backs fintech lending startups at seed"}]
+    )
+    assert vs.embed_texts([]).shape == (0, vs.embedder.dim)
+    
+    query = "fintech seed investors"
+    plain = retrieve_context(query, category="investor", vector_store=vs, k=2, mmr_lambda=1.0)
+    diverse = retrieve_context(query, category="investor", vector_store=vs, k=2, mmr_lambda=0.3)
+    assert all("Alpha Ventures" in entry for entry in plain)
+    assert len(diverse) == 2 and any("Beta Capital" in entry for entry in diverse)
+    
+    print("✅ MMR Reranking Tests Passed!")
+    return True
+
+
+def test_retrieval_tracing():
+    """Test per-stage retrieval spans."""
+    print("\n=== Testing Retrieval Tracing ===")
+    import time
+    from storage import tracing
+    from storage.vector_store import VectorStore
+    from rag.retriever import retrieve_context, clear_cache
+    
+    # Spans exclude nested spans, and nothing is recorded without a trace
+    with tracing.span("untraced") as span:
+        span.results = 1
+    with tracing.trace() as trace:
+        with tracing.span("outer", candidates=3) as outer:
+            time.sleep(0.02)
+            with tracing.span("inner"):
+                time.sleep(0.02)
+            outer.results = 2
+    inner, outer = trace.to_list()
+    assert (inner["stage"], outer["stage"]) == ("inner", "outer")
+    assert 15 < inner["duration_ms"] and 15 < outer["duration_ms"] < 35
+    assert (outer["candidates"], outer["results"]) == (3, 2)
+    
+    base = {"category": "news", "timestamp": "2024-12-01", "geography": "India", "source": "Test Source"}
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([{**base, "id": f"doc-{i}", "text": f"fintech startup {i} raises seed funding"} for i in range(30)])
+    
+    with tracing.trace() as trace:
+        results = vs.search_many(["fintech seed", "funding"], [{"category": "news"}, None], k=5)
+    stages = trace.stages()
+    assert list(stages) == ["filter", "tokenize", "sort", "score", "format"]
+    assert stages["filter"]["candidates"] == 60 and stages["filter"]["results"] == 60
+    assert stages["sort"]["spans"] == 2 and stages["sort"]["candidates"] == 60
+    assert stages["score"]["candidates"] == 60 and stages["score"]["results"] == 10
+    assert stages["format"]["results"] == sum(map(len, results)) == 10
+    
+    clear_cache()
+    with tracing.trace() as trace:
+        retrieve_context("fintech seed", category="news", vector_store=vs, k=3, mmr_lambda=1.0)
+        retrieve_context("fintech seed", category="news", vector_store=vs, k=3, mmr_lambda=1.0)
+    cache_spans = [span for span in trace.to_list() if span["stage"] == "cache"]
+    assert [span["results"] for span in cache_spans] == [0, 1]  # miss, then hit
+    assert trace.stages()["context"] == {
+        "duration_ms": trace.stages()["context"]["duration_ms"], "spans": 1, "candidates": 3, "results": 3
+    }
+    
+    print("✅ Retrieval Tracing Tests Passed!")
+    return True
+
+
 def test_retriever():
     """Test the retriever."""
     print("\n=== Testing Retriever ===")
-    from rag.retriever import retrieve_context
+    from rag.retriever import retrieve_context, retrieve_context_batch
     from storage.vector_store import VectorStore
     
     vs = VectorStore()
@@ -122,10 +1305,61 @@ def test_retriever():
     if context:
         print(f"Sample: {context[0][:100]}...")
     
+    # Batched retrieval matches one call per query
+    requests = [
+        {"query": "Indian fintech government schemes", "category": "policy", "geography": "India", "k": 5},
+        {"query": "AI SaaS seed investors", "category": "investor", "k": 10},
+        {"query": "fintech funding news", "category": "news", "recency_days": 90, "k": 7}
+    ]
+    batch = retrieve_context_batch(requests, vector_store=vs)
+    assert batch == [retrieve_context(vector_store=vs, **request) for request in requests]
+    assert batch[0] == context
+    
     print("✅ Retriever Tests Passed!")
     return True
 
 
+def test_retrieval_cache():
+    """Test the retrieval result cache."""
+    print("\n=== Testing Retrieval Cache ===")
+    import time
+    from rag.cache import QueryCache
+    from rag.retriever import retrieve_context, get_cache_stats, clear_cache
+    from storage.vector_store import VectorStore
+    
+    # LRU eviction and TTL expiry
+    cache = QueryCache(maxsize=2, ttl_seconds=60)
+    cache.put("a", 1, ["A"])
+    cache.put("b", 1, ["B"])
+    assert cache.get("a", 1) == ["A"]
+    cache.put("c", 1, ["C"])
+    assert cache.get("b", 1) is None, "Least recently used entry should be evicted"
+    assert cache.get("a", 2) is None, "Entries from an older generation are stale"
+    expiring = QueryCache(maxsize=2, ttl_seconds=0.01)
+    expiring.put("a", 1, ["A"])
+    time.sleep(0.02)
+    assert expiring.get("a", 1) is None
+    
+    # Retriever hits on equivalent queries and misses after a write
+    clear_cache()
+    doc = {"text": "Startup India tax benefits for fintech startups", "category": "policy",
+           "timestamp": "2024-12-01", "geography": "India", "source": "DPIIT"}
+    vs = VectorStore(mode="bm25")
+    vs.add_documents([doc])
+    first = retrieve_context("fintech tax", category="policy", vector_store=vs)
+    second = retrieve_context("Tax fintech", category="policy", vector_store=vs)
+    assert first == second
+    assert get_cache_stats()["hits"] == 1
+    
+    vs.add_documents([{**doc, "text": "Angel tax exemption for fintech startups"}])
+    third = retrieve_context("fintech tax", category="policy", vector_store=vs)
+    assert len(third) == 2, "Writes to the store should invalidate cached results"
+    assert get_cache_stats()["misses"] == 2
+    
+    print("✅ Retrieval Cache Tests Passed!")
+    return True
+
+
 def test_agents():
     """Test all domain agents."""
     print("\n=== Testing Domain Agents ===")
@@ -233,6 +1467,43 @@ def test_orchestrator():
     return True
 
 
+def test_llm_client():
+    """Test the shared LLM client."""
+    print("\n=== Testing LLM Client ===")
+    from utils import llm_client
+    
+    previous_key = os.environ.get("MISTRAL_API_KEY")
+    try:
+        os.environ["MISTRAL_API_KEY"] = ""
+        assert llm_client.get_llm_client() is None
+        
+        os.environ["MISTRAL_API_KEY"] = "test-key-1"
+        client = llm_client.get_llm_client()
+        assert client is not None
+        assert llm_client.get_llm_client() is client
+        pool = llm_client._http_client
+        
+        # A new key gets a new client on the same connection pool
+        os.environ["MISTRAL_API_KEY"] = "test-key-2"
+        rotated = llm_client.get_llm_client()
+        assert rotated is not client
+        assert llm_client._http_client is pool
+        print("Client reused across calls, pool kept across key change")
+        
+        llm_client.close_llm_client()
+        assert llm_client._http_client is None
+        assert llm_client.get_llm_client() is not rotated
+    finally:
+        llm_client.close_llm_client()
+        if previous_key is None:
+            os.environ.pop("MISTRAL_API_KEY", None)
+        else:
+            os.environ["MISTRAL_API_KEY"] = previous_key
+    
+    print("✅ LLM Client Tests Passed!")
+    return True
+
+
 def main():
     """Run all tests."""
     print("=" * 50)
@@ -242,7 +1513,31 @@ def main():
     tests = [
         ("Startup Agent", test_startup_agent),
         ("Vector Store", test_vector_store),
+        ("BM25 Search", test_bm25_search),
+        ("Dense Search", test_dense_search),
+        ("ANN Index", test_ann_index),
+        ("Time Window Search", test_time_window_search),
+        ("Snapshot Persistence", test_snapshot_persistence),
+        ("Document Table", test_document_table),
+        ("Upsert and Delete", test_upsert_delete),
+        ("Compaction", test_compaction),
+        ("Batch Search", test_search_many),
+        ("Top-k Selection", test_top_k),
+        ("Concurrent Search", test_concurrent_search),
+        ("Hybrid Search", test_hybrid_search),
+        ("Passage Chunking", test_passage_chunking),
+        ("Tokenizer", test_tokenizer),
+        ("Sharded Search", test_sharded_search),
+        ("Corpus Statistics", test_corpus_statistics),
+        ("Phrase Search", test_phrase_search),
+        ("Pagination", test_pagination),
+        ("Query Expansion", test_query_expansion),
+        ("Context Packing", test_context_packing),
+        ("MMR Reranking", test_mmr_reranking),
+        ("Retrieval Tracing", test_retrieval_tracing),
+        ("LLM Client", test_llm_client),
         ("Retriever", test_retriever),
+        ("Retrieval Cache", test_retrieval_cache),
         ("Domain Agents", test_agents),
         ("Orchestrator", test_orchestrator),
     ]
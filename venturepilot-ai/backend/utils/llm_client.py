@@ -0,0 +1,67 @@
+"""
+Process-wide Mistral client.
+
+Building a `Mistral` client per call also builds a new HTTP connection pool,
+so every LLM call paid for a TCP and TLS handshake and left a socket in
+TIME_WAIT. All agents and the chat endpoint share one client instead, backed
+by one keep-alive `httpx.Client` whose pool limits come from the LLM_*
+settings in config. The client is created on first use and rebuilt (on the
+same connection pool) if MISTRAL_API_KEY changes, so a key set after start-up
+is still picked up.
+"""
+import os
+import threading
+from typing import Optional
+
+import httpx
+from mistralai import Mistral
+
+from config import (
+    LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_TIMEOUT
+)
+
+_lock = threading.Lock()
+_http_client = None
+_client = None
+_client_key = None
+
+
+def get_llm_client() -> Optional[Mistral]:
+    """
+    The shared Mistral client, or None if MISTRAL_API_KEY is not set.
+    
+    Safe to call from any thread; only the first call (and the first after
+    a key change) takes the lock.
+    """
+    global _http_client, _client, _client_key
+    api_key = os.getenv("MISTRAL_API_KEY", "")
+    if not api_key:
+        return None
+    
+    client = _client
+    if client is not None and _client_key == api_key:
+        return client
+    
+    with _lock:
+        if _client is None or _client_key != api_key:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                    ),
+                    timeout=LLM_TIMEOUT
+                )
+            _client = Mistral(api_key=api_key, client=_http_client)
+            _client_key = api_key
+        return _client
+
+
+def close_llm_client() -> None:
+    """Close the shared connection pool, e.g. at server shutdown."""
+    global _http_client, _client, _client_key
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = _client = _client_key = None